@@ -0,0 +1,72 @@
+"""Full-text search for recipes.
+
+Revision ID: 9e6d3a1f5b82
+Revises: 4c7e0b9a2f13
+Create Date: 2026-10-17 12:48:03.371560
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e6d3a1f5b82'
+down_revision: Union[str, Sequence[str], None] = '4c7e0b9a2f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            ALTER TABLE recipes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(instructions, '')), 'B') ||
+                setweight(to_tsvector('simple', coalesce(notes, '')), 'C')
+            ) STORED
+        """)
+        op.execute("CREATE INDEX ix_recipes_search_vector ON recipes USING gin (search_vector)")
+
+    elif op.get_bind().dialect.name == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE recipes_fts USING fts5(
+                name, instructions, notes, content='recipes', content_rowid='id'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER recipes_fts_insert AFTER INSERT ON recipes BEGIN
+                INSERT INTO recipes_fts(rowid, name, instructions, notes)
+                VALUES (new.id, new.name, new.instructions, new.notes);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER recipes_fts_delete AFTER DELETE ON recipes BEGIN
+                INSERT INTO recipes_fts(recipes_fts, rowid, name, instructions, notes)
+                VALUES ('delete', old.id, old.name, old.instructions, old.notes);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER recipes_fts_update AFTER UPDATE ON recipes BEGIN
+                INSERT INTO recipes_fts(recipes_fts, rowid, name, instructions, notes)
+                VALUES ('delete', old.id, old.name, old.instructions, old.notes);
+                INSERT INTO recipes_fts(rowid, name, instructions, notes)
+                VALUES (new.id, new.name, new.instructions, new.notes);
+            END
+        """)
+        op.execute("INSERT INTO recipes_fts(recipes_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_recipes_search_vector")
+        op.drop_column('recipes', 'search_vector')
+
+    elif op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER recipes_fts_update")
+        op.execute("DROP TRIGGER recipes_fts_delete")
+        op.execute("DROP TRIGGER recipes_fts_insert")
+        op.execute("DROP TABLE recipes_fts")
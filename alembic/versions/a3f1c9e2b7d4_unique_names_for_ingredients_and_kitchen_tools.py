@@ -0,0 +1,64 @@
+"""Unique names for ingredients and kitchen tools.
+
+Revision ID: a3f1c9e2b7d4
+Revises: dc879d23d43f
+Create Date: 2026-10-17 09:12:41.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f1c9e2b7d4'
+down_revision: Union[str, Sequence[str], None] = 'dc879d23d43f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def merge_duplicates(table: str, link_table: str, link_column: str) -> None:
+    """
+    Pointing all linkages of duplicated names to the oldest row and removing the duplicates.
+    """
+
+    op.execute(f"""
+        CREATE TEMPORARY TABLE {table}_duplicates AS
+        SELECT id, keep_id FROM (
+            SELECT id, min(id) OVER (PARTITION BY name) AS keep_id FROM {table}
+        ) AS ranked
+        WHERE id <> keep_id
+    """)
+
+    # a recipe linked to two duplicates would collide on the composite primary key
+    op.execute(f"""
+        DELETE FROM {link_table} AS link
+        USING {table}_duplicates AS dup
+        WHERE link.{link_column} = dup.id
+          AND EXISTS (SELECT 1 FROM {link_table} AS other
+                      WHERE other.recipe_id = link.recipe_id
+                        AND other.{link_column} = dup.keep_id)
+    """)
+    op.execute(f"""
+        UPDATE {link_table} AS link SET {link_column} = dup.keep_id
+        FROM {table}_duplicates AS dup
+        WHERE link.{link_column} = dup.id
+    """)
+    op.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table}_duplicates)")
+    op.execute(f"DROP TABLE {table}_duplicates")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    merge_duplicates('ingredients', 'recipe_ingredients', 'ingredient_id')
+    merge_duplicates('kitchen_tools', 'recipe_tools', 'tool_id')
+
+    op.create_unique_constraint('ingredients_name_key', 'ingredients', ['name'])
+    op.create_unique_constraint('kitchen_tools_name_key', 'kitchen_tools', ['name'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('kitchen_tools_name_key', 'kitchen_tools', type_='unique')
+    op.drop_constraint('ingredients_name_key', 'ingredients', type_='unique')
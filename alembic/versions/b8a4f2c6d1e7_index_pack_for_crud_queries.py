@@ -0,0 +1,47 @@
+"""Index pack for crud queries.
+
+Revision ID: b8a4f2c6d1e7
+Revises: 9e6d3a1f5b82
+Create Date: 2026-10-17 13:52:37.604189
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8a4f2c6d1e7'
+down_revision: Union[str, Sequence[str], None] = '9e6d3a1f5b82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# ingredients.name and kitchen_tools.name are already indexed by their unique constraints,
+# recipes (created_at, id) by ix_recipes_created_at_id
+INDEXES = [
+    # meal type / nationality filters, ordered like the recipe lists
+    ('ix_recipes_meal_type_created_at_id', 'recipes', ['meal_type', 'created_at', 'id']),
+    ('ix_recipes_nationality_created_at_id', 'recipes', ['nationality', 'created_at', 'id']),
+    # second columns of the composite primary keys: ingredient, tool and collection lookups
+    ('ix_recipe_ingredients_ingredient_id', 'recipe_ingredients', ['ingredient_id']),
+    ('ix_recipe_tools_tool_id', 'recipe_tools', ['tool_id']),
+    ('ix_recipe_collections_collection_id', 'recipe_collections', ['collection_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY does not block writes but can not run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
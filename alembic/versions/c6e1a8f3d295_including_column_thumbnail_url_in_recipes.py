@@ -0,0 +1,41 @@
+"""Including column thumbnail_url in Recipes.
+
+Revision ID: c6e1a8f3d295
+Revises: f2c7d9e4a1b3
+Create Date: 2026-10-17 19:42:05.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6e1a8f3d295'
+down_revision: Union[str, Sequence[str], None] = 'f2c7d9e4a1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # set together with image_url by image uploads
+    op.add_column('recipes', sa.Column('thumbnail_url', sa.Text(), nullable=True))
+
+    # the column is empty for all existing recipes, so their documents get the field as null in place,
+    # the versions stay the same because the content of the recipes did not change
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE recipe_documents SET document = json_set(document, '$.thumbnail_url', json('null'))")
+    else:
+        op.execute("""UPDATE recipe_documents SET document = (document::jsonb || '{"thumbnail_url": null}')::text""")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE recipe_documents SET document = json_remove(document, '$.thumbnail_url')")
+    else:
+        op.execute("UPDATE recipe_documents SET document = (document::jsonb - 'thumbnail_url')::text")
+
+    op.drop_column('recipes', 'thumbnail_url')
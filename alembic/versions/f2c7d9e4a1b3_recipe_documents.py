@@ -0,0 +1,35 @@
+"""Materialized recipe documents.
+
+Revision ID: f2c7d9e4a1b3
+Revises: b8a4f2c6d1e7
+Create Date: 2026-10-17 16:08:12.417305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c7d9e4a1b3'
+down_revision: Union[str, Sequence[str], None] = 'b8a4f2c6d1e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # filled by new writes, existing recipes with python -m app.backfill_documents
+    op.create_table('recipe_documents',
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('document', sa.Text(), nullable=False),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('recipe_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('recipe_documents')
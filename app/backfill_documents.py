@@ -0,0 +1,30 @@
+"""
+Command line backfill of the materialized recipe documents, e.g. after the migration that added them.
+
+Usage: python -m app.backfill_documents [--batch-size 1000] [--rebuild]
+"""
+
+import argparse
+import sys
+from app.database import SessionLocal
+import app.crud as crud
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Writing the materialized documents of recipes in batches.")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="number of recipes assembled and committed together (default: 1000)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="rewrite the documents of all recipes, not only the missing ones")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as session:
+        written = crud.backfill_recipe_documents(session, args.batch_size, args.rebuild)
+
+    print(f"Wrote {written} recipe documents.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
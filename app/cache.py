@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe, size bounded LRU cache with an optional time to live per entry.
+    Counting hits, misses and evictions.
+
+    Readers take a generation() token before loading a value from the database and pass it to set().
+    If any invalidation happened in between, the possibly outdated value is not stored.
+    """
+
+    def __init__(self, max_size: int, ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.invalidations = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        return self.invalidations
+
+    def set(self, key, value, generation: int | None = None):
+        if self.max_size <= 0:
+            return
+
+        expires = time.monotonic() + self.ttl if self.ttl else None
+
+        with self.lock:
+            if generation is not None and generation != self.invalidations:
+                return
+
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self.lock:
+            self.invalidations += 1
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += 1
+            self.entries.clear()
+
+    def statistics(self) -> dict:
+        with self.lock:
+            return {"size": len(self.entries),
+                    "max_size": self.max_size,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions}
+
+
+# (version, serialized RecipeResponse) by recipe ID, a size of 0 disables the cache
+recipe_cache = LRUCache(max_size=int(os.getenv("RECIPE_CACHE_SIZE", "5000")),
+                        ttl=float(os.getenv("RECIPE_CACHE_TTL", "300")))
+
+# serialized CollectionResponse list, there is only one entry
+collection_cache = LRUCache(max_size=1,
+                            ttl=float(os.getenv("RECIPE_CACHE_TTL", "300")))
+
+# facet counts by normalized filter state, cleared on every write
+facet_cache = LRUCache(max_size=int(os.getenv("FACET_CACHE_SIZE", "1000")),
+                       ttl=float(os.getenv("RECIPE_CACHE_TTL", "300")))
@@ -1,51 +1,219 @@
-from app.models import Recipes, Ingredients, RecipeIngredients, KitchenTools, RecipeTools, RecipeCollections, Collections
+from app.models import Recipes, Ingredients, RecipeIngredients, KitchenTools, RecipeTools, RecipeCollections, Collections, RecipeDocuments
+import base64
+import re
+from collections import Counter
 from datetime import date
-from sqlalchemy import select, func, desc, delete
-from sqlalchemy.orm import joinedload
+from itertools import islice
+from typing import Iterable
+from pydantic import ValidationError
+from sqlalchemy import select, func, desc, delete, insert, tuple_, event, literal_column, table, column, exists, distinct, literal, union_all, case, Float
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import selectinload, Session
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.orm.exc import StaleDataError
 from fastapi import HTTPException
 from app.schemas import RecipeCreate, CollectionCreate
+from app.cache import recipe_cache, collection_cache, facet_cache
+from app.ingredient_index import ingredient_index
+from app.pantry_matrix import pantry_matrix
+from app.name_index import name_indexes
+from app.similarity_index import similarity_index
+from app.units import normalize_unit, is_spoon_unit, display_quantity
+from app.serialization import dumps
+from app.instrumentation import RepeatedStatementError
+
+
+def dialect_insert(session, model):
+    """
+    Returning an INSERT construct of the session's dialect, supporting ON CONFLICT clauses.
+    """
+
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(model)
+
+    return postgresql.insert(model)
 
 """
 RECIPES
 """
 
+# stable sort key of all recipe lists, backed by the index ix_recipes_created_at_id
+RECIPE_ORDER = (Recipes.created_at, Recipes.id)
+
+# fields of a recipe that can be requested, mapped to their columns
+RECIPE_FIELDS = {"id": Recipes.id,
+                 "name": Recipes.name,
+                 "number_of_portions": Recipes.number_of_portions,
+                 "instructions": Recipes.instructions,
+                 "created_at": Recipes.created_at,
+                 "meal_type": Recipes.meal_type,
+                 "nationality": Recipes.nationality,
+                 "notes": Recipes.notes,
+                 "image_url": Recipes.image_url,
+                 "thumbnail_url": Recipes.thumbnail_url}
+
+# fields of recipe lists by default, without the large text columns
+LIST_FIELDS = ("id", "name", "meal_type", "image_url", "thumbnail_url")
+
+# the detail view can also request the linked ingredients and tools
+DETAIL_FIELDS = (*RECIPE_FIELDS, "ingredients", "tools")
+
+# ingredients and tools are loaded with one IN query each, joining both to the recipes
+# would return ingredients x tools rows per recipe
+FULL_RECIPE_LOADING = (selectinload(Recipes.ingredients).joinedload(RecipeIngredients.ingredient),
+                       selectinload(Recipes.tools).joinedload(RecipeTools.tool))
+
 def create_full_recipe(session,
                        recipe: RecipeCreate) -> int:
     """
     Creating compelete recipe with linkages to the needed ingredients and kitchen tools.
     Saving the changes permanently in the database.
+    The number of statements does not depend on the number of ingredients and tools.
     """
 
     try:
-        recipe_id = create_recipe(session=session, 
-                                name=recipe.name, 
-                                number_of_portions=recipe.number_of_portions,
-                                instructions=recipe.instructions,
-                                meal_type=recipe.meal_type,
-                                notes=recipe.notes,
-                                nationality=recipe.nationality)
-        
-        for ingredient in recipe.ingredients:
-            add_ingredient_to_recipe(session, 
-                                    recipe_id, 
-                                    ingredient.name,
-                                    ingredient.quantity, 
-                                    ingredient.unit,
-                                    getattr(ingredient, "component", None))
-            
-        for kitchen_tool in recipe.tools:
-            add_tool_to_recipe(session, 
-                                recipe_id,
-                                kitchen_tool.name)
+        check_recipe_items(recipe)
+        recipe_id, = insert_recipes(session, [recipe])
 
         session.commit()
         return recipe_id
-    
+
+    except RepeatedStatementError:
+        # an N+1 query found by the strict instrumentation is a bug, not an invalid recipe
+        session.rollback()
+        raise
+
     except Exception as e:
         session.rollback()
         raise ValueError(f"Could not create recipe: {str(e)}")
 
 
+def bulk_create_recipes(session,
+                        items: Iterable[dict | str],
+                        chunk_size: int = 500,
+                        start: int = 0) -> dict:
+    """
+    Creating many recipes at once from raw JSON objects or JSON strings (e.g. NDJSON lines).
+    Items are numbered from start, so the parts of a longer stream can be imported one after another.
+    All ingredient and kitchen tool names of a chunk are resolved with one lookup plus upsert,
+    recipes and their linkages are written with multi-row inserts.
+    Every chunk is committed on its own. Invalid items are reported and skipped,
+    a failing chunk is retried item by item so only the broken recipes are lost.
+    Output: {"created": [{index, recipe_id}], "errors": [{index, detail}]}
+    """
+
+    result = {"created": [], "errors": []}
+    iterator = iter(enumerate(items, start))
+
+    while chunk := list(islice(iterator, chunk_size)):
+        recipes = []
+        for index, item in chunk:
+            try:
+                if isinstance(item, (str, bytes)):
+                    recipe = RecipeCreate.model_validate_json(item)
+                else:
+                    recipe = RecipeCreate.model_validate(item)
+                check_recipe_items(recipe)
+                recipes.append((index, recipe))
+
+            except (ValidationError, ValueError) as e:
+                result["errors"].append({"index": index, "detail": str(e)})
+
+        if not recipes:
+            continue
+
+        try:
+            recipe_ids = insert_recipes(session, [recipe for _, recipe in recipes])
+            session.commit()
+            result["created"].extend({"index": index, "recipe_id": recipe_id}
+                                     for (index, _), recipe_id in zip(recipes, recipe_ids))
+
+        except RepeatedStatementError:
+            session.rollback()
+            raise
+
+        except Exception:
+            session.rollback()
+            for index, recipe in recipes:
+                try:
+                    recipe_id = create_full_recipe(session, recipe)
+                    result["created"].append({"index": index, "recipe_id": recipe_id})
+                except ValueError as e:
+                    result["errors"].append({"index": index, "detail": str(e)})
+
+    result["created"].sort(key=lambda x: x["index"])
+    result["errors"].sort(key=lambda x: x["index"])
+
+    return result
+
+
+def check_recipe_items(recipe: RecipeCreate):
+    """
+    Raising ValueError if an ingredient or kitchen tool is listed twice in the recipe,
+    because every ingredient and tool can only be linked once to the same recipe.
+    """
+
+    ingredient_names = [ingredient.name for ingredient in recipe.ingredients]
+    if len(ingredient_names) != len(set(ingredient_names)):
+        raise ValueError("Every ingredient can only be listed once per recipe.")
+
+    tool_names = [tool.name for tool in recipe.tools]
+    if len(tool_names) != len(set(tool_names)):
+        raise ValueError("Every kitchen tool can only be listed once per recipe.")
+
+
+def insert_recipes(session, recipes: list[RecipeCreate]) -> list[int]:
+    """
+    Inserting the given recipes with their linkages to ingredients and kitchen tools
+    using a fixed number of statements. Not committing the changes.
+    Output: the new recipe IDs in the order of the given recipes
+    """
+
+    ingredient_ids = get_or_create_ingredients(
+        session, {ingredient.name for recipe in recipes for ingredient in recipe.ingredients})
+    tool_ids = get_or_create_kitchen_tools(
+        session, {tool.name for recipe in recipes for tool in recipe.tools})
+
+    today = date.today()
+    recipe_ids = session.scalars(
+        insert(Recipes).returning(Recipes.id, sort_by_parameter_order=True),
+        [{"name": recipe.name,
+          "number_of_portions": recipe.number_of_portions,
+          "instructions": recipe.instructions,
+          "meal_type": recipe.meal_type,
+          "nationality": recipe.nationality,
+          "notes": recipe.notes,
+          "created_at": today} for recipe in recipes]
+    ).all()
+
+    recipe_ingredients = [{"recipe_id": recipe_id,
+                           "ingredient_id": ingredient_ids[ingredient.name],
+                           "quantity": ingredient.quantity,
+                           "unit": ingredient.unit,
+                           "component": ingredient.component}
+                          for recipe_id, recipe in zip(recipe_ids, recipes)
+                          for ingredient in recipe.ingredients]
+    if recipe_ingredients:
+        session.execute(insert(RecipeIngredients), recipe_ingredients)
+
+    recipe_tools = [{"recipe_id": recipe_id,
+                     "tool_id": tool_ids[tool.name]}
+                    for recipe_id, recipe in zip(recipe_ids, recipes)
+                    for tool in recipe.tools]
+    if recipe_tools:
+        session.execute(insert(RecipeTools), recipe_tools)
+
+    # the documents are assembled from the input, new recipes start with version 1
+    session.execute(insert(RecipeDocuments),
+                    [{"recipe_id": recipe_id,
+                      "version": 1,
+                      "document": dumps(new_recipe_document(recipe_id, recipe, today)).decode()}
+                     for recipe_id, recipe in zip(recipe_ids, recipes)])
+
+    mark_recipes_created(session, list(zip(recipe_ids, recipes)), ingredient_ids, tool_ids)
+
+    return recipe_ids
+
 
 def create_recipe(session,
                   name:str,
@@ -55,21 +223,20 @@ def create_recipe(session,
                   notes:str|None=None,
                   nationality:str|None=None) -> int:
     """
-    Creating new recipe and saving it in the database.
+    Creating new recipe without ingredients and tools and saving it in the database.
+    Not committing the changes.
     """
 
-    new_recipe = Recipes(name = name,
-                         number_of_portions = number_of_portions,
-                         instructions = instructions,
-                         meal_type = meal_type,
-                         nationality = nationality,
-                         notes = notes,
-                         created_at = date.today())
-
-    session.add(new_recipe)
-    session.flush()
+    recipe_id, = insert_recipes(session, [RecipeCreate(name=name,
+                                                       number_of_portions=number_of_portions,
+                                                       instructions=instructions,
+                                                       meal_type=meal_type,
+                                                       nationality=nationality,
+                                                       notes=notes,
+                                                       ingredients=[],
+                                                       tools=[])])
 
-    return new_recipe.id
+    return recipe_id
 
 
 def add_ingredient_to_recipe(session,
@@ -80,6 +247,7 @@ def add_ingredient_to_recipe(session,
                              component:str|None=None):
     """
     Creating a new linkage between a recipe and an ingredient and saving it in the database.
+    Not committing the changes.
     """
 
     ingredient = get_or_create_ingredient(session, name)
@@ -89,9 +257,9 @@ def add_ingredient_to_recipe(session,
                                               quantity = quantity,
                                               unit = unit,
                                               component = component)
-    
+
     session.add(new_recipe_ingredient)
-    session.flush()
+    relink_recipe(session, recipe_id, {name: ingredient.id}, [ingredient.id], [])
 
 
 def add_tool_to_recipe(session,
@@ -99,15 +267,83 @@ def add_tool_to_recipe(session,
                        name:str):
     """
     Creating a new linkage between a recipe and a kitchen tool and saving it in the database.
+    Not committing the changes.
     """
 
     kitchen_tool = get_or_create_kitchen_tool(session, name)
 
     new_recipe_tool = RecipeTools(recipe_id = recipe_id,
                                   tool_id = kitchen_tool.id)
-    
+
     session.add(new_recipe_tool)
-    session.flush()
+    relink_recipe(session, recipe_id, {}, [], [kitchen_tool.id])
+
+
+def relink_recipe(session,
+                  recipe_id: int,
+                  ingredient_ids: dict[str, int],
+                  added_ingredient_ids: list[int],
+                  added_tool_ids: list[int]):
+    """
+    Incrementing the version of a recipe whose ingredients or tools were changed and rebuilding its document.
+    The linkages are read back for the in-memory indexes, which get them once the transaction is committed.
+    Raising HTTPException(404) if not found, HTTPException(409) if the recipe was changed at the same time.
+    """
+
+    recipe = session.get(Recipes, recipe_id)
+
+    if not recipe:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+
+    # no column of the recipe changed, marking one as modified lets the ORM update increment the version
+    flag_modified(recipe, "name")
+    flush_recipe_changes(session)
+    refresh_recipe_documents(session, [recipe_id])
+
+    items = session.execute(
+        select(RecipeIngredients.ingredient_id, RecipeIngredients.quantity, RecipeIngredients.unit)
+        .where(RecipeIngredients.recipe_id == recipe_id)
+    ).all()
+    mark_recipe_relinked(session, recipe_id, recipe.number_of_portions, [tuple(item) for item in items],
+                         ingredient_ids, added_ingredient_ids, added_tool_ids)
+
+
+def flush_recipe_changes(session):
+    """
+    Flushing updates and deletes of recipes, which only apply to the version the recipe was loaded with.
+    Raising HTTPException(409) if another transaction changed or deleted the recipe in between.
+    """
+
+    try:
+        session.flush()
+    except StaleDataError:
+        session.rollback()
+        raise HTTPException(status_code=409, detail="Recipe was changed at the same time, please try again")
+
+
+def set_recipe_image(session, recipe_id: int, image_url: str, thumbnail_url: str) -> int:
+    """
+    Setting the image and thumbnail URLs of a recipe and saving the changes permanently in the database.
+    Raising HTTPException(404) if not found, HTTPException(409) if the recipe was changed at the same time.
+    Output: new version of the recipe
+    """
+
+    recipe = session.get(Recipes, recipe_id)
+
+    if not recipe:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+
+    recipe.image_url = image_url
+    recipe.thumbnail_url = thumbnail_url
+    # the ORM update increments the version, the document is rebuilt with it
+    flush_recipe_changes(session)
+    refresh_recipe_documents(session, [recipe_id])
+    mark_recipe_changed(session, recipe_id)
+    version = recipe.version
+
+    session.commit()
+
+    return version
 
 
 def get_full_recipe_by_id(session, recipe_id: int) -> Recipes:
@@ -118,10 +354,7 @@ def get_full_recipe_by_id(session, recipe_id: int) -> Recipes:
 
     recipe = (
         session.query(Recipes)
-        .options(
-            joinedload(Recipes.ingredients).joinedload(RecipeIngredients.ingredient),
-            joinedload(Recipes.tools).joinedload(RecipeTools.tool)
-        )
+        .options(*FULL_RECIPE_LOADING)
         .filter(Recipes.id == recipe_id)
         .first()
     )
@@ -132,31 +365,432 @@ def get_full_recipe_by_id(session, recipe_id: int) -> Recipes:
     return recipe
 
 
-def get_all_recipes(session, skip: int = 0, limit: int = 10) -> list[Recipes]:
+def get_full_recipes_by_ids(session, recipe_ids: list[int]) -> list[Recipes]:
+    """
+    Returning the Recipe objects with the given IDs in the given order, with ingredients and tools loaded.
+    The number of statements does not depend on the number of recipes, ingredients and tools.
+    IDs without a recipe are left out.
+    """
+
+    recipes = session.scalars(
+        select(Recipes)
+        .options(*FULL_RECIPE_LOADING)
+        .where(Recipes.id.in_(recipe_ids))
+    ).all()
+    recipe_map = {recipe.id: recipe for recipe in recipes}
+
+    return [recipe_map[recipe_id] for recipe_id in recipe_ids if recipe_id in recipe_map]
+
+
+def get_recipe_fields(session, recipe_id: int, fields: list[str]) -> tuple[int, dict]:
+    """
+    Returning the version and the given fields of a recipe, only selecting the needed columns.
+    Ingredients and tools are only loaded if requested, as plain rows.
+    Raising HTTPException(404) if not found.
+    """
+
+    columns = [RECIPE_FIELDS[field] for field in fields if field in RECIPE_FIELDS]
+    row = session.execute(select(Recipes.version, *columns).where(Recipes.id == recipe_id)).first()
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+
+    version, *values = row
+    recipe = dict(zip([field for field in fields if field in RECIPE_FIELDS], values))
+
+    if "ingredients" in fields:
+        recipe["ingredients"] = [dict(row._mapping) for row in session.execute(
+            select(Ingredients.name, RecipeIngredients.quantity, RecipeIngredients.unit, RecipeIngredients.component)
+            .join(Ingredients, Ingredients.id == RecipeIngredients.ingredient_id)
+            .where(RecipeIngredients.recipe_id == recipe_id)
+        )]
+
+    if "tools" in fields:
+        recipe["tools"] = [{"name": name} for name in session.scalars(
+            select(KitchenTools.name)
+            .join(RecipeTools, RecipeTools.tool_id == KitchenTools.id)
+            .where(RecipeTools.recipe_id == recipe_id)
+        )]
+
+    return version, recipe
+
+
+def get_recipe_document(session, recipe_id: int) -> tuple[int, bytes] | None:
+    """
+    Returning the version and the encoded materialized document of a recipe with one primary key read.
+    Returning None if the recipe has no document (yet), e.g. before the backfill.
+    """
+
+    row = session.execute(
+        select(RecipeDocuments.version, RecipeDocuments.document)
+        .where(RecipeDocuments.recipe_id == recipe_id)
+    ).first()
+
+    if row is None:
+        return None
+
+    return row.version, row.document.encode()
+
+
+def get_recipe_documents(session, recipe_ids: list[int]) -> dict[int, tuple[int, bytes]]:
+    """
+    Returning the versions and encoded materialized documents of the given recipes with one statement.
+    Output: {recipe ID: (version, document)}, IDs without a document are left out
+    """
+
+    return {row.recipe_id: (row.version, row.document.encode()) for row in session.execute(
+        select(RecipeDocuments.recipe_id, RecipeDocuments.version, RecipeDocuments.document)
+        .where(RecipeDocuments.recipe_id.in_(recipe_ids))
+    )}
+
+
+def new_recipe_document(recipe_id: int, recipe: RecipeCreate, created_at: date) -> dict:
+    """
+    Returning the document of a new recipe from its input, in the shape of RecipeResponse.
+    """
+
+    return {"id": recipe_id,
+            "name": recipe.name,
+            "number_of_portions": recipe.number_of_portions,
+            "instructions": recipe.instructions,
+            "created_at": created_at,
+            "meal_type": recipe.meal_type,
+            "nationality": recipe.nationality,
+            "notes": recipe.notes,
+            "image_url": None,
+            "thumbnail_url": None,
+            "ingredients": [{"name": ingredient.name,
+                             "quantity": ingredient.quantity,
+                             "unit": ingredient.unit,
+                             "component": ingredient.component} for ingredient in recipe.ingredients],
+            "tools": [{"name": tool.name} for tool in recipe.tools]}
+
+
+def assemble_recipe_documents(session, recipe_ids: list[int]) -> dict[int, tuple[int, dict]]:
+    """
+    Assembling the documents of the given recipes from the tables, with one statement
+    for the recipes, their ingredients and their tools each.
+    Output: {recipe ID: (version, document)}, IDs without a recipe are left out
+    """
+
+    documents = {}
+    for version, *values in session.execute(
+        select(Recipes.version, *RECIPE_FIELDS.values()).where(Recipes.id.in_(recipe_ids))
+    ):
+        documents[values[0]] = (version, {**dict(zip(RECIPE_FIELDS, values)), "ingredients": [], "tools": []})
+
+    for recipe_id, name, quantity, unit, component in session.execute(
+        select(RecipeIngredients.recipe_id, Ingredients.name, RecipeIngredients.quantity,
+               RecipeIngredients.unit, RecipeIngredients.component)
+        .join(Ingredients, Ingredients.id == RecipeIngredients.ingredient_id)
+        .where(RecipeIngredients.recipe_id.in_(recipe_ids))
+    ):
+        if recipe_id in documents:
+            documents[recipe_id][1]["ingredients"].append(
+                {"name": name, "quantity": quantity, "unit": unit, "component": component})
+
+    for recipe_id, name in session.execute(
+        select(RecipeTools.recipe_id, KitchenTools.name)
+        .join(KitchenTools, KitchenTools.id == RecipeTools.tool_id)
+        .where(RecipeTools.recipe_id.in_(recipe_ids))
+    ):
+        if recipe_id in documents:
+            documents[recipe_id][1]["tools"].append({"name": name})
+
+    return documents
+
+
+def refresh_recipe_documents(session, recipe_ids: list[int]) -> int:
+    """
+    Rebuilding the documents of the given recipes from the tables, inside the current transaction.
+    Not committing the changes.
+    Output: number of written documents
+    """
+
+    documents = assemble_recipe_documents(session, recipe_ids)
+    if not documents:
+        return 0
+
+    statement = dialect_insert(session, RecipeDocuments)
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[RecipeDocuments.recipe_id],
+            set_={"version": statement.excluded.version, "document": statement.excluded.document}),
+        [{"recipe_id": recipe_id, "version": version, "document": dumps(document).decode()}
+         for recipe_id, (version, document) in documents.items()]
+    )
+
+    return len(documents)
+
+
+def backfill_recipe_documents(session, batch_size: int = 1000, rebuild: bool = False) -> int:
+    """
+    Writing the documents of all recipes without one, or of all recipes with rebuild=True,
+    walking through the recipes in batches of IDs and committing every batch on its own.
+    Output: number of written documents
+    """
+
+    written = 0
+    last_id = 0
+
+    query = select(Recipes.id)
+    if not rebuild:
+        query = query.where(~exists().where(RecipeDocuments.recipe_id == Recipes.id))
+
+    while ids := session.scalars(
+        query
+        .where(Recipes.id > last_id)
+        .order_by(Recipes.id)
+        .limit(batch_size)
+    ).all():
+        written += refresh_recipe_documents(session, ids)
+        session.commit()
+        last_id = ids[-1]
+
+    return written
+
+
+def get_recipe_version(session, recipe_id: int) -> int:
+    """
+    Returning the version of the recipe with the given ID without loading it.
+    Raising HTTPException(404) if not found.
+    """
+
+    version = session.execute(
+        select(Recipes.version)
+        .where(Recipes.id == recipe_id)
+    ).scalar_one_or_none()
+
+    if version is None:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+
+    return version
+
+
+def get_recipes_by_ids(session, recipe_ids: list[int], fields: list[str] | None = None) -> list[dict]:
     """
-    Returning a list of all recipes in the database.
+    Returning the given fields of the recipes with the given IDs in the given order.
+    IDs without a recipe are left out.
+    """
+
+    fields, columns = recipe_columns(fields)
+    rows = session.execute(select(*columns).where(Recipes.id.in_(recipe_ids))).all()
+    recipe_map = {row.id: dict(zip(fields, row)) for row in rows}
+
+    return [recipe_map[recipe_id] for recipe_id in recipe_ids if recipe_id in recipe_map]
+
+
+def get_all_recipes(session, skip: int = 0, limit: int = 10, fields: list[str] | None = None) -> list[dict]:
+    """
+    Returning the given fields of all recipes in the database, ordered by creation.
     The number of returned recipes is limited 
     and the first recipes in the database can be skipped.
+    Kept for compatibility, get_recipes_page does not slow down on deep pages.
     """
 
-    recipe_list = session.query(Recipes).offset(skip).limit(limit).all()
+    fields, columns = recipe_columns(fields)
+    rows = session.execute(
+        select(*columns)
+        .order_by(*RECIPE_ORDER)
+        .offset(skip)
+        .limit(limit)
+    ).all()
 
-    return recipe_list
+    return [dict(zip(fields, row)) for row in rows]
 
 
 def get_recipes_filtered(session,
                          meal_types: list[str] | None = None,
                          nationalities: list[str] | None = None,
-                         collections: list[str] | None = None,
+                         collections: list[int] | None = None,
                          skip: int = 0,
-                         limit: int = 10) -> list[Recipes]:
+                         limit: int = 10,
+                         collection_mode: str = "any",
+                         ingredients: list[str] | None = None,
+                         ingredient_mode: str = "all",
+                         excluded_ingredients: list[str] | None = None,
+                         tools: list[str] | None = None,
+                         tool_mode: str = "all",
+                         fields: list[str] | None = None) -> list[dict]:
     """
-    Returning a list of all recipes matching the given filters.
+    Returning the given fields of all recipes matching the given filters, ordered by creation.
     The number of returned recipes is limited 
     and the first recipes in the database can be skipped.
+    See filter_recipes for the filters.
+    Kept for compatibility, get_recipes_page does not slow down on deep pages.
+    """
+
+    fields, columns = recipe_columns(fields)
+    query = filter_recipes(select(*columns), meal_types, nationalities, collections,
+                           collection_mode, ingredients, ingredient_mode, excluded_ingredients, tools, tool_mode)
+    rows = session.execute(query.order_by(*RECIPE_ORDER).offset(skip).limit(limit)).all()
+
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def get_recipes_page(session,
+                     meal_types: list[str] | None = None,
+                     nationalities: list[str] | None = None,
+                     collections: list[int] | None = None,
+                     cursor: str | None = None,
+                     limit: int = 10,
+                     fields: list[str] | None = None) -> tuple[list[dict], str | None]:
+    """
+    Returning the given fields of one page of the recipes matching the given filters, ordered by creation.
+    The page starts after the recipe encoded in the cursor,
+    so every page costs the same index range scan no matter how deep it is.
+    Output: (recipes, cursor of the next page or None on the last page)
+    """
+
+    fields, columns = recipe_columns(fields)
+    # the sort key is selected after the fields for the cursor
+    query = filter_recipes(select(*columns, *RECIPE_ORDER), meal_types, nationalities, collections)
+
+    if cursor:
+        query = query.filter(tuple_(*RECIPE_ORDER) > decode_cursor(cursor))
+
+    rows = session.execute(query.order_by(*RECIPE_ORDER).limit(limit + 1)).all()
+    recipe_list = [dict(zip(fields, row)) for row in rows[:limit]]
+
+    if len(rows) <= limit:
+        return recipe_list, None
+
+    return recipe_list, encode_cursor(*rows[limit - 1][len(fields):])
+
+
+def search_recipes(session,
+                   search: str,
+                   meal_types: list[str] | None = None,
+                   nationalities: list[str] | None = None,
+                   collections: list[int] | None = None,
+                   skip: int = 0,
+                   limit: int = 10,
+                   fields: list[str] | None = None) -> list[dict]:
+    """
+    Returning the given fields of the recipes matching all words of the search text in name,
+    instructions or notes, restricted to the given filters and ranked by relevance (matches in the name first).
+    Uses the full-text index of the database: tsvector + GIN on PostgreSQL, FTS5 on SQLite.
+    """
+
+    fields, columns = recipe_columns(fields)
+    query = filter_recipes(select(*columns).select_from(Recipes), meal_types, nationalities, collections)
+
+    if session.get_bind().dialect.name == "sqlite":
+        words = re.findall(r"\w+", search)
+        if not words:
+            return []
+
+        # every word quoted, so user input can not use the FTS5 query syntax
+        fts_query = " ".join(f'"{word}"' for word in words)
+        recipes_fts = table("recipes_fts", column("rowid"))
+        query = (
+            query.join(recipes_fts, recipes_fts.c.rowid == Recipes.id)
+            .filter(literal_column("recipes_fts").op("MATCH")(fts_query))
+            .order_by(func.bm25(literal_column("recipes_fts"), 10.0, 2.0, 1.0), Recipes.id)
+        )
+
+    else:
+        ts_query = func.websearch_to_tsquery("simple", search)
+        search_vector = literal_column("recipes.search_vector")
+        query = (
+            query.filter(search_vector.op("@@")(ts_query))
+            .order_by(func.ts_rank(search_vector, ts_query).desc(), Recipes.id)
+        )
+
+    rows = session.execute(query.offset(skip).limit(limit)).all()
+
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def get_recipe_facets(session,
+                      meal_types: list[str] | None = None,
+                      nationalities: list[str] | None = None,
+                      collections: list[int] | None = None) -> dict:
     """
+    Returning the number of recipes matching the given filters in total
+    and per meal type, nationality and collection, all with one grouped query.
+    PostgreSQL groups once by GROUPING SETS, other databases get a UNION ALL of the groupings.
+    Output: {"total": n, "meal_types": [(value, n)], "nationalities": [(value, n)], "collections": [(ID, n)]}
+    """
+
+    if session.get_bind().dialect.name == "postgresql":
+        # a recipe is joined once per collection, so recipes are counted distinct
+        query = filter_recipes(
+            select(func.grouping(Recipes.meal_type, Recipes.nationality, RecipeCollections.collection_id),
+                   Recipes.meal_type,
+                   Recipes.nationality,
+                   RecipeCollections.collection_id,
+                   func.count(distinct(Recipes.id)))
+            .select_from(Recipes)
+            .outerjoin(RecipeCollections, RecipeCollections.recipe_id == Recipes.id)
+            .group_by(func.grouping_sets(tuple_(Recipes.meal_type),
+                                         tuple_(Recipes.nationality),
+                                         tuple_(RecipeCollections.collection_id),
+                                         tuple_())),
+            meal_types, nationalities, collections
+        )
+        # GROUPING() sets a bit for every column left out of the group, the first column is the highest bit
+        facet_names = {0b011: ("meal_types", 1), 0b101: ("nationalities", 2),
+                       0b110: ("collections", 3), 0b111: ("total", 1)}
+        rows = [(facet_names[row[0]][0], row[facet_names[row[0]][1]], row[4]) for row in session.execute(query)]
+
+    else:
+        def grouped(facet: str, value=None, join_collections: bool = False):
+            query = select(literal(facet), value if value is not None else literal(None), func.count())
+            query = query.select_from(Recipes)
+            if join_collections:
+                query = query.join(RecipeCollections, RecipeCollections.recipe_id == Recipes.id)
+            query = filter_recipes(query, meal_types, nationalities, collections)
+            return query.group_by(value) if value is not None else query
+
+        query = union_all(grouped("meal_types", Recipes.meal_type),
+                          grouped("nationalities", Recipes.nationality),
+                          grouped("collections", RecipeCollections.collection_id, join_collections=True),
+                          grouped("total"))
+        rows = session.execute(query).all()
+
+    facets = {"total": 0, "meal_types": [], "nationalities": [], "collections": []}
+
+    for facet, value, count in rows:
+        if facet == "total":
+            facets["total"] = count
+        elif facet != "collections" or value is not None:
+            facets[facet].append((value, count))
+
+    for facet in ("meal_types", "nationalities", "collections"):
+        facets[facet].sort(key=lambda item: (-item[1], str(item[0])))
 
-    query = session.query(Recipes)
+    return facets
+
+
+def recipe_columns(fields: list[str] | None = None) -> tuple[list[str], list]:
+    """
+    Returning the requested recipe fields, the ID always first, and the columns to select for them.
+    Without fields the LIST_FIELDS are used.
+    """
+
+    fields = ["id", *(field for field in (fields or LIST_FIELDS) if field != "id")]
+
+    return fields, [RECIPE_FIELDS[field] for field in fields]
+
+
+def filter_recipes(query,
+                   meal_types: list[str] | None = None,
+                   nationalities: list[str] | None = None,
+                   collections: list[int] | None = None,
+                   collection_mode: str = "any",
+                   ingredients: list[str] | None = None,
+                   ingredient_mode: str = "all",
+                   excluded_ingredients: list[str] | None = None,
+                   tools: list[str] | None = None,
+                   tool_mode: str = "all"):
+    """
+    Restricting a recipe query to the given filters.
+    Collections, ingredients and tools are matched with EXISTS semi-joins on the linkage tables,
+    so every recipe is returned once and each check is an index lookup on the primary key.
+    mode "any": the recipe has at least one of the values, "all": it has every value.
+    Recipes with one of the excluded ingredients are left out.
+    """
 
     if meal_types:
         query = query.filter(Recipes.meal_type.in_(meal_types))
@@ -165,14 +799,139 @@ def get_recipes_filtered(session,
         query = query.filter(Recipes.nationality.in_(nationalities))
 
     if collections:
-        query = query.filter(Recipes.collections.in_(collections))
+        query = query.filter(*linkage_filters(RecipeCollections.recipe_id, RecipeCollections.collection_id,
+                                              collections, collection_mode))
+
+    if ingredients:
+        query = query.filter(*linkage_filters(RecipeIngredients.recipe_id, RecipeIngredients.ingredient_id,
+                                              ingredients, ingredient_mode, Ingredients))
 
-    return query.offset(skip).limit(limit).all()
+    if excluded_ingredients:
+        query = query.filter(~linkage_filters(RecipeIngredients.recipe_id, RecipeIngredients.ingredient_id,
+                                              excluded_ingredients, "any", Ingredients)[0])
 
+    if tools:
+        query = query.filter(*linkage_filters(RecipeTools.recipe_id, RecipeTools.tool_id,
+                                              tools, tool_mode, KitchenTools))
 
-def delete_recipe_by_id(session, recipe_id: int):
+    return query
+
+
+def linkage_filters(recipe_column, value_column, values: list, mode: str = "any", names_model=None) -> list:
+    """
+    Returning the EXISTS conditions for recipes linked to any or all of the given values.
+    With names_model the values are names of that model and resolved to IDs inside the query.
+    """
+
+    if mode not in ("any", "all"):
+        raise ValueError(f"Unknown filter mode: {mode}")
+
+    def value_ids(selected):
+        if names_model is None:
+            return selected
+        return select(names_model.id).where(names_model.name.in_(selected))
+
+    def linked(selected):
+        # only correlated to recipes, the outer query may join the same linkage table
+        return exists().where(recipe_column == Recipes.id, value_column.in_(value_ids(selected))).correlate(Recipes)
+
+    if mode == "any":
+        return [linked(list(values))]
+
+    # one lookup of (recipe ID, value ID) per value, this hits the primary key of the linkage table
+    return [linked([value]) for value in dict.fromkeys(values)]
+
+
+def get_shopping_list(session, meal_plan: list[tuple[int, float]]) -> list[dict]:
+    """
+    Returning the consolidated shopping list of a meal plan of (recipe ID, portions).
+    One grouped query scales every ingredient by portions / number_of_portions of its recipe
+    and sums it per ingredient and unit, compatible units (g/kg, ml/l, tsp/tbsp) are merged afterwards.
+    Raising HTTPException(404) if a recipe does not exist.
+    Output: [{"name", "quantity", "unit"}] ordered by name, quantity None for ingredients without quantity
+    """
+
+    portions = {}
+    for recipe_id, recipe_portions in meal_plan:
+        portions[recipe_id] = portions.get(recipe_id, 0.0) + float(recipe_portions)
+
+    if not portions:
+        return []
+
+    found = set(session.scalars(select(Recipes.id).where(Recipes.id.in_(portions))).all())
+    missing = [recipe_id for recipe_id in portions if recipe_id not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Recipes not found: {missing}")
+
+    # one branch per distinct portion count instead of per recipe, meal plans repeat a few counts
+    recipes_by_portions = {}
+    for recipe_id, recipe_portions in portions.items():
+        recipes_by_portions.setdefault(recipe_portions, []).append(recipe_id)
+
+    scale = (case(*[(Recipes.id.in_(recipe_ids), literal(recipe_portions, Float))
+                    for recipe_portions, recipe_ids in recipes_by_portions.items()])
+             / func.nullif(Recipes.number_of_portions, 0))
+    unit = func.lower(func.trim(RecipeIngredients.unit))
+
+    rows = session.execute(
+        select(Ingredients.name, unit, func.sum(RecipeIngredients.quantity * scale))
+        .select_from(RecipeIngredients)
+        .join(Ingredients, Ingredients.id == RecipeIngredients.ingredient_id)
+        .join(Recipes, Recipes.id == RecipeIngredients.recipe_id)
+        .where(RecipeIngredients.recipe_id.in_(portions))
+        .group_by(Ingredients.id, Ingredients.name, unit)
+    ).all()
+
+    # (name, base unit) -> [amount, only given in spoons]
+    totals = {}
+    for name, row_unit, amount in rows:
+        base_unit, factor = normalize_unit(row_unit)
+        total = totals.setdefault((name, base_unit), [None, True])
+        if amount is not None:
+            total[0] = (total[0] or 0.0) + amount * factor
+            total[1] = total[1] and is_spoon_unit(row_unit)
+
+    shopping_list = []
+    for (name, base_unit), (amount, spoons_only) in sorted(totals.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        quantity, display_unit = display_quantity(amount, base_unit, spoons_only)
+        shopping_list.append({"name": name, "quantity": quantity, "unit": display_unit})
+
+    return shopping_list
+
+
+def encode_cursor(created_at: date, recipe_id: int) -> str:
+    """
+    Encoding the sort key of a recipe into an opaque pagination cursor.
+    """
+
+    key = f"{created_at.isoformat()}|{recipe_id}"
+
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[date, int]:
+    """
+    Decoding a pagination cursor into the sort key (created_at, id).
+    Raising HTTPException(400) if the cursor is malformed.
+    """
+
+    try:
+        key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, recipe_id = key.split("|")
+        return date.fromisoformat(created_at), int(recipe_id)
+
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def delete_recipe_by_id(session, recipe_id: int, cleanup_orphans: bool = True):
     """
     Removing the recipe with the given ID from the database.
+    Ingredients and kitchen tools only used by this recipe are removed as well,
+    checking only the IDs the recipe referenced. With cleanup_orphans=False this is left
+    to the caller, e.g. delete_orphans in a background task.
+    Raising HTTPException(409) if the recipe was changed at the same time.
+    Output: (ingredient IDs, kitchen tool IDs) of the recipe, False if not found
     """
 
     recipe = session.get(Recipes, recipe_id)
@@ -180,13 +939,229 @@ def delete_recipe_by_id(session, recipe_id: int):
     if not recipe:
         return False
 
+    # the delete cascade loads the linkages anyway
+    ingredient_ids = [recipe_ingredient.ingredient_id for recipe_ingredient in recipe.ingredients]
+    tool_ids = [recipe_tool.tool_id for recipe_tool in recipe.tools]
+
+    # ON DELETE CASCADE is not enforced by every database, e.g. SQLite without the foreign_keys pragma
+    session.execute(delete(RecipeDocuments).where(RecipeDocuments.recipe_id == recipe_id))
     session.delete(recipe)
-    session.flush()
+    flush_recipe_changes(session)
+
+    if cleanup_orphans:
+        delete_orphaned_ingredients(session, ingredient_ids)
+        delete_orphaned_kitchen_tools(session, tool_ids)
 
-    delete_not_used_ingredients(session)
+    mark_recipe_deleted(session, recipe_id, ingredient_ids, tool_ids)
 
     session.commit()
 
+    return ingredient_ids, tool_ids
+
+
+def delete_orphans(session,
+                   ingredient_ids: list[int],
+                   tool_ids: list[int],
+                   batch_size: int = 500):
+    """
+    Removing the given ingredients and kitchen tools if they are not used in any recipe anymore.
+    Committing every batch on its own, so large cleanups do not hold long locks.
+    """
+
+    for i in range(0, len(ingredient_ids), batch_size):
+        delete_orphaned_ingredients(session, ingredient_ids[i:i + batch_size])
+        session.commit()
+
+    for i in range(0, len(tool_ids), batch_size):
+        delete_orphaned_kitchen_tools(session, tool_ids[i:i + batch_size])
+        session.commit()
+
+
+def sweep_orphans(session, batch_size: int = 1000) -> int:
+    """
+    Removing all ingredients and kitchen tools which are not used in any recipe,
+    walking through the tables in batches of IDs and committing every batch on its own.
+    Output: number of removed rows
+    """
+
+    removed = 0
+
+    for model, delete_orphaned in ((Ingredients, delete_orphaned_ingredients),
+                                   (KitchenTools, delete_orphaned_kitchen_tools)):
+        last_id = 0
+        while ids := session.scalars(
+            select(model.id)
+            .where(model.id > last_id)
+            .order_by(model.id)
+            .limit(batch_size)
+        ).all():
+            removed += delete_orphaned(session, ids)
+            session.commit()
+            last_id = ids[-1]
+
+    return removed
+
+"""
+COMMIT HOOKS
+"""
+
+# Writes only mark the recipes they created, changed or deleted in session.info.
+# The marks are applied to caches and in-memory indexes once the transaction is committed
+# and dropped if it is rolled back, so readers never see uncommitted data.
+
+def mark_recipes_created(session,
+                         recipes: list[tuple[int, RecipeCreate]],
+                         ingredient_ids: dict[str, int],
+                         tool_ids: dict[str, int]):
+    """
+    Marking new recipes (recipe ID, recipe) together with the IDs of their ingredient and tool names.
+    """
+
+    session.info.setdefault("created_recipes", []).append((recipes, ingredient_ids, tool_ids))
+
+
+def mark_recipe_changed(session, recipe_id: int):
+    """
+    Marking a stored recipe as changed.
+    """
+
+    session.info.setdefault("changed_recipes", set()).add(recipe_id)
+
+
+def mark_recipe_relinked(session,
+                         recipe_id: int,
+                         number_of_portions: int,
+                         items: list[tuple[int, float | None, str | None]],
+                         ingredient_ids: dict[str, int],
+                         added_ingredient_ids: list[int],
+                         added_tool_ids: list[int]):
+    """
+    Marking a stored recipe whose linkages changed, with all its (ingredient ID, quantity, unit),
+    the names of the ingredients it got and the IDs of the ingredients and tools it got.
+    """
+
+    mark_recipe_changed(session, recipe_id)
+    session.info.setdefault("relinked_recipes", []).append(
+        (recipe_id, number_of_portions, items, ingredient_ids, added_ingredient_ids, added_tool_ids))
+
+
+def mark_recipe_deleted(session, recipe_id: int, ingredient_ids: list[int] = (), tool_ids: list[int] = ()):
+    """
+    Marking a recipe as deleted, together with the IDs of the ingredients and tools it used.
+    """
+
+    session.info.setdefault("deleted_recipes", set()).add(recipe_id)
+    session.info.setdefault("released_names", []).append((list(ingredient_ids), list(tool_ids)))
+
+
+def mark_names_created(session, model, name_ids: dict[str, int]):
+    """
+    Marking new names of a master table (ingredients, kitchen tools).
+    """
+
+    session.info.setdefault("created_names", []).append((model.__tablename__, name_ids))
+
+
+def mark_names_removed(session, model, name_ids: list[int]):
+    """
+    Marking removed names of a master table (ingredients, kitchen tools).
+    """
+
+    session.info.setdefault("removed_names", []).append((model.__tablename__, name_ids))
+
+
+def mark_collections_changed(session):
+    """
+    Marking the collections or their recipes as changed.
+    """
+
+    session.info["collections_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def apply_recipe_marks(session):
+    """
+    Applying the marks of the committed transaction to all caches and in-memory indexes.
+    """
+
+    created = session.info.pop("created_recipes", [])
+    changed = session.info.pop("changed_recipes", set())
+    relinked = session.info.pop("relinked_recipes", [])
+    deleted = session.info.pop("deleted_recipes", set())
+    collections_changed = session.info.pop("collections_changed", False)
+    created_names = session.info.pop("created_names", [])
+    released_names = session.info.pop("released_names", [])
+    removed_names = session.info.pop("removed_names", [])
+
+    if collections_changed:
+        collection_cache.clear()
+
+    # every write can change the counts of any filter state
+    if created or changed or deleted or collections_changed:
+        facet_cache.clear()
+
+    for recipe_id in changed | deleted:
+        recipe_cache.invalidate(recipe_id)
+
+    for recipes, ingredient_ids, tool_ids in created:
+        recipe_ingredient_ids = [(recipe_id, [ingredient_ids[ingredient.name] for ingredient in recipe.ingredients])
+                                 for recipe_id, recipe in recipes]
+        ingredient_index.add_recipes(recipe_ingredient_ids, ingredient_ids)
+        similarity_index.add_recipes(recipe_ingredient_ids)
+        pantry_matrix.add_recipes([(recipe_id, recipe.number_of_portions,
+                                    [(ingredient_ids[ingredient.name], ingredient.quantity, ingredient.unit)
+                                     for ingredient in recipe.ingredients])
+                                   for recipe_id, recipe in recipes],
+                                  ingredient_ids)
+
+    for recipe_id in deleted:
+        ingredient_index.remove_recipe(recipe_id)
+        pantry_matrix.remove_recipe(recipe_id)
+        similarity_index.remove_recipe(recipe_id)
+
+    # the indexes only add whole recipes, a relinked recipe is replaced
+    for recipe_id, number_of_portions, items, ingredient_ids, _, _ in relinked:
+        if recipe_id in deleted:
+            continue
+        recipe_ingredient_ids = [(recipe_id, [ingredient_id for ingredient_id, _, _ in items])]
+        for index in (ingredient_index, pantry_matrix, similarity_index):
+            index.remove_recipe(recipe_id)
+        ingredient_index.add_recipes(recipe_ingredient_ids, ingredient_ids)
+        similarity_index.add_recipes(recipe_ingredient_ids)
+        pantry_matrix.add_recipes([(recipe_id, number_of_portions, items)], ingredient_ids)
+
+    for table_name, name_ids in created_names:
+        name_indexes[table_name].add_names(name_ids)
+
+    for recipes, ingredient_ids, tool_ids in created:
+        name_indexes["ingredients"].count_recipes(Counter(ingredient_ids[ingredient.name]
+                                                          for _, recipe in recipes
+                                                          for ingredient in recipe.ingredients))
+        name_indexes["kitchen_tools"].count_recipes(Counter(tool_ids[tool.name]
+                                                            for _, recipe in recipes for tool in recipe.tools))
+
+    for _, _, _, _, added_ingredient_ids, added_tool_ids in relinked:
+        name_indexes["ingredients"].count_recipes(dict.fromkeys(added_ingredient_ids, 1))
+        name_indexes["kitchen_tools"].count_recipes(dict.fromkeys(added_tool_ids, 1))
+
+    for ingredient_ids, tool_ids in released_names:
+        name_indexes["ingredients"].count_recipes(dict.fromkeys(ingredient_ids, -1))
+        name_indexes["kitchen_tools"].count_recipes(dict.fromkeys(tool_ids, -1))
+
+    for table_name, name_ids in removed_names:
+        name_indexes[table_name].remove_names(name_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_recipe_marks(session):
+    """
+    Dropping the marks of a rolled back transaction.
+    """
+
+    for key in ("created_recipes", "changed_recipes", "relinked_recipes", "deleted_recipes", "collections_changed",
+                "created_names", "released_names", "removed_names"):
+        session.info.pop(key, None)
+
 """
 COLLECIONS
 """
@@ -198,6 +1173,7 @@ def create_collection(session, collection: CollectionCreate) -> int:
 
     new_collection = Collections(name=collection.name)
     session.add(new_collection)
+    mark_collections_changed(session)
     session.commit()
 
     return new_collection.id
@@ -214,6 +1190,7 @@ def add_recipe_to_collection(session,
                                               collection_id = collection_id)
     
     session.add(new_recipe_collection)
+    mark_collections_changed(session)
     session.commit()
 
 
@@ -234,22 +1211,25 @@ def get_or_create_ingredient(session, name: str) -> Ingredients:
     Returning ingredient object with the given name. 
     Creating it if it does not exist.
     """
-    ingredient = session.execute(
-        select(Ingredients)
-        .where(Ingredients.name == name)
-    ).scalar_one_or_none()
+    ingredient_id = get_or_create_ingredients(session, {name})[name]
 
-    if ingredient is None:
-        ingredient = Ingredients(name=name)
-        session.add(ingredient)
-        session.flush() 
+    return session.get(Ingredients, ingredient_id)
 
-    return ingredient
+
+def get_or_create_ingredients(session, names: set[str]) -> dict[str, int]:
+    """
+    Returning a mapping from name to ID for all given ingredient names.
+    Creating the missing ones with a single multi-row upsert,
+    so concurrent writers can never create the same name twice.
+    """
+
+    return get_or_create_names(session, Ingredients, names)
 
 
 def delete_not_used_ingredients(session):
     """
     Removing all ingredients from the database which are not used in any recipe anymore.
+    Scans the whole table, prefer delete_orphaned_ingredients or sweep_orphans.
     """
 
     ingredients_in_recipes = session.query(RecipeIngredients.ingredient_id)
@@ -257,7 +1237,28 @@ def delete_not_used_ingredients(session):
                   ).filter(~Ingredients.id.in_(ingredients_in_recipes)
                   ).delete(synchronize_session=False)
     
-    session.flush
+    session.flush()
+
+
+def delete_orphaned_ingredients(session, ingredient_ids: list[int]) -> int:
+    """
+    Removing those of the given ingredients which are not used in any recipe anymore.
+    Output: number of removed ingredients
+    """
+
+    if not ingredient_ids:
+        return 0
+
+    removed = session.scalars(
+        delete(Ingredients)
+        .where(Ingredients.id.in_(ingredient_ids),
+               ~exists().where(RecipeIngredients.ingredient_id == Ingredients.id))
+        .returning(Ingredients.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    mark_names_removed(session, Ingredients, removed)
+
+    return len(removed)
 
 """
 KItCHENTOOLS
@@ -268,16 +1269,78 @@ def get_or_create_kitchen_tool(session, name: str) -> KitchenTools:
     Returning kitchen tool object with the given name. 
     Creating it if it does not exist.
     """
-    tool = session.execute(
-        select(KitchenTools).where(KitchenTools.name == name)
-    ).scalar_one_or_none()
+    tool_id = get_or_create_kitchen_tools(session, {name})[name]
+
+    return session.get(KitchenTools, tool_id)
 
-    if tool is None:
-        tool = KitchenTools(name=name)
-        session.add(tool)
-        session.flush()
 
-    return tool
+def delete_orphaned_kitchen_tools(session, tool_ids: list[int]) -> int:
+    """
+    Removing those of the given kitchen tools which are not used in any recipe anymore.
+    Output: number of removed kitchen tools
+    """
+
+    if not tool_ids:
+        return 0
+
+    removed = session.scalars(
+        delete(KitchenTools)
+        .where(KitchenTools.id.in_(tool_ids),
+               ~exists().where(RecipeTools.tool_id == KitchenTools.id))
+        .returning(KitchenTools.id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    mark_names_removed(session, KitchenTools, removed)
+
+    return len(removed)
+
+
+def get_or_create_kitchen_tools(session, names: set[str]) -> dict[str, int]:
+    """
+    Returning a mapping from name to ID for all given kitchen tool names.
+    Creating the missing ones with a single multi-row upsert,
+    so concurrent writers can never create the same name twice.
+    """
+
+    return get_or_create_names(session, KitchenTools, names)
+
+
+def get_or_create_names(session, model, names: set[str]) -> dict[str, int]:
+    """
+    Resolving names of a master table (ingredients, kitchen tools) to their IDs.
+    Existing names are looked up at once, missing ones are inserted with ON CONFLICT DO NOTHING.
+    Names inserted concurrently by another transaction are picked up by a final lookup.
+    Names are always handled in sorted order: concurrent inserts of overlapping names then wait
+    for each other's entries of the unique index in the same order and can not deadlock.
+    """
+
+    if not names:
+        return {}
+
+    name_ids = dict(session.execute(
+        select(model.name, model.id)
+        .where(model.name.in_(sorted(names)))
+    ).all())
+
+    missing = names - name_ids.keys()
+    if missing:
+        created = dict(session.execute(
+            dialect_insert(session, model)
+            .values([{"name": name} for name in sorted(missing)])
+            .on_conflict_do_nothing(index_elements=["name"])
+            .returning(model.name, model.id)
+        ).all())
+        name_ids.update(created)
+        mark_names_created(session, model, created)
+
+    missing -= name_ids.keys()
+    if missing:
+        name_ids.update(session.execute(
+            select(model.name, model.id)
+            .where(model.name.in_(sorted(missing)))
+        ).all())
+
+    return name_ids
 
 
 
@@ -302,6 +1365,7 @@ def get_recipes_by_ingredients(session, ingredient_list: list):
     recipe_list = session.execute(
         select(Recipes)
         .join(Recipes.ingredients)
+        .join(RecipeIngredients.ingredient)
         .where(Ingredients.name.in_(ingredient_list))
         .group_by(Recipes.id)
         .having(func.count(func.distinct(Ingredients.id)) == len(ingredient_list))
@@ -321,6 +1385,7 @@ def get_best_recipes_for_ingredients(session, ingredient_list: list):
         select(Recipes, 
                func.count(func.distinct(Ingredients.id)).label("matching_ingredients_count"))
         .join(Recipes.ingredients)
+        .join(RecipeIngredients.ingredient)
         .where(Ingredients.name.in_(ingredient_list))
         .group_by(Recipes.id)
         .order_by(desc("matching_ingredients_count"))
@@ -337,20 +1402,22 @@ def get_best_recipes_for_ingredients_with_quantity(session,
     Sorting the list descending by the number of matching ingredients.
     Each recipe-dictionary in the output contains a dictionary with the matching ingredients and
     their needed amount for the given number of poortions.
+    See pantry_matrix for ranking by the available quantities.
     Output: [{Recipe, Number of matching ingredients, {ingredient: {quantity, unit}}}]
     """
 
     recipe_ingredient_list = session.execute(
-        select(Recipes, 
-               func.count(func.distinct(Ingredients.id)).label("matching_ingredients_count"),
+        select(Recipes,
                Ingredients.name,
-               RecipeIngredients.quantity * number_of_portions / Recipes.number_of_portions.label("scaled_quantity"), 
+               (RecipeIngredients.quantity * number_of_portions
+                / func.nullif(Recipes.number_of_portions, 0)).label("scaled_quantity"),
                RecipeIngredients.unit)
         .join(RecipeIngredients,
               RecipeIngredients.recipe_id == Recipes.id)
         .join(Ingredients,
               RecipeIngredients.ingredient_id == Ingredients.id)
         .where(Ingredients.name.in_(ingredient_list))
+        .order_by(Recipes.id)
     ).all()
 
     recipe_map = {}
@@ -363,7 +1430,7 @@ def get_best_recipes_for_ingredients_with_quantity(session,
         recipe_map[recipe.id]["matching_ingredients_count"] += 1
         recipe_map[recipe.id]["ingredients"][ing] = {"quantity": qnt, "unit": u}
 
-    recipe_list = sorted(recipe_map.values(), key=lambda x: x["matching_count"], reverse=True)
+    recipe_list = sorted(recipe_map.values(), key=lambda x: x["matching_ingredients_count"], reverse=True)
 
     return recipe_list
 
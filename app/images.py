@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# uploaded images and their thumbnails, stored under the SHA-256 of the original file
+IMAGE_DIR = os.getenv("IMAGE_DIR", "media")
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+
+# a few kilobytes of PNG or GIF can decode to gigabytes of pixels, larger images are rejected before decoding
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(40_000_000)))
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# every thumbnail has the same size, images of other aspect ratios are cropped around their center
+THUMBNAIL_SIZE = (400, 300)
+THUMBNAIL_QUALITY = 85
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+# Pillow format -> file extension of the accepted uploads
+IMAGE_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+MEDIA_TYPES = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp", "gif": "image/gif"}
+
+# file names are content hashes, so the path of a name never points outside IMAGE_DIR
+IMAGE_NAME = re.compile(r"[0-9a-f]{64}\.(jpg|png|webp|gif)")
+
+logger = logging.getLogger(__name__)
+
+
+def original_path(name: str) -> str:
+    # two levels keep the directories small with many images
+    return os.path.join(IMAGE_DIR, "originals", name[:2], name)
+
+
+def thumbnail_path(name: str) -> str:
+    # thumbnails are JPEG whatever the format of the original
+    return os.path.join(IMAGE_DIR, "thumbnails", name[:2], f"{name.split('.')[0]}.jpg")
+
+
+def image_urls(name: str) -> tuple[str, str]:
+    """
+    Returning the URLs of the stored image with the given file name and of its thumbnail.
+    """
+
+    return f"/images/{name}", f"/images/{name}/thumbnail"
+
+
+def write_atomically(path: str, write):
+    """
+    Writing a file through a temporary file in the same directory, readers never see a partial file.
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, partial = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".partial")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            write(file)
+        os.replace(partial, path)
+    except BaseException:
+        os.unlink(partial)
+        raise
+
+
+def store_image(content: bytes) -> str:
+    """
+    Storing an uploaded image under the hash of its content, the same image is only stored once.
+    Raising ValueError if the content is not an image of an accepted format or has more than MAX_IMAGE_PIXELS.
+    Output: file name of the stored image, e.g. "<sha256>.jpg"
+    """
+
+    try:
+        with Image.open(BytesIO(content)) as image:
+            image_format = image.format
+            # Pillow only raises above twice its limit and warns below, the header has the size
+            if image.width * image.height > MAX_IMAGE_PIXELS:
+                raise Image.DecompressionBombError(f"{image.width}x{image.height} pixels, "
+                                                   f"at most {MAX_IMAGE_PIXELS} pixels are allowed")
+            # checks the file structure without decoding all pixels
+            image.verify()
+    except UnidentifiedImageError:
+        raise ValueError("Not an image file.")
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Not a valid image: {str(e)}")
+
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format {image_format}, expected one of {', '.join(IMAGE_FORMATS)}")
+
+    name = f"{hashlib.sha256(content).hexdigest()}.{IMAGE_FORMATS[image_format]}"
+    path = original_path(name)
+
+    if not os.path.exists(path):
+        write_atomically(path, lambda file: file.write(content))
+
+    return name
+
+
+def make_thumbnail(name: str) -> str:
+    """
+    Writing the thumbnail of the stored image with the given file name as JPEG.
+    Raising ValueError if the image can not be decoded or has more than MAX_IMAGE_PIXELS,
+    e.g. stored before the limit was lowered.
+    Output: path of the thumbnail
+    """
+
+    path = thumbnail_path(name)
+    if os.path.exists(path):
+        return path
+
+    try:
+        with Image.open(original_path(name)) as image:
+            if image.width * image.height > MAX_IMAGE_PIXELS:
+                raise Image.DecompressionBombError(f"{image.width}x{image.height} pixels")
+            # lets the JPEG decoder scale down while decoding, which is much faster for large photos
+            image.draft("RGB", (THUMBNAIL_SIZE[0] * 2, THUMBNAIL_SIZE[1] * 2))
+            # photos are often stored rotated, with the orientation in their EXIF data
+            image = ImageOps.exif_transpose(image)
+            thumbnail = ImageOps.fit(image.convert("RGB"), THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    except (UnidentifiedImageError, Image.DecompressionBombError, SyntaxError) as e:
+        raise ValueError(f"Not a valid image: {str(e)}")
+
+    write_atomically(path, lambda file: thumbnail.save(file, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True))
+
+    return path
+
+
+class ThumbnailWorkers:
+    """
+    Pool of threads generating thumbnails in the background, so uploads return before the resizing is done.
+    Pillow releases the GIL while decoding and resizing, so the threads run in parallel without
+    sending images between processes.
+
+    Every image is generated at most once at a time: requests for a thumbnail that is still pending
+    wait for the same job. Thumbnails missing on disk (e.g. jobs lost on a restart) are generated on request.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending = {}       # image file name -> Future of its thumbnail
+
+    def submit(self, name: str) -> Future:
+        """
+        Scheduling the thumbnail of the stored image with the given file name.
+        Output: Future of the thumbnail path
+        """
+
+        with self.lock:
+            future = self.pending.get(name)
+            if future is not None:
+                return future
+
+            if os.path.exists(thumbnail_path(name)):
+                future = Future()
+                future.set_result(thumbnail_path(name))
+                return future
+
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="thumbnail")
+
+            future = self.executor.submit(make_thumbnail, name)
+            self.pending[name] = future
+
+        future.add_done_callback(lambda done: self.finish(name, done))
+        return future
+
+    def finish(self, name: str, future: Future):
+        with self.lock:
+            if self.pending.get(name) is future:
+                del self.pending[name]
+
+        if future.exception() is not None:
+            logger.error("Could not generate the thumbnail of %s", name, exc_info=future.exception())
+
+    def shutdown(self):
+        """
+        Waiting for the pending thumbnails and stopping the threads.
+        """
+
+        with self.lock:
+            executor, self.executor = self.executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+thumbnail_workers = ThumbnailWorkers(THUMBNAIL_WORKERS)
@@ -0,0 +1,53 @@
+"""
+Command line import of recipes from a JSON array or an NDJSON file.
+
+Usage: python -m app.import_recipes recipes.ndjson [--chunk-size 500]
+       cat recipes.ndjson | python -m app.import_recipes -
+"""
+
+import argparse
+import json
+import sys
+from itertools import chain
+from app.database import SessionLocal
+import app.crud as crud
+
+
+def read_items(file):
+    """
+    Yielding the raw recipes of a JSON array or, line by line, of an NDJSON stream.
+    """
+
+    first_line = file.readline()
+
+    if first_line.lstrip().startswith("["):
+        yield from json.loads(first_line + file.read())
+        return
+
+    for line in chain([first_line], file):
+        if line.strip():
+            yield line
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Importing recipes in chunks.")
+    parser.add_argument("file", help="JSON array or NDJSON file with recipes, '-' for stdin")
+    parser.add_argument("--chunk-size", type=int, default=500,
+                        help="number of recipes committed together (default: 500)")
+    args = parser.parse_args(argv)
+
+    file = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+
+    with file, SessionLocal() as session:
+        result = crud.bulk_create_recipes(session, read_items(file), args.chunk_size)
+
+    for error in result["errors"]:
+        print(f"Recipe {error['index']}: {error['detail']}", file=sys.stderr)
+
+    print(f"Imported {len(result['created'])} recipes, {len(result['errors'])} failed.")
+
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import threading
+from array import array
+import numpy as np
+from sqlalchemy import select
+from app.models import Ingredients, RecipeIngredients
+
+
+# posting lists with more than one recipe per 32 slots are kept as bitmaps,
+# which are smaller than the int32 array at that density and need no scatter when ranking
+DENSE_RATIO = 32
+DENSE_MIN_RECIPES = 1024
+
+
+class IngredientIndex:
+    """
+    In-memory inverted index from ingredients to the recipes using them.
+
+    Every recipe gets a dense slot number, every ingredient a posting list with the slots of its recipes:
+    a compact int32 array for rare ingredients, a bitmap (bit n = slot n) for frequent ones.
+    Ranking recipes by matching ingredients adds up the bitmaps of the requested ingredients
+    with bit-sliced counters, without touching the database.
+    The index is loaded once and kept up to date by the commit hooks in crud.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.loading = False
+        self.pending = []
+        self.ingredient_ids = {}            # ingredient name -> ingredient ID
+        self.postings = {}                  # ingredient ID -> array of recipe slots or bitmap
+        self.slots = {}                     # recipe ID -> slot
+        self.slot_recipes = array("q")      # slot -> recipe ID, -1 for deleted recipes
+        self.recipe_ingredients = {}        # recipe ID -> ingredient IDs
+
+    def load(self, session):
+        """
+        Building the index from the database and replacing the current one.
+        Changes committed while loading are applied afterwards.
+        """
+
+        with self.lock:
+            self.loading = True
+            self.pending = []
+
+        try:
+            ingredient_ids = dict(session.execute(select(Ingredients.name, Ingredients.id)).all())
+            rows = session.execute(
+                select(RecipeIngredients.recipe_id, RecipeIngredients.ingredient_id)
+                .order_by(RecipeIngredients.recipe_id)
+            ).all()
+        except Exception:
+            with self.lock:
+                self.loading = False
+            raise
+
+        index = IngredientIndex()
+        index.ingredient_ids = ingredient_ids
+        for recipe_id, ingredient_id in rows:
+            index.recipe_ingredients.setdefault(recipe_id, []).append(ingredient_id)
+        for recipe_id, recipe_ingredient_ids in index.recipe_ingredients.items():
+            index.insert(recipe_id, recipe_ingredient_ids)
+
+        with self.lock:
+            self.ingredient_ids = index.ingredient_ids
+            self.postings = index.postings
+            self.slots = index.slots
+            self.slot_recipes = index.slot_recipes
+            self.recipe_ingredients = index.recipe_ingredients
+
+            for change in self.pending:
+                self.apply(*change)
+
+            self.pending = []
+            self.loading = False
+            self.loaded = True
+
+    def add_recipes(self, recipes: list[tuple[int, list[int]]], ingredient_ids: dict[str, int]):
+        """
+        Adding new recipes (recipe ID, ingredient IDs) and learning the given ingredient names.
+        """
+
+        with self.lock:
+            self.apply("add", recipes, ingredient_ids)
+            if self.loading:
+                self.pending.append(("add", recipes, ingredient_ids))
+
+    def remove_recipe(self, recipe_id: int):
+        with self.lock:
+            self.apply("remove", recipe_id)
+            if self.loading:
+                self.pending.append(("remove", recipe_id))
+
+    def apply(self, action: str, *args):
+        """
+        Applying one change. Changes are idempotent, so they can be replayed after a reload.
+        """
+
+        if action == "add":
+            recipes, ingredient_ids = args
+            self.ingredient_ids.update(ingredient_ids)
+            for recipe_id, recipe_ingredient_ids in recipes:
+                if recipe_id not in self.slots:
+                    self.recipe_ingredients[recipe_id] = list(recipe_ingredient_ids)
+                    self.insert(recipe_id, recipe_ingredient_ids)
+
+        elif action == "remove":
+            recipe_id, = args
+            slot = self.slots.pop(recipe_id, None)
+            if slot is None:
+                return
+
+            self.slot_recipes[slot] = -1
+            for ingredient_id in self.recipe_ingredients.pop(recipe_id, []):
+                posting = self.postings[ingredient_id]
+                if isinstance(posting, bytearray):
+                    posting[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
+                else:
+                    posting.remove(slot)
+
+    def insert(self, recipe_id: int, ingredient_ids: list[int]):
+        slot = len(self.slot_recipes)
+        self.slots[recipe_id] = slot
+        self.slot_recipes.append(recipe_id)
+
+        for ingredient_id in ingredient_ids:
+            posting = self.postings.setdefault(ingredient_id, array("i"))
+
+            if isinstance(posting, bytearray):
+                if len(posting) <= slot >> 3:
+                    posting.extend(bytes((slot >> 3) + 1 - len(posting)))
+                posting[slot >> 3] |= 1 << (slot & 7)
+                continue
+
+            posting.append(slot)
+            if len(posting) >= DENSE_MIN_RECIPES and len(posting) * DENSE_RATIO > len(self.slot_recipes):
+                self.postings[ingredient_id] = self.bitmap(posting, len(self.slot_recipes))
+
+    @staticmethod
+    def bitmap(posting, size: int) -> bytearray:
+        """
+        Converting a posting array into a little-endian bitmap with at least the given number of bits.
+        """
+
+        return bytearray(np.packbits(IngredientIndex.bitmap_bits(posting, size), bitorder="little"))
+
+    def match(self, names: list[str], mode: str = "any", k: int = 10) -> list[tuple[int, int]]:
+        """
+        Returning the top k recipes for the given ingredient names.
+        mode "any": recipes containing at least one of the ingredients,
+                    ranked descending by the number of matching ingredients.
+        mode "all": recipes containing all of the ingredients.
+        Ties are ranked by slot, which follows the recipe IDs.
+        Output: [(recipe ID, number of matching ingredients)]
+        """
+
+        with self.lock:
+            ingredient_ids = {self.ingredient_ids.get(name) for name in names}
+            if mode == "all" and None in ingredient_ids:
+                return []
+
+            # 64 bit words, so the bitwise operations below run over 1/64 of the slots
+            size = -(-len(self.slot_recipes) // 64) * 64
+            bitmaps = []
+            for ingredient_id in ingredient_ids:
+                posting = self.postings.get(ingredient_id)
+                if posting is None:
+                    continue
+
+                if isinstance(posting, bytearray):
+                    bitmap = np.zeros(size // 8, dtype=np.uint8)
+                    bitmap[:len(posting)] = np.frombuffer(posting, dtype=np.uint8)
+                else:
+                    bitmap = np.packbits(self.bitmap_bits(posting, size), bitorder="little")
+                bitmaps.append(bitmap.view(np.uint64))
+
+            slot_recipes = self.slot_recipes
+
+            if not bitmaps or (mode == "all" and len(bitmaps) < len(ingredient_ids)):
+                return []
+
+            if mode == "all":
+                groups = [(len(ingredient_ids), np.bitwise_and.reduce(bitmaps))]
+            else:
+                groups = self.count_groups(bitmaps)
+
+            matches = []
+            for count, mask in groups:
+                for slot in self.iter_slots(mask):
+                    matches.append((slot_recipes[slot], count))
+                    if len(matches) >= k:
+                        return matches
+
+        return matches
+
+    @staticmethod
+    def bitmap_bits(posting, size: int):
+        """
+        Returning a boolean array of the given size with the slots of the posting array set.
+        """
+
+        bits = np.zeros(size, dtype=bool)
+        bits[np.frombuffer(posting, dtype=np.int32)] = True
+        return bits
+
+    @staticmethod
+    def iter_slots(mask):
+        """
+        Yielding the set slots of a bitmap in ascending order, only unpacking the words needed.
+        """
+
+        for word in np.flatnonzero(mask):
+            bits = int(mask[word])
+            while bits:
+                lowest = bits & -bits
+                yield int(word) * 64 + lowest.bit_length() - 1
+                bits ^= lowest
+
+    @staticmethod
+    def count_groups(bitmaps: list):
+        """
+        Yielding (count, bitmap of the slots set in exactly count of the given bitmaps),
+        descending by count and leaving out count 0.
+        The counts are kept bit-sliced: planes[i] holds bit i of every slot's count.
+        """
+
+        planes = []
+        for bitmap in bitmaps:
+            carry = bitmap
+            for i, plane in enumerate(planes):
+                planes[i] = plane ^ carry
+                carry = plane & carry
+            if carry.any():
+                planes.append(carry)
+
+        for count in range(len(bitmaps), 0, -1):
+            if count >> len(planes):
+                continue
+
+            mask = None
+            for i, plane in enumerate(planes):
+                bit = plane if count >> i & 1 else ~plane
+                mask = bit if mask is None else mask & bit
+
+            if mask.any():
+                yield count, mask
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,139 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# opt-in, the engine events cost a few microseconds per statement
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "false").lower() in ("1", "true", "yes")
+
+# a statement shape running more often than this in one request is reported as likely N+1 query
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "5"))
+
+# raise RepeatedStatementError instead of logging a warning, meant for test runs
+SQL_REPEAT_STRICT = os.getenv("SQL_REPEAT_STRICT", "false").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger(__name__)
+
+# expanded IN lists and literal numbers would make every call of the same query look different
+IN_LIST = re.compile(r"\bIN \((?:[^()]|\([^()]*\))*\)", re.IGNORECASE)
+NUMBER = re.compile(r"\b\d+\b")
+
+
+class RepeatedStatementError(RuntimeError):
+    pass
+
+
+class RequestStatistics:
+    """
+    Counting the statements of one request and the time spent in the database.
+    Statements of one request can run in several threads, e.g. the threadpool and background tasks.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.statements = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.reported = set()
+
+    def record(self, statement: str, duration: float):
+        shape = statement_shape(statement)
+
+        with self.lock:
+            self.statements += 1
+            self.duration += duration
+            self.shapes[shape] += 1
+            repeated = self.shapes[shape] > SQL_REPEAT_THRESHOLD and shape not in self.reported
+            if repeated:
+                self.reported.add(shape)
+
+        if repeated:
+            message = (f"{self.path}: statement ran more than {SQL_REPEAT_THRESHOLD} times "
+                       f"in one request, probably an N+1 query: {shape}")
+            if SQL_REPEAT_STRICT:
+                raise RepeatedStatementError(message)
+            logger.warning(message)
+
+    def server_timing(self) -> str:
+        with self.lock:
+            return f'db;dur={self.duration * 1000:.2f};desc="{self.statements} statements"'
+
+
+current_statistics: ContextVar[RequestStatistics | None] = ContextVar("current_statistics", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Returning the statement without its variable parts, equal for every call of the same query.
+    """
+
+    return NUMBER.sub("N", IN_LIST.sub("IN (...)", " ".join(statement.split())))
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_statistics.get() is not None:
+        conn.info.setdefault("statement_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statistics = current_statistics.get()
+    if statistics is not None and conn.info.get("statement_start"):
+        statistics.record(statement, time.perf_counter() - conn.info["statement_start"].pop())
+
+
+def handle_error(exception_context):
+    # the failed statement has no after_cursor_execute
+    starts = exception_context.connection.info.get("statement_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+class SQLInstrumentationMiddleware:
+    """
+    ASGI middleware collecting the statements of every request and adding them as Server-Timing header.
+    The crud functions run in the threadpool or in run_sync, both keep the context variable of the request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        statistics = RequestStatistics(scope["path"])
+        token = current_statistics.set(statistics)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", statistics.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_statistics.reset(token)
+            logger.debug("%s %s: %d statements, %.2f ms", scope["method"], scope["path"],
+                         statistics.statements, statistics.duration * 1000)
+
+
+def enable_instrumentation(app):
+    """
+    Listening to the statements of all engines and adding the middleware to the app.
+    """
+
+    if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(Engine, "handle_error", handle_error)
+
+    app.add_middleware(SQLInstrumentationMiddleware)
@@ -1,50 +1,510 @@
-from fastapi import FastAPI, HTTPException, Depends, Query
-from sqlalchemy.orm import Session
-from app.database import get_db
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Literal
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from starlette.formparsers import MultiPartException, MultiPartParser
+from app.cache import recipe_cache, collection_cache, facet_cache
+from app.database import (DbSession, get_db, get_read_db, get_pool_statistics, run_db, run_with_session,
+                          run_for_cache, replicas, async_replicas, watch_replica_health)
+from app.ingredient_index import ingredient_index
+from app.pantry_matrix import pantry_matrix
+from app.name_index import ingredient_names, tool_names, NameIndex
+from app.similarity_index import similarity_index, SIMILARITY_INDEX_PATH
+from app.images import (IMAGE_NAME, MAX_IMAGE_BYTES, MEDIA_TYPES, image_urls, original_path, store_image,
+                        thumbnail_workers)
+from app.instrumentation import SQL_INSTRUMENTATION, enable_instrumentation
+from app.serialization import FAST_SERIALIZATION, JSONBytesResponse, dumps, loads
 import app.crud as crud
 import app.schemas as schemas
 
-app = FastAPI(title="Recipe API")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for index in (ingredient_index, pantry_matrix, ingredient_names, tool_names):
+        try:
+            await ensure_loaded(index)
+        except Exception:
+            # the index is loaded on first use instead, the API itself does not depend on it
+            logger.exception("Could not load %s at startup", type(index).__name__)
+
+    try:
+        await ensure_loaded(similarity_index, SIMILARITY_INDEX_PATH)
+    except Exception:
+        logger.exception("Could not load the similarity index at startup")
+
+    health_task = None
+    if replicas.engines or async_replicas.engines:
+        health_task = asyncio.create_task(watch_replica_health())
+
+    yield
+
+    if health_task is not None:
+        health_task.cancel()
+
+    if SIMILARITY_INDEX_PATH and similarity_index.loaded:
+        # restoring the signatures and sets next time is much faster than hashing all recipes again
+        try:
+            await run_in_threadpool(similarity_index.save, SIMILARITY_INDEX_PATH)
+        except Exception:
+            logger.exception("Could not save the similarity index to %s", SIMILARITY_INDEX_PATH)
+
+    await run_in_threadpool(thumbnail_workers.shutdown)
+
+
+app = FastAPI(title="Recipe API", lifespan=lifespan)
+
+if SQL_INSTRUMENTATION:
+    enable_instrumentation(app)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Checking whether the If-None-Match header of the request contains the given ETag.
+    """
+
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def etag_response(content: bytes, etag: str) -> Response:
+    return Response(content=content,
+                    media_type="application/json",
+                    headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def fast_response(content):
+    """
+    Returning row data as orjson encoded response, skipping the validation against the response model.
+    The rows come from the database in the shape of the response model, so validating them adds nothing.
+    Without FAST_SERIALIZATION the content is returned as it is and goes through the response model.
+    """
+
+    return JSONBytesResponse(content) if FAST_SERIALIZATION else content
+
+
+def parse_fields(fields: str | None, allowed) -> list[str] | None:
+    """
+    Parsing a comma separated list of recipe fields, e.g. "id,name,image_url".
+    Raising HTTPException(400) for unknown fields.
+    """
+
+    if not fields:
+        return None
+
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    return names
+
+
+def parse_ids(ids: str, max_count: int) -> list[int]:
+    """
+    Parsing a comma separated list of IDs, e.g. "3,1,2", keeping the order and dropping repetitions.
+    Raising HTTPException(400) for invalid IDs or more than max_count IDs.
+    """
+
+    try:
+        values = list(dict.fromkeys(int(value) for value in ids.split(",") if value.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="IDs must be comma separated integers.")
+
+    if len(values) > max_count:
+        raise HTTPException(status_code=400, detail=f"At most {max_count} IDs per request.")
+
+    return values
+
+
+# one lock per in-memory index, created on first use on the event loop
+index_locks = {}
+
+
+async def ensure_loaded(index, *args):
+    """
+    Loading an in-memory index from the primary unless it is loaded already.
+    Concurrent requests on a cold index wait for one load instead of each reading all recipes.
+    """
+
+    if index.loaded:
+        return
+
+    async with index_locks.setdefault(id(index), asyncio.Lock()):
+        if not index.loaded:
+            await run_with_session(index.load, *args)
+
 
 @app.get("/")
-def read_root_endpoint():
+async def read_root_endpoint():
     return {"message": "Welcome to Recipe API!"}
 
 
-@app.get("/recipes/{recipe_id}", response_model=schemas.RecipeResponse)
-def read_recipe_endpoint(recipe_id: int, db: Session = Depends(get_db)):
-    recipe = crud.get_full_recipe_by_id(db, recipe_id)
-    return recipe
+@app.get("/stats/cache", response_model=dict[str, schemas.CacheStatisticsResponse])
+async def read_cache_statistics_endpoint():
+    return {"recipes": recipe_cache.statistics(),
+            "collections": collection_cache.statistics(),
+            "facets": facet_cache.statistics()}
 
 
-@app.delete("/recipes/{recipe_id}", status_code=201)
-def delete_recipe_by_id_endpoint(recipe_id: int, db: Session = Depends(get_db)):
-    crud.delete_recipe_by_id(db, recipe_id)
+@app.get("/stats/pool", response_model=dict[str, schemas.PoolStatisticsResponse])
+async def read_pool_statistics_endpoint():
+    return get_pool_statistics()
 
 
-@app.get("/recipes/all/{skip}", response_model=list[schemas.RecipeListResponse])
-def read_all_recipes_endpoint(db: Session = Depends(get_db), 
-                     skip: int = 0,
-                     limit: int = 10):
-    recipe_list = crud.get_all_recipes(db, skip, limit)
-    return recipe_list
+# static paths are registered before /recipes/{recipe_id} and /recipes/all/{skip},
+# otherwise their last segment would be parsed as the integer path parameter
+
+@app.get("/recipes", response_model=schemas.RecipeBatchResponse)
+async def read_recipes_batch_endpoint(db: DbSession = Depends(get_read_db),
+                                      ids: str = Query(min_length=1)):
+    """
+    Returning full recipes for a comma separated list of IDs in the given order, and the IDs without a recipe.
+    """
+    recipe_ids = parse_ids(ids, 1000)
+
+    # the encoded recipes are the cached content of /recipes/{recipe_id}, spliced into one response
+    generation = recipe_cache.generation()
+    contents = {}
+    for recipe_id in recipe_ids:
+        cached = recipe_cache.get(recipe_id)
+        if cached is not None:
+            contents[recipe_id] = cached[1]
+
+    remaining = [recipe_id for recipe_id in recipe_ids if recipe_id not in contents]
+    if remaining:
+        documents = await run_for_cache(db, crud.get_recipe_documents, remaining)
+        remaining = [recipe_id for recipe_id in remaining if recipe_id not in documents]
+
+        if remaining:
+            # recipes without a document (yet), with one query for the recipes and per relationship
+            recipes = await run_for_cache(db, crud.get_full_recipes_by_ids, remaining)
+            documents.update((recipe.id, (recipe.version,
+                                          schemas.RecipeResponse.model_validate(recipe).model_dump_json().encode()))
+                             for recipe in recipes)
+
+        for recipe_id, document in documents.items():
+            recipe_cache.set(recipe_id, document, generation)
+            contents[recipe_id] = document[1]
+
+    found = [contents[recipe_id] for recipe_id in recipe_ids if recipe_id in contents]
+    missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in contents]
+
+    return JSONBytesResponse(b'{"recipes":[' + b",".join(found) + b'],"missing":' + dumps(missing) + b"}")
+
+
+@app.get("/recipes/all", response_model=schemas.RecipeListPage, response_model_exclude_unset=True)
+async def read_recipes_page_endpoint(db: DbSession = Depends(get_read_db),
+                               meal_types: list[str] = Query(default=None),
+                               nationalities: list[str] = Query(default=None),
+                               collections: list[int] = Query(default=None),
+                               cursor: str | None = None,
+                               limit: int = Query(default=10, ge=1, le=100),
+                               fields: str | None = None):
+    recipe_list, next_cursor = await run_db(db, crud.get_recipes_page, meal_types, nationalities, collections, cursor, limit,
+                                            parse_fields(fields, crud.RECIPE_FIELDS))
+    return fast_response({"items": recipe_list, "next_cursor": next_cursor})
+
+
+@app.get("/recipes/facets", response_model=schemas.RecipeFacetsResponse)
+async def read_recipe_facets_endpoint(db: DbSession = Depends(get_read_db),
+                                      meal_types: list[str] = Query(default=None),
+                                      nationalities: list[str] = Query(default=None),
+                                      collections: list[int] = Query(default=None)):
+    # the order and repetition of filter values do not change the counts
+    key = tuple(tuple(sorted(set(values or ()))) for values in (meal_types, nationalities, collections))
+    content = facet_cache.get(key)
+
+    if content is None:
+        generation = facet_cache.generation()
+        facets = await run_for_cache(db, crud.get_recipe_facets, *(list(values) or None for values in key))
+        # cached encoded, hits send the bytes without encoding them again
+        content = dumps({"total": facets["total"],
+                         "meal_types": [{"value": value, "count": count} for value, count in facets["meal_types"]],
+                         "nationalities": [{"value": value, "count": count}
+                                           for value, count in facets["nationalities"]],
+                         "collections": [{"collection_id": collection_id, "count": count}
+                                         for collection_id, count in facets["collections"]]})
+        facet_cache.set(key, content, generation)
+
+    return JSONBytesResponse(content)
+
+
+@app.get("/recipes/match", response_model=list[schemas.RecipeMatchResponse])
+async def match_recipes_endpoint(db: DbSession = Depends(get_read_db),
+                                 ingredients: list[str] = Query(),
+                                 mode: Literal["any", "all"] = "any",
+                                 k: int = Query(default=10, ge=1, le=100)):
+    # loaded from the primary, a lagging replica could miss recipes the index already got from the commit hooks
+    await ensure_loaded(ingredient_index)
+
+    matches = ingredient_index.match(ingredients, mode, k)
+    recipe_list = await run_db(db, crud.get_recipes_by_ids, [recipe_id for recipe_id, _ in matches])
+    counts = dict(matches)
 
+    return fast_response([{"recipe": recipe, "matching_ingredients_count": counts[recipe["id"]]}
+                          for recipe in recipe_list])
 
-@app.get("/recipes/all/filtered", response_model=list[schemas.RecipeListResponse])
-def read_filtered_recipes_endpoint(db: Session = Depends(get_db),
+
+@app.get("/recipes/search", response_model=list[schemas.RecipeFieldsResponse], response_model_exclude_unset=True)
+async def search_recipes_endpoint(db: DbSession = Depends(get_read_db),
+                                  q: str = Query(min_length=1),
+                                  meal_types: list[str] = Query(default=None),
+                                  nationalities: list[str] = Query(default=None),
+                                  collections: list[int] = Query(default=None),
+                                  skip: int = 0,
+                                  limit: int = Query(default=10, ge=1, le=100),
+                                  fields: str | None = None):
+    recipe_list = await run_db(db, crud.search_recipes, q, meal_types, nationalities, collections, skip, limit,
+                               parse_fields(fields, crud.RECIPE_FIELDS))
+    return fast_response(recipe_list)
+
+
+@app.get("/recipes/all/filtered", response_model=list[schemas.RecipeFieldsResponse], response_model_exclude_unset=True)
+async def read_filtered_recipes_endpoint(db: DbSession = Depends(get_read_db),
                           meal_types: list[str] = Query(default=None),
                           nationalities: list[str] = Query(default=None),
                           collections: list[int] = Query(default=None),
+                          collection_mode: Literal["any", "all"] = "any",
+                          ingredients: list[str] = Query(default=None),
+                          ingredient_mode: Literal["any", "all"] = "all",
+                          exclude_ingredients: list[str] = Query(default=None),
+                          tools: list[str] = Query(default=None),
+                          tool_mode: Literal["any", "all"] = "all",
                           skip: int = 0,
-                          limit: int = 10):
-    recipe_list = crud.get_recipes_filtered(db, meal_types, nationalities, collections, skip, limit)
-    return recipe_list
+                          limit: int = 10,
+                          fields: str | None = None):
+    recipe_list = await run_db(db, crud.get_recipes_filtered, meal_types, nationalities, collections, skip, limit,
+                               collection_mode=collection_mode,
+                               ingredients=ingredients,
+                               ingredient_mode=ingredient_mode,
+                               excluded_ingredients=exclude_ingredients,
+                               tools=tools,
+                               tool_mode=tool_mode,
+                               fields=parse_fields(fields, crud.RECIPE_FIELDS))
+    return fast_response(recipe_list)
+
+
+@app.get("/recipes/all/{skip}", response_model=list[schemas.RecipeFieldsResponse], response_model_exclude_unset=True)
+async def read_all_recipes_endpoint(db: DbSession = Depends(get_read_db), 
+                     skip: int = 0,
+                     limit: int = 10,
+                     fields: str | None = None):
+    recipe_list = await run_db(db, crud.get_all_recipes, skip, limit, parse_fields(fields, crud.RECIPE_FIELDS))
+    return fast_response(recipe_list)
+
+
+@app.get("/recipes/{recipe_id}", response_model=schemas.RecipeResponse)
+async def read_recipe_endpoint(recipe_id: int, request: Request, db: DbSession = Depends(get_read_db),
+                               fields: str | None = None):
+    selected = parse_fields(fields, crud.DETAIL_FIELDS)
+    if selected is not None:
+        return await read_recipe_fields(recipe_id, selected, request, db)
+
+    cached = recipe_cache.get(recipe_id)
+
+    if cached is not None:
+        version, content = cached
+        etag = f'"{recipe_id}.{version}"'
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+        return etag_response(content, etag)
+
+    generation = recipe_cache.generation()
+    # the materialized document is one primary key read, recipes created before the backfill have none,
+    # misses are read from the primary, see run_for_cache
+    document = await run_for_cache(db, crud.get_recipe_document, recipe_id)
+
+    if document is not None:
+        version, content = document
+        recipe_cache.set(recipe_id, document, generation)
+        etag = f'"{recipe_id}.{version}"'
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+        return etag_response(content, etag)
+
+    if request.headers.get("if-none-match"):
+        # the version alone decides a 304, without loading ingredients and tools
+        version = await run_db(db, crud.get_recipe_version, recipe_id)
+        etag = f'"{recipe_id}.{version}"'
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+
+    if FAST_SERIALIZATION:
+        # plain rows instead of ORM objects with their ingredient and tool relationships
+        version, recipe = await run_for_cache(db, crud.get_recipe_fields, recipe_id, list(crud.DETAIL_FIELDS))
+        content = dumps(recipe)
+    else:
+        recipe = await run_for_cache(db, crud.get_full_recipe_by_id, recipe_id)
+        version, content = recipe.version, schemas.RecipeResponse.model_validate(recipe).model_dump_json().encode()
+    recipe_cache.set(recipe_id, (version, content), generation)
+
+    return etag_response(content, f'"{recipe_id}.{version}"')
+
+
+async def read_recipe_fields(recipe_id: int, fields: list[str], request: Request, db: DbSession) -> Response:
+    """
+    Returning the requested fields of a recipe, projected from the cached full recipe if there is one,
+    otherwise selecting only the needed columns.
+    """
+
+    # the version and the fields make up the ETag, the same recipe has another one per field selection
+    fields = ["id", *(field for field in fields if field != "id")]
+    cached = recipe_cache.get(recipe_id)
+
+    if cached is not None:
+        version, content = cached
+        etag = f'"{recipe_id}.{version}.{"+".join(fields)}"'
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+        recipe = loads(content)
+        # documents written before a field existed do not have it, the field is null for them
+        return etag_response(dumps({field: recipe.get(field) for field in fields}), etag)
+
+    if request.headers.get("if-none-match"):
+        version = await run_db(db, crud.get_recipe_version, recipe_id)
+        etag = f'"{recipe_id}.{version}.{"+".join(fields)}"'
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+
+    version, recipe = await run_db(db, crud.get_recipe_fields, recipe_id, fields)
+    if FAST_SERIALIZATION:
+        content = dumps(recipe)
+    else:
+        content = schemas.RecipeFieldsResponse.model_validate(recipe).model_dump_json(exclude_unset=True).encode()
+
+    return etag_response(content, f'"{recipe_id}.{version}.{"+".join(fields)}"')
+
+
+@app.get("/recipes/{recipe_id}/similar", response_model=list[schemas.SimilarRecipeResponse])
+async def read_similar_recipes_endpoint(recipe_id: int,
+                                        db: DbSession = Depends(get_read_db),
+                                        k: int = Query(default=10, ge=1, le=100)):
+    await ensure_loaded(similarity_index, SIMILARITY_INDEX_PATH)
+
+    # neighbours among the LSH candidates of the in-memory index, without comparing ingredient sets in the database
+    matches = await run_in_threadpool(similarity_index.similar, recipe_id, k)
+    if matches is None:
+        # recipes without ingredients are not indexed, unknown recipes are a 404
+        await run_db(db, crud.get_recipe_version, recipe_id)
+        return fast_response([])
+
+    recipe_list = await run_db(db, crud.get_recipes_by_ids, [match_id for match_id, _ in matches])
+    recipes = {recipe["id"]: recipe for recipe in recipe_list}
+
+    return fast_response([{"recipe": recipes[match_id], "similarity": round(similarity, 4)}
+                          for match_id, similarity in matches if match_id in recipes])
+
+
+# the body is parsed by read_image_upload, documented here as the form File() parameter would be
+IMAGE_UPLOAD_BODY = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["image"], "properties": {"image": {"type": "string", "format": "binary"}}}}}}}
+
+# boundaries, part headers and small form fields around the image in a multipart body
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+@app.post("/recipes/{recipe_id}/image", response_model=schemas.RecipeImageResponse, status_code=201,
+          openapi_extra=IMAGE_UPLOAD_BODY)
+async def upload_recipe_image_endpoint(recipe_id: int,
+                                       request: Request,
+                                       db: DbSession = Depends(get_db)):
+    # unknown recipes are a 404 before the body is read
+    await run_db(db, crud.get_recipe_version, recipe_id)
+
+    content = await read_image_upload(request)
+
+    try:
+        # hashing and checking the image take a few milliseconds for large files
+        name = await run_in_threadpool(store_image, content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not store image: {str(e)}")
+
+    image_url, thumbnail_url = image_urls(name)
+    await run_db(db, crud.set_recipe_image, recipe_id, image_url, thumbnail_url)
+
+    # the thumbnail URL is valid right away, requests before the thumbnail is written wait for it
+    thumbnail_workers.submit(name)
+
+    return {"image_url": image_url, "thumbnail_url": thumbnail_url}
+
+
+async def read_image_upload(request: Request) -> bytes:
+    """
+    Reading the "image" file of a multipart/form-data upload.
+    The body is parsed while it arrives and reading stops as soon as it exceeds the size limit,
+    so oversized uploads are never received in full.
+    Raising HTTPException(413) for images over MAX_IMAGE_BYTES, HTTPException(400) for invalid forms.
+    """
+
+    limit = MAX_IMAGE_BYTES + MULTIPART_OVERHEAD
+    too_large = HTTPException(status_code=413, detail=f"Images can have at most {MAX_IMAGE_BYTES} bytes.")
+
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload with an image file.")
+
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > limit:
+        raise too_large
+
+    async def limited_stream():
+        received = 0
+        async for data in request.stream():
+            received += len(data)
+            if received > limit:
+                raise too_large
+            yield data
+
+    try:
+        form = await MultiPartParser(request.headers, limited_stream(), max_files=1, max_fields=10).parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=f"Invalid upload: {e.message}")
+
+    try:
+        image = form.get("image")
+        if image is None or isinstance(image, str):
+            raise HTTPException(status_code=400, detail="Expected an image file in the form field image.")
+        content = await image.read(MAX_IMAGE_BYTES + 1)
+    finally:
+        await form.close()
+
+    if len(content) > MAX_IMAGE_BYTES:
+        raise too_large
+
+    return content
+
+
+@app.delete("/recipes/{recipe_id}", status_code=201)
+async def delete_recipe_by_id_endpoint(recipe_id: int,
+                                       background_tasks: BackgroundTasks,
+                                       defer_cleanup: bool = False,
+                                       db: DbSession = Depends(get_db)):
+    deleted = await run_db(db, crud.delete_recipe_by_id, recipe_id, not defer_cleanup)
+
+    if deleted and defer_cleanup:
+        # unused ingredients and tools are removed in batches after the response is sent
+        background_tasks.add_task(run_with_session, crud.delete_orphans, *deleted)
 
 
 @app.post("/recipes/", response_model=schemas.RecipeCreateResponse, status_code=201)
-def create_recipe_endpoint(recipe: schemas.RecipeCreate, db: Session = Depends(get_db)):
+async def create_recipe_endpoint(recipe: schemas.RecipeCreate, db: DbSession = Depends(get_db)):
     try:
-        recipe_id = crud.create_full_recipe(db, recipe)
+        recipe_id = await run_db(db, crud.create_full_recipe, recipe)
         return {"recipe_id": recipe_id}
    
     except ValueError as e:
@@ -54,16 +514,153 @@ def create_recipe_endpoint(recipe: schemas.RecipeCreate, db: Session = Depends(g
         )
 
 
+@app.post("/recipes/bulk", response_model=schemas.BulkImportResponse, status_code=201)
+async def bulk_create_recipes_endpoint(request: Request,
+                                       db: DbSession = Depends(get_db),
+                                       chunk_size: int = Query(default=500, ge=1, le=5000)):
+    """
+    Importing a JSON array or an NDJSON stream (Content-Type: application/x-ndjson) of recipes.
+    NDJSON is read while it arrives, every chunk of lines is imported as soon as it is complete.
+    """
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        result = {"created": [], "errors": []}
+        start = 0
+
+        async for lines in ndjson_chunks(request, chunk_size):
+            chunk_result = await run_db(db, crud.bulk_create_recipes, lines, chunk_size, start)
+            result["created"].extend(chunk_result["created"])
+            result["errors"].extend(chunk_result["errors"])
+            start += len(lines)
+
+        return result
+
+    try:
+        items = json.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {str(e)}")
+
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of recipes.")
+
+    return await run_db(db, crud.bulk_create_recipes, items, chunk_size)
+
+
+async def ndjson_chunks(request: Request, chunk_size: int):
+    """
+    Reading the non-empty lines of an NDJSON request body in lists of chunk_size lines.
+    Lines split across the received body chunks are joined, the whole body is never held in memory.
+    """
+
+    lines = []
+    partial = b""
+
+    async for data in request.stream():
+        *complete, partial = (partial + data).split(b"\n")
+        lines.extend(line for line in complete if line.strip())
+
+        while len(lines) >= chunk_size:
+            yield lines[:chunk_size]
+            lines = lines[chunk_size:]
+
+    if partial.strip():
+        lines.append(partial)
+
+    if lines:
+        yield lines
+
+
+@app.post("/recipes/pantry-match", response_model=list[schemas.PantryMatchResponse])
+async def match_pantry_endpoint(request: schemas.PantryMatchRequest, db: DbSession = Depends(get_read_db)):
+    await ensure_loaded(pantry_matrix)
+
+    # scores every recipe, which takes a few milliseconds on large databases
+    matches = await run_in_threadpool(pantry_matrix.match,
+                                      [(item.name, item.quantity, item.unit) for item in request.pantry],
+                                      request.portions,
+                                      request.k)
+    recipe_list = await run_db(db, crud.get_recipes_by_ids, [match["recipe_id"] for match in matches])
+    recipes = {recipe["id"]: recipe for recipe in recipe_list}
+
+    return fast_response([{"recipe": recipes[match["recipe_id"]],
+                           "matching_ingredients_count": match["matching_ingredients_count"],
+                           "missing_ingredients_count": match["missing_ingredients_count"],
+                           "missing": [{"name": name, "quantity": quantity, "unit": unit}
+                                       for name, quantity, unit in match["missing"]]}
+                          for match in matches if match["recipe_id"] in recipes])
+
+
+@app.post("/recipes/shopping-list", response_model=list[schemas.ShoppingListItem])
+async def create_shopping_list_endpoint(meal_plan: schemas.ShoppingListRequest, db: DbSession = Depends(get_read_db)):
+    return await run_db(db, crud.get_shopping_list,
+                        [(entry.recipe_id, entry.portions) for entry in meal_plan.recipes])
+
+
+@app.get("/ingredients/autocomplete", response_model=list[schemas.NameSuggestion])
+async def autocomplete_ingredients_endpoint(q: str = Query(min_length=1),
+                                            limit: int = Query(default=10, ge=1, le=50)):
+    return await autocomplete(ingredient_names, q, limit)
+
+
+@app.get("/tools/autocomplete", response_model=list[schemas.NameSuggestion])
+async def autocomplete_tools_endpoint(q: str = Query(min_length=1),
+                                      limit: int = Query(default=10, ge=1, le=50)):
+    return await autocomplete(tool_names, q, limit)
+
+
+async def autocomplete(index: NameIndex, prefix: str, limit: int):
+    # served from memory on every keystroke, the database is only read to load the index
+    await ensure_loaded(index)
+
+    return fast_response([{"name": name, "recipe_count": count} for name, count in index.complete(prefix, limit)])
+
+
+# stored images never change under their name (the hash of their content), so clients can cache them for good
+IMMUTABLE = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+
+@app.get("/images/{name}", response_class=FileResponse)
+async def read_image_endpoint(name: str):
+    if not IMAGE_NAME.fullmatch(name) or not await run_in_threadpool(os.path.exists, original_path(name)):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    return FileResponse(original_path(name), media_type=MEDIA_TYPES[name.split(".")[1]], headers=IMMUTABLE)
+
+
+@app.get("/images/{name}/thumbnail", response_class=FileResponse)
+async def read_thumbnail_endpoint(name: str):
+    if not IMAGE_NAME.fullmatch(name) or not await run_in_threadpool(os.path.exists, original_path(name)):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # usually written already, otherwise waiting for the pending job or generating it now
+    try:
+        path = await asyncio.wrap_future(thumbnail_workers.submit(name))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not generate the thumbnail: {str(e)}")
+    return FileResponse(path, media_type="image/jpeg", headers=IMMUTABLE)
+
+
 @app.get("/collections/all", response_model=list[schemas.CollectionResponse])
-def read_all_collections_endpoint(db: Session = Depends(get_db)):
-    collections_list = crud.get_all_collections(db)
-    return collections_list
+async def read_all_collections_endpoint(request: Request, db: DbSession = Depends(get_read_db)):
+    content = collection_cache.get("all")
+
+    if content is None:
+        generation = collection_cache.generation()
+        collections_list = await run_for_cache(db, crud.get_all_collections)
+        content = dumps([schemas.CollectionResponse.model_validate(collection).model_dump()
+                         for collection in collections_list])
+        collection_cache.set("all", content, generation)
+
+    etag = f'"{hashlib.sha1(content).hexdigest()}"'
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+
+    return etag_response(content, etag)
 
 
 @app.post("/collections/new", response_model=schemas.CollectionCreateResponse, status_code=201)
-def create_collection_endpoint(collection: schemas.CollectionCreate, db: Session = Depends(get_db)):
+async def create_collection_endpoint(collection: schemas.CollectionCreate, db: DbSession = Depends(get_db)):
     try:
-        collection_id = crud.create_collection(db, collection)
+        collection_id = await run_db(db, crud.create_collection, collection)
         return {"collection_id": collection_id}
     
     except ValueError as e:
@@ -74,9 +671,9 @@ def create_collection_endpoint(collection: schemas.CollectionCreate, db: Session
     
 
 @app.post("/collections/", status_code=201)
-def add_recipe_to_collection_endpoint(recipe_id: int, collection_id: int, db: Session = Depends(get_db)):
+async def add_recipe_to_collection_endpoint(recipe_id: int, collection_id: int, db: DbSession = Depends(get_db)):
     try:
-        crud.add_recipe_to_collection(db, recipe_id, collection_id)
+        await run_db(db, crud.add_recipe_to_collection, recipe_id, collection_id)
         return {"New recipe in collection."}
 
     except ValueError as e:
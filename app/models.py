@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, Date, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, Date, Text, Index, DDL, event
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.ext.associationproxy import association_proxy
 
@@ -9,7 +9,7 @@ Base = declarative_base()
 class KitchenTools(Base):
     __tablename__ = "kitchen_tools"
     id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, unique=True)
     given = Column(Boolean, default=False)
     
     recipes = relationship("RecipeTools", back_populates="tool", cascade="all, delete-orphan")
@@ -17,7 +17,7 @@ class KitchenTools(Base):
 class Ingredients(Base):
 	__tablename__ = "ingredients"
 	id = Column(Integer, primary_key=True)
-	name = Column(String, nullable=False)
+	name = Column(String, nullable=False, unique=True)
 	
 	recipes = relationship("RecipeIngredients", back_populates="ingredient", cascade="all, delete-orphan")    
      
@@ -41,6 +41,8 @@ class Recipes(Base):
     nationality = Column(String, nullable=True)
     notes = Column(Text, nullable=True)
     image_url = Column(Text, nullable=True)
+    thumbnail_url = Column(Text, nullable=True)
+    version = Column(Integer, nullable=False, server_default="1")
 
     ingredients = relationship("RecipeIngredients", back_populates="recipe", cascade="all, delete-orphan")
     ingredient_names = association_proxy("ingredients", "ingredient.name")
@@ -50,6 +52,15 @@ class Recipes(Base):
 
     collections = relationship("RecipeCollections", back_populates="recipe", cascade="all, delete-orphan")
     collection_names = association_proxy("collections", "collection.name")
+
+    __table_args__ = (
+        Index("ix_recipes_created_at_id", "created_at", "id"),
+        Index("ix_recipes_meal_type_created_at_id", "meal_type", "created_at", "id"),
+        Index("ix_recipes_nationality_created_at_id", "nationality", "created_at", "id"),
+    )
+
+    # incremented by every ORM update, used as ETag of the recipe
+    __mapper_args__ = {"version_id_col": version}
 	
 
 # Connection Tables
@@ -57,7 +68,7 @@ class Recipes(Base):
 class RecipeTools(Base):
     __tablename__ = "recipe_tools"
     recipe_id = Column(Integer, ForeignKey("recipes.id"), primary_key=True)
-    tool_id = Column(Integer, ForeignKey("kitchen_tools.id"), primary_key=True)
+    tool_id = Column(Integer, ForeignKey("kitchen_tools.id"), primary_key=True, index=True)
     
     recipe = relationship("Recipes", back_populates="tools")
     tool = relationship("KitchenTools")
@@ -70,7 +81,7 @@ class RecipeTools(Base):
 class RecipeIngredients(Base):
     __tablename__ = "recipe_ingredients"
     recipe_id = Column(Integer, ForeignKey("recipes.id"), primary_key=True)
-    ingredient_id = Column(Integer, ForeignKey("ingredients.id"), primary_key=True)
+    ingredient_id = Column(Integer, ForeignKey("ingredients.id"), primary_key=True, index=True)
     quantity = Column(Float, nullable=True)
     unit = Column(String, nullable=True)
     component = Column(String, nullable=True)
@@ -86,7 +97,7 @@ class RecipeIngredients(Base):
 class RecipeCollections(Base):
     __tablename__ = "recipe_collections"
     recipe_id = Column(Integer, ForeignKey("recipes.id"), primary_key=True)
-    collection_id = Column(Integer, ForeignKey("collections.id"), primary_key=True)
+    collection_id = Column(Integer, ForeignKey("collections.id"), primary_key=True, index=True)
 
 
     collection = relationship("Collections")
@@ -95,6 +106,68 @@ class RecipeCollections(Base):
     @property
     def name(self):
         return self.collection.name
-      
 
-	
+
+# Materialized Documents
+
+class RecipeDocuments(Base):
+    """
+    The fully assembled recipe with ingredients and tools as encoded JSON, served by GET /recipes/{recipe_id}
+    with one primary key read. Written in the same transaction as the recipe, the version follows recipes.version.
+    """
+    __tablename__ = "recipe_documents"
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), primary_key=True)
+    version = Column(Integer, nullable=False)
+    document = Column(Text, nullable=False)
+
+
+# Full-text search
+#
+# Not mapped, maintained by the database itself and queried in crud.search_recipes.
+# PostgreSQL: generated tsvector column with a GIN index, name ranks above instructions above notes.
+# SQLite: external content FTS5 table kept in sync by triggers.
+
+SEARCH_DDL = {
+    "postgresql": [
+        """
+        ALTER TABLE recipes ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(instructions, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(notes, '')), 'C')
+        ) STORED
+        """,
+        "CREATE INDEX ix_recipes_search_vector ON recipes USING gin (search_vector)",
+    ],
+    "sqlite": [
+        """
+        CREATE VIRTUAL TABLE recipes_fts USING fts5(
+            name, instructions, notes, content='recipes', content_rowid='id'
+        )
+        """,
+        """
+        CREATE TRIGGER recipes_fts_insert AFTER INSERT ON recipes BEGIN
+            INSERT INTO recipes_fts(rowid, name, instructions, notes)
+            VALUES (new.id, new.name, new.instructions, new.notes);
+        END
+        """,
+        """
+        CREATE TRIGGER recipes_fts_delete AFTER DELETE ON recipes BEGIN
+            INSERT INTO recipes_fts(recipes_fts, rowid, name, instructions, notes)
+            VALUES ('delete', old.id, old.name, old.instructions, old.notes);
+        END
+        """,
+        """
+        CREATE TRIGGER recipes_fts_update AFTER UPDATE ON recipes BEGIN
+            INSERT INTO recipes_fts(recipes_fts, rowid, name, instructions, notes)
+            VALUES ('delete', old.id, old.name, old.instructions, old.notes);
+            INSERT INTO recipes_fts(rowid, name, instructions, notes)
+            VALUES (new.id, new.name, new.instructions, new.notes);
+        END
+        """,
+    ],
+}
+
+for dialect, statements in SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(Recipes.__table__, "after_create", DDL(statement).execute_if(dialect=dialect))
+
@@ -0,0 +1,149 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from sqlalchemy import select, func
+from app.models import Ingredients, KitchenTools, RecipeIngredients, RecipeTools
+
+# prefixes up to this length match large parts of the names, their results are kept until the next change
+SHORT_PREFIX = 2
+
+
+class NameIndex:
+    """
+    In-memory prefix index over the names of a master table (ingredients, kitchen tools),
+    ranked by the number of recipes using them.
+
+    The names are kept as a sorted array of (case-folded name, ID), so all names with a prefix
+    are one contiguous range found by binary search. The best k of the range are picked by usage count.
+    The index is loaded on first use and kept up to date by the commit hooks in crud.
+    Names are added and removed idempotently, the counts are only a ranking signal:
+    a change committed while loading can be counted twice until the next load.
+    """
+
+    def __init__(self, model, link_column):
+        self.model = model
+        self.link_column = link_column
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.loading = False
+        self.pending = []
+        self.names = {}         # ID -> name
+        self.counts = {}        # ID -> number of recipes using the name
+        self.keys = []          # sorted (case-folded name, ID)
+        self.short_results = {}  # (short prefix, k) -> result
+
+    def load(self, session):
+        """
+        Building the index from the database and replacing the current one.
+        Changes committed while loading are applied afterwards.
+        """
+
+        with self.lock:
+            self.loading = True
+            self.pending = []
+
+        try:
+            names = dict(session.execute(select(self.model.id, self.model.name)).all())
+            counts = dict(session.execute(
+                select(self.link_column, func.count())
+                .group_by(self.link_column)
+            ).all())
+        except Exception:
+            with self.lock:
+                self.loading = False
+            raise
+
+        keys = sorted((name.casefold(), name_id) for name_id, name in names.items())
+
+        with self.lock:
+            self.names = names
+            self.counts = {name_id: counts.get(name_id, 0) for name_id in names}
+            self.keys = keys
+            self.short_results = {}
+
+            for change in self.pending:
+                self.apply(*change)
+
+            self.pending = []
+            self.loading = False
+            self.loaded = True
+
+    def add_names(self, name_ids: dict[str, int]):
+        self.change("add", name_ids)
+
+    def remove_names(self, name_ids: list[int]):
+        self.change("remove", name_ids)
+
+    def count_recipes(self, deltas: dict[int, int]):
+        """
+        Changing the usage counts by the given number of recipes per ID, negative for deleted recipes.
+        """
+
+        self.change("count", deltas)
+
+    def change(self, action: str, *args):
+        with self.lock:
+            self.apply(action, *args)
+            if self.loading:
+                self.pending.append((action, *args))
+
+    def apply(self, action: str, *args):
+        self.short_results = {}
+
+        if action == "add":
+            name_ids, = args
+            for name, name_id in name_ids.items():
+                if name_id not in self.names:
+                    self.names[name_id] = name
+                    self.counts[name_id] = 0
+                    insort(self.keys, (name.casefold(), name_id))
+
+        elif action == "remove":
+            name_ids, = args
+            for name_id in name_ids:
+                name = self.names.pop(name_id, None)
+                if name is None:
+                    continue
+                self.counts.pop(name_id, None)
+                position = bisect_left(self.keys, (name.casefold(), name_id))
+                if position < len(self.keys) and self.keys[position][1] == name_id:
+                    del self.keys[position]
+
+        elif action == "count":
+            deltas, = args
+            for name_id, delta in deltas.items():
+                if name_id in self.counts:
+                    self.counts[name_id] = max(0, self.counts[name_id] + delta)
+
+    def complete(self, prefix: str, k: int = 10) -> list[tuple[str, int]]:
+        """
+        Returning the k most used names starting with the given prefix, case-insensitive.
+        Ties are ranked alphabetically.
+        Output: [(name, number of recipes)]
+        """
+
+        key = prefix.casefold()
+
+        with self.lock:
+            result = self.short_results.get((key, k))
+            if result is not None:
+                return result
+
+            start = bisect_left(self.keys, (key,))
+            # every name with the prefix sorts before the prefix followed by the highest code point
+            end = bisect_left(self.keys, (key + "\U0010ffff",), start)
+            best = heapq.nsmallest(k, self.keys[start:end],
+                                   key=lambda entry: (-self.counts[entry[1]], entry))
+            result = [(self.names[name_id], self.counts[name_id]) for _, name_id in best]
+
+            if len(key) <= SHORT_PREFIX:
+                self.short_results[(key, k)] = result
+
+            return result
+
+
+ingredient_names = NameIndex(Ingredients, RecipeIngredients.ingredient_id)
+tool_names = NameIndex(KitchenTools, RecipeTools.tool_id)
+
+# table name -> index, the commit hooks mark names by table
+name_indexes = {"ingredients": ingredient_names, "kitchen_tools": tool_names}
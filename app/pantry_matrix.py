@@ -0,0 +1,247 @@
+import threading
+from array import array
+import numpy as np
+from sqlalchemy import select
+from app.models import Ingredients, RecipeIngredients, Recipes
+from app.units import normalize_unit
+
+# quantities in units without a conversion (no unit, pcs, pinch, ...) are compared with each other as counts
+CONVERTIBLE_UNITS = {"g", "ml"}
+
+# needed quantities are met within this relative tolerance, so rounded amounts do not count as missing
+QUANTITY_TOLERANCE = 1e-4
+
+
+class PantryMatrix:
+    """
+    Sparse recipe x ingredient matrix of the quantities needed for one portion, in base units.
+
+    Every recipe gets a dense slot number, every (ingredient, base unit) pair a column.
+    The matrix is kept in compressed sparse row form: the entries of a recipe are contiguous
+    in two parallel arrays with column and quantity per portion (NaN for ingredients without quantity),
+    new recipes are appended. Scoring a pantry compares all entries with the pantry vector at once
+    and sums the results of every recipe from prefix sums at the row offsets.
+    The matrix is loaded on first use and kept up to date by the commit hooks in crud.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.loading = False
+        self.pending = []
+        self.ingredient_ids = {}                # ingredient name -> ingredient ID
+        self.ingredient_names = {}              # ingredient ID -> ingredient name
+        self.columns = {}                       # (ingredient ID, base unit) -> column
+        self.column_keys = []                   # column -> (ingredient ID, base unit)
+        self.ingredient_columns = {}            # ingredient ID -> columns
+        self.slots = {}                         # recipe ID -> slot
+        self.slot_recipes = array("q")          # slot -> recipe ID, -1 for deleted recipes
+        self.slot_offsets = array("q")          # slot -> first entry of the recipe
+        self.entry_columns = array("i")
+        self.entry_quantities = array("f")      # quantity for one portion, NaN if not given
+
+    def load(self, session):
+        """
+        Building the matrix from the database and replacing the current one.
+        Changes committed while loading are applied afterwards.
+        """
+
+        with self.lock:
+            self.loading = True
+            self.pending = []
+
+        try:
+            ingredient_ids = dict(session.execute(select(Ingredients.name, Ingredients.id)).all())
+            rows = session.execute(
+                select(RecipeIngredients.recipe_id,
+                       RecipeIngredients.ingredient_id,
+                       RecipeIngredients.quantity,
+                       RecipeIngredients.unit,
+                       Recipes.number_of_portions)
+                .join(Recipes, Recipes.id == RecipeIngredients.recipe_id)
+                .order_by(RecipeIngredients.recipe_id)
+            ).all()
+        except Exception:
+            with self.lock:
+                self.loading = False
+            raise
+
+        matrix = PantryMatrix()
+        matrix.learn(ingredient_ids)
+        recipes = {}
+        for recipe_id, ingredient_id, quantity, unit, portions in rows:
+            recipes.setdefault(recipe_id, (portions, []))[1].append((ingredient_id, quantity, unit))
+        for recipe_id, (portions, items) in recipes.items():
+            matrix.insert(recipe_id, portions, items)
+
+        with self.lock:
+            for name in ("ingredient_ids", "ingredient_names", "columns", "column_keys", "ingredient_columns",
+                         "slots", "slot_recipes", "slot_offsets", "entry_columns", "entry_quantities"):
+                setattr(self, name, getattr(matrix, name))
+
+            for change in self.pending:
+                self.apply(*change)
+
+            self.pending = []
+            self.loading = False
+            self.loaded = True
+
+    def add_recipes(self, recipes: list[tuple[int, int, list[tuple[int, float | None, str | None]]]],
+                    ingredient_ids: dict[str, int]):
+        """
+        Adding new recipes (recipe ID, number of portions, [(ingredient ID, quantity, unit)])
+        and learning the given ingredient names.
+        """
+
+        with self.lock:
+            self.apply("add", recipes, ingredient_ids)
+            if self.loading:
+                self.pending.append(("add", recipes, ingredient_ids))
+
+    def remove_recipe(self, recipe_id: int):
+        with self.lock:
+            self.apply("remove", recipe_id)
+            if self.loading:
+                self.pending.append(("remove", recipe_id))
+
+    def apply(self, action: str, *args):
+        """
+        Applying one change. Changes are idempotent, so they can be replayed after a reload.
+        """
+
+        if action == "add":
+            recipes, ingredient_ids = args
+            self.learn(ingredient_ids)
+            for recipe_id, portions, items in recipes:
+                if recipe_id not in self.slots:
+                    self.insert(recipe_id, portions, items)
+
+        elif action == "remove":
+            recipe_id, = args
+            slot = self.slots.pop(recipe_id, None)
+            if slot is not None:
+                # the entries stay in the arrays, scoring skips deleted slots
+                self.slot_recipes[slot] = -1
+
+    def learn(self, ingredient_ids: dict[str, int]):
+        self.ingredient_ids.update(ingredient_ids)
+        self.ingredient_names.update((ingredient_id, name) for name, ingredient_id in ingredient_ids.items())
+
+    def column(self, ingredient_id: int, base_unit: str | None) -> int:
+        key = (ingredient_id, base_unit)
+        column = self.columns.get(key)
+        if column is None:
+            column = self.columns[key] = len(self.column_keys)
+            self.column_keys.append(key)
+            self.ingredient_columns.setdefault(ingredient_id, []).append(column)
+        return column
+
+    def insert(self, recipe_id: int, portions: int, items: list[tuple[int, float | None, str | None]]):
+        slot = len(self.slot_recipes)
+        self.slots[recipe_id] = slot
+        self.slot_recipes.append(recipe_id)
+        self.slot_offsets.append(len(self.entry_columns))
+
+        for ingredient_id, quantity, unit in items:
+            base_unit, factor = normalize_unit(unit)
+            self.entry_columns.append(self.column(ingredient_id, base_unit))
+            if quantity is None or not portions:
+                self.entry_quantities.append(float("nan"))
+            else:
+                self.entry_quantities.append(quantity * factor / portions)
+
+    def pantry_vector(self, pantry: list[tuple[str, float | None, str | None]]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returning the available quantity per column for a pantry of (name, quantity, unit),
+        and per column whether the pantry contains some of its ingredient, in any unit.
+        The quantity is 0 for missing ingredients and quantities in units that can not be converted
+        to the unit of the column, infinity for pantry ingredients without quantity.
+        """
+
+        available = np.zeros(len(self.column_keys), dtype=np.float32)
+        present = np.zeros(len(self.column_keys), dtype=bool)
+
+        for name, quantity, unit in pantry:
+            ingredient_id = self.ingredient_ids.get(name)
+            if ingredient_id is None or (quantity is not None and quantity <= 0):
+                continue
+
+            base_unit, factor = normalize_unit(unit)
+            for column in self.ingredient_columns.get(ingredient_id, []):
+                column_unit = self.column_keys[column][1]
+                present[column] = True
+                if quantity is None:
+                    available[column] = np.inf
+                elif column_unit == base_unit or (column_unit not in CONVERTIBLE_UNITS
+                                                  and base_unit not in CONVERTIBLE_UNITS):
+                    available[column] += quantity * factor
+
+        return available, present
+
+    def match(self, pantry: list[tuple[str, float | None, str | None]], portions: int, k: int = 10) -> list[dict]:
+        """
+        Returning the k recipes that can be cooked for the given number of portions from the pantry,
+        or that miss the fewest ingredients. Ties are ranked by the number of ingredients found
+        in the pantry, then by slot, which follows the recipe IDs.
+        Recipes without any pantry ingredient are left out.
+        Output: [{"recipe_id", "matching_ingredients_count", "missing_ingredients_count",
+                  "missing": [(name, missing quantity or None, base unit)]}]
+        """
+
+        with self.lock:
+            if not self.entry_columns:
+                return []
+
+            available, pantry_columns = self.pantry_vector(pantry)
+            columns = np.frombuffer(self.entry_columns, dtype=np.int32)
+            # float32 throughout, half the memory traffic of float64 over all entries
+            needed = np.frombuffer(self.entry_quantities, dtype=np.float32) * np.float32(portions)
+            slot_recipes = np.frombuffer(self.slot_recipes, dtype=np.int64)
+            offsets = np.frombuffer(self.slot_offsets, dtype=np.int64)
+
+            entry_available = available[columns]
+            # ingredients in the pantry count as matching even if their quantities can not be compared
+            present = pantry_columns[columns]
+            # NaN (no quantity) compares False, so any amount of the ingredient in any unit satisfies it
+            satisfied = present & ~(entry_available < needed * np.float32(1 - QUANTITY_TOLERANCE))
+
+            # row sums as differences of prefix sums at the row boundaries
+            bounds = np.append(offsets, len(columns))
+            totals = np.diff(bounds)
+            prefix = np.zeros(len(columns) + 1, dtype=np.int64)
+            np.cumsum(present, out=prefix[1:])
+            matching = prefix[bounds[1:]] - prefix[bounds[:-1]]
+            np.cumsum(satisfied, out=prefix[1:])
+            missing = totals - (prefix[bounds[1:]] - prefix[bounds[:-1]])
+
+            candidates = np.flatnonzero((matching > 0) & (slot_recipes >= 0))
+            if not len(candidates):
+                return []
+
+            # fewest missing first, then most matching, then slot, packed into one key for argpartition
+            keys = ((missing[candidates] << 48) | ((0xFFFF - np.minimum(matching[candidates], 0xFFFF)) << 32)
+                    | candidates)
+            if len(keys) > k:
+                keys = keys[np.argpartition(keys, k)[:k]]
+            top = np.sort(keys) & 0xFFFFFFFF
+
+            results = []
+            for slot in top:
+                start, end = offsets[slot], offsets[slot] + totals[slot]
+                results.append({
+                    "recipe_id": int(slot_recipes[slot]),
+                    "matching_ingredients_count": int(matching[slot]),
+                    "missing_ingredients_count": int(missing[slot]),
+                    "missing": [self.missing_item(int(columns[entry]), needed[entry], entry_available[entry])
+                                for entry in range(start, end) if not satisfied[entry]],
+                })
+
+        return results
+
+    def missing_item(self, column: int, needed: float, available: float) -> tuple[str, float | None, str | None]:
+        ingredient_id, base_unit = self.column_keys[column]
+        quantity = None if np.isnan(needed) else round(float(needed - min(available, needed)), 2)
+        return self.ingredient_names.get(ingredient_id, str(ingredient_id)), quantity, base_unit
+
+
+pantry_matrix = PantryMatrix()
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List
 from datetime import datetime
 
@@ -33,10 +33,30 @@ class RecipeCreateResponse(BaseModel):
     recipe_id: int
 
 
+class RecipeImageResponse(BaseModel):
+    image_url: str
+    thumbnail_url: str
+
+
 class CollectionCreateResponse(BaseModel):
     collection_id: int
 
 
+class BulkImportCreated(BaseModel):
+    index: int
+    recipe_id: int
+
+
+class BulkImportError(BaseModel):
+    index: int
+    detail: str
+
+
+class BulkImportResponse(BaseModel):
+    created: list[BulkImportCreated]
+    errors: list[BulkImportError]
+
+
 class IngredientResponse(BaseModel):
     name: str
     quantity: float | None
@@ -61,6 +81,7 @@ class RecipeResponse(BaseModel):
     meal_type: str | None
     notes: str | None
     image_url: str | None
+    thumbnail_url: str | None
     created_at: datetime
     ingredients: list[IngredientResponse]
     tools: list[ToolResponse]
@@ -68,18 +89,138 @@ class RecipeResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class RecipeBatchResponse(BaseModel):
+    recipes: list[RecipeResponse]
+    missing: list[int]
+
+
 class RecipeListResponse(BaseModel):
     id: int
     name: str
     meal_type: str | None
     image_url: str | None
+    thumbnail_url: str | None
 
     model_config = {"from_attributes": True}
 
 
+class RecipeFieldsResponse(BaseModel):
+    """
+    Recipe with the requested fields only, the endpoints leave out the fields that were not selected.
+    """
+    id: int
+    name: str | None = None
+    number_of_portions: int | None = None
+    instructions: str | None = None
+    nationality: str | None = None
+    meal_type: str | None = None
+    notes: str | None = None
+    image_url: str | None = None
+    thumbnail_url: str | None = None
+    created_at: datetime | None = None
+    ingredients: list[IngredientResponse] | None = None
+    tools: list[ToolResponse] | None = None
+
+
+class RecipeMatchResponse(BaseModel):
+    recipe: RecipeListResponse
+    matching_ingredients_count: int
+
+
+class SimilarRecipeResponse(BaseModel):
+    recipe: RecipeListResponse
+    similarity: float
+
+
+class RecipeListPage(BaseModel):
+    items: list[RecipeFieldsResponse]
+    next_cursor: str | None
+
+
+class FacetCount(BaseModel):
+    value: str | None
+    count: int
+
+
+class CollectionFacetCount(BaseModel):
+    collection_id: int
+    count: int
+
+
+class RecipeFacetsResponse(BaseModel):
+    total: int
+    meal_types: list[FacetCount]
+    nationalities: list[FacetCount]
+    collections: list[CollectionFacetCount]
+
+
+class MealPlanEntry(BaseModel):
+    recipe_id: int
+    portions: float = Field(gt=0)
+
+
+class ShoppingListRequest(BaseModel):
+    recipes: List[MealPlanEntry] = Field(max_length=1000)
+
+
+class ShoppingListItem(BaseModel):
+    name: str
+    quantity: float | None
+    unit: str | None
+
+
+class PantryItem(BaseModel):
+    name: str
+    quantity: float | None = None
+    unit: str | None = None
+
+
+class PantryMatchRequest(BaseModel):
+    pantry: List[PantryItem]
+    portions: int = Field(gt=0)
+    k: int = Field(default=10, ge=1, le=100)
+
+
+class MissingIngredient(BaseModel):
+    name: str
+    quantity: float | None
+    unit: str | None
+
+
+class PantryMatchResponse(BaseModel):
+    recipe: RecipeListResponse
+    matching_ingredients_count: int
+    missing_ingredients_count: int
+    missing: list[MissingIngredient]
+
+
+class NameSuggestion(BaseModel):
+    name: str
+    recipe_count: int
+
+
 class CollectionResponse(BaseModel):
     id: int
     name: str
 
     model_config = {"from_attributes": True}
 
+
+
+class PoolStatisticsResponse(BaseModel):
+    size: int
+    checked_out: int
+    idle: int
+    overflow: int
+    checkouts: int
+    timeouts: int
+    avg_wait_ms: float
+    max_wait_ms: float
+
+
+class CacheStatisticsResponse(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
@@ -0,0 +1,42 @@
+import os
+from datetime import date, datetime
+import orjson
+from fastapi import Response
+
+# row data is encoded with orjson directly instead of validating it with the response model first,
+# false falls back to the response models, e.g. to compare both paths
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "true").lower() in ("1", "true", "yes")
+
+
+def encode_default(value):
+    # dates are written like the datetime fields of the response models
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return f"{value.isoformat()}T00:00:00"
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value) -> bytes:
+    """
+    Encoding dictionaries, lists and scalars from row data to JSON bytes.
+    """
+
+    return orjson.dumps(value, default=encode_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+def loads(content: bytes):
+    return orjson.loads(content)
+
+
+class JSONBytesResponse(Response):
+    """
+    JSON response encoded with orjson, already encoded bytes are sent as they are.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
@@ -0,0 +1,340 @@
+import logging
+import os
+import threading
+from array import array
+import numpy as np
+from sqlalchemy import select
+from app.models import RecipeIngredients, Recipes
+
+# 64 MinHash values per recipe, split into 32 LSH bands of 2 rows:
+# recipes with Jaccard similarity 0.3 share at least one band with a probability of 95%
+PERMUTATIONS = 64
+BANDS = 32
+ROWS = PERMUTATIONS // BANDS
+
+# the hash functions must stay the same for signatures persisted with them
+SEED = 20261017
+PRIME = (1 << 61) - 1
+
+# buckets of very common band values (e.g. salt and pepper) only contribute their first recipes
+MAX_BUCKET = 5000
+# candidates sharing the most bands are compared signature by signature
+MAX_CANDIDATES = 20000
+# the best candidates by estimated similarity are ranked by their exact Jaccard similarity
+RERANK = 200
+
+# file to persist the index to at shutdown and restore it from at startup, empty to always build from the database
+SIMILARITY_INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", "")
+
+logger = logging.getLogger(__name__)
+
+generator = np.random.default_rng(SEED)
+HASH_A = generator.integers(1, 1 << 32, PERMUTATIONS, dtype=np.uint64)
+HASH_B = generator.integers(0, 1 << 32, PERMUTATIONS, dtype=np.uint64)
+
+
+def minhash_signatures(ingredient_ids: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Returning the MinHash signatures of ingredient sets given in compressed form:
+    the IDs of set i are ingredient_ids[offsets[i]:offsets[i + 1]], every set is non-empty.
+    Output: uint32 array of shape (number of sets, PERMUTATIONS)
+    """
+
+    signatures = np.empty((len(offsets), PERMUTATIONS), dtype=np.uint32)
+    bounds = np.append(offsets, len(ingredient_ids))
+
+    # a few thousand sets at a time, the hashes of all entries would not fit into memory at once
+    for start in range(0, len(offsets), 4096):
+        end = min(start + 4096, len(offsets))
+        ids = ingredient_ids[bounds[start]:bounds[end]].astype(np.uint64)
+        hashes = ((HASH_A[:, None] * ids[None, :] + HASH_B[:, None]) % PRIME).astype(np.uint32)
+        signatures[start:end] = np.minimum.reduceat(hashes, bounds[start:end] - bounds[start], axis=1).T
+
+    return signatures
+
+
+def band_keys(signatures: np.ndarray) -> np.ndarray:
+    """
+    Returning one uint64 key per band of every signature.
+    Output: uint64 array of shape (number of signatures, BANDS)
+    """
+
+    rows = signatures.reshape(len(signatures), BANDS, ROWS).astype(np.uint64)
+    keys = rows[:, :, 0]
+    for row in range(1, ROWS):
+        keys = (keys * np.uint64(0x100000001B3)) ^ rows[:, :, row]
+    return keys
+
+
+class SimilarityIndex:
+    """
+    In-memory MinHash/LSH index of the ingredient sets of all recipes, for approximate "similar recipes".
+
+    Every recipe with ingredients gets a slot, a MinHash signature and one key per band.
+    Recipes sharing a band key are candidates. They are ranked by the share of equal signature values,
+    which estimates the Jaccard similarity of the ingredient sets, and the best of them by the exact
+    Jaccard similarity of the ingredient sets, kept in compressed form next to the signatures.
+    The band keys are kept sorted per band for binary search, new recipes are appended to an unsorted tail
+    that is scanned directly and merged once it grows. Deleted recipes keep their slot, marked with -1.
+    The index is loaded on first use, restored from SIMILARITY_INDEX_PATH if set,
+    and kept up to date by the commit hooks in crud.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.loading = False
+        self.pending = []
+        self.size = 0
+        self.slots = {}                                                     # recipe ID -> slot
+        self.slot_recipes = np.empty(0, dtype=np.int64)                     # slot -> recipe ID, -1 if deleted
+        self.signatures = np.empty((0, PERMUTATIONS), dtype=np.uint32)
+        self.keys = np.empty((0, BANDS), dtype=np.uint64)
+        self.set_offsets = np.empty(0, dtype=np.int64)                      # slot -> first entry of its set
+        self.set_lengths = np.empty(0, dtype=np.int32)
+        self.entries = array("i")                                           # ingredient IDs of all sets
+        self.sorted_size = 0                                                # slots covered by the sorted keys
+        self.sorted_keys = np.empty((BANDS, 0), dtype=np.uint64)
+        self.sorted_slots = np.empty((BANDS, 0), dtype=np.int64)
+
+    def load(self, session, path: str | None = None):
+        """
+        Building the index and replacing the current one, from the file at the given path if it exists,
+        otherwise from the database. A restored index is brought up to date with the recipes
+        created and deleted since it was saved. Changes committed while loading are applied afterwards.
+        """
+
+        with self.lock:
+            self.loading = True
+            self.pending = []
+
+        try:
+            index = SimilarityIndex()
+            if path and os.path.exists(path) and index.restore(path):
+                recipe_ids = set(session.scalars(select(Recipes.id)))
+                index.apply("remove", [recipe_id for recipe_id in index.slots if recipe_id not in recipe_ids])
+                index.insert(index.ingredient_sets(session, [recipe_id for recipe_id in recipe_ids
+                                                             if recipe_id not in index.slots]))
+            else:
+                index.insert(index.ingredient_sets(session))
+        except Exception:
+            with self.lock:
+                self.loading = False
+            raise
+
+        index.sort()
+
+        with self.lock:
+            for name in ("size", "slots", "slot_recipes", "signatures", "keys", "set_offsets", "set_lengths",
+                         "entries", "sorted_size", "sorted_keys", "sorted_slots"):
+                setattr(self, name, getattr(index, name))
+
+            for change in self.pending:
+                self.apply(*change)
+
+            self.pending = []
+            self.loading = False
+            self.loaded = True
+
+    @staticmethod
+    def ingredient_sets(session, recipe_ids: list[int] | None = None) -> list[tuple[int, list[int]]]:
+        """
+        Returning (recipe ID, ingredient IDs) of the given recipes or of all recipes, in chunks of IDs.
+        """
+
+        query = select(RecipeIngredients.recipe_id, RecipeIngredients.ingredient_id).order_by(RecipeIngredients.recipe_id)
+        if recipe_ids is None:
+            chunks = [session.execute(query).all()]
+        else:
+            chunks = (session.execute(query.where(RecipeIngredients.recipe_id.in_(recipe_ids[i:i + 1000]))).all()
+                      for i in range(0, len(recipe_ids), 1000))
+
+        recipes = {}
+        for rows in chunks:
+            for recipe_id, ingredient_id in rows:
+                recipes.setdefault(recipe_id, []).append(ingredient_id)
+
+        return list(recipes.items())
+
+    def add_recipes(self, recipes: list[tuple[int, list[int]]]):
+        """
+        Adding new recipes (recipe ID, ingredient IDs).
+        """
+
+        with self.lock:
+            self.apply("add", recipes)
+            if self.loading:
+                self.pending.append(("add", recipes))
+
+    def remove_recipe(self, recipe_id: int):
+        with self.lock:
+            self.apply("remove", [recipe_id])
+            if self.loading:
+                self.pending.append(("remove", [recipe_id]))
+
+    def apply(self, action: str, *args):
+        """
+        Applying one change. Changes are idempotent, so they can be replayed after a reload.
+        """
+
+        if action == "add":
+            recipes, = args
+            self.insert([(recipe_id, ingredient_ids) for recipe_id, ingredient_ids in recipes
+                         if recipe_id not in self.slots])
+            # the tail is scanned on every query, large tails are merged into the sorted keys
+            if self.size - self.sorted_size > max(1024, self.sorted_size // 16):
+                self.sort()
+
+        elif action == "remove":
+            recipe_ids, = args
+            for recipe_id in recipe_ids:
+                slot = self.slots.pop(recipe_id, None)
+                if slot is not None:
+                    self.slot_recipes[slot] = -1
+
+    def insert(self, recipes: list[tuple[int, list[int]]]):
+        # recipes without ingredients have no signature and no similar recipes
+        recipes = [(recipe_id, ingredient_ids) for recipe_id, ingredient_ids in recipes if ingredient_ids]
+        if not recipes:
+            return
+
+        lengths = np.array([len(ingredient_ids) for _, ingredient_ids in recipes], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        ingredient_ids = np.fromiter((ingredient_id for _, ids in recipes for ingredient_id in ids),
+                                     dtype=np.int64, count=int(lengths.sum()))
+        signatures = minhash_signatures(ingredient_ids, offsets)
+
+        start, end = self.size, self.size + len(recipes)
+        self.reserve(end)
+        self.set_offsets[start:end] = offsets + len(self.entries)
+        self.set_lengths[start:end] = lengths
+        self.entries.frombytes(ingredient_ids.astype(np.int32).tobytes())
+        self.signatures[start:end] = signatures
+        self.keys[start:end] = band_keys(signatures)
+        self.slot_recipes[start:end] = [recipe_id for recipe_id, _ in recipes]
+        self.slots.update((recipe_id, slot) for slot, (recipe_id, _) in enumerate(recipes, start))
+        self.size = end
+
+    def reserve(self, size: int):
+        """
+        Growing the arrays by doubling, so appending recipes one by one stays cheap.
+        """
+
+        if size <= len(self.slot_recipes):
+            return
+
+        capacity = max(size, 2 * len(self.slot_recipes), 1024)
+        for name in ("slot_recipes", "signatures", "keys", "set_offsets", "set_lengths"):
+            current = getattr(self, name)
+            grown = np.empty((capacity, *current.shape[1:]), dtype=current.dtype)
+            grown[:self.size] = current[:self.size]
+            setattr(self, name, grown)
+
+    def sort(self):
+        keys = np.ascontiguousarray(self.keys[:self.size].T)
+        self.sorted_slots = np.argsort(keys, axis=1)
+        self.sorted_keys = np.take_along_axis(keys, self.sorted_slots, axis=1)
+        self.sorted_size = self.size
+
+    def ingredient_set(self, slot: int) -> set[int]:
+        start = int(self.set_offsets[slot])
+        return set(self.entries[start:start + int(self.set_lengths[slot])])
+
+    def similar(self, recipe_id: int, k: int = 10) -> list[tuple[int, float]] | None:
+        """
+        Returning the k recipes with the most similar ingredient sets by Jaccard similarity,
+        among the candidates found through the LSH bands. Ties are ranked by slot, which follows the recipe IDs.
+        Returning None if the recipe is not in the index.
+        Output: [(recipe ID, similarity between 0 and 1)]
+        """
+
+        with self.lock:
+            slot = self.slots.get(recipe_id)
+            if slot is None:
+                return None
+
+            keys = self.keys[slot]
+            members = []
+            for band in range(BANDS):
+                start = np.searchsorted(self.sorted_keys[band], keys[band], side="left")
+                end = np.searchsorted(self.sorted_keys[band], keys[band], side="right")
+                members.append(self.sorted_slots[band, start:min(end, start + MAX_BUCKET)])
+                members.append(np.flatnonzero(self.keys[self.sorted_size:self.size, band] == keys[band])
+                               + self.sorted_size)
+
+            candidates, shared_bands = np.unique(np.concatenate(members), return_counts=True)
+            valid = (candidates != slot) & (self.slot_recipes[candidates] >= 0)
+            candidates, shared_bands = candidates[valid], shared_bands[valid]
+
+            if len(candidates) > MAX_CANDIDATES:
+                best = np.argpartition(-shared_bands, MAX_CANDIDATES)[:MAX_CANDIDATES]
+                candidates = np.sort(candidates[best])
+
+            if not len(candidates):
+                return []
+
+            estimate = (self.signatures[candidates] == self.signatures[slot]).mean(axis=1)
+            # candidates are sorted by slot, a stable sort keeps that order among equal similarities
+            best = candidates[np.argsort(-estimate, kind="stable")[:max(RERANK, k)]]
+
+            ingredient_set = self.ingredient_set(slot)
+            ranked = []
+            for candidate in best.tolist():
+                candidate_set = self.ingredient_set(candidate)
+                similarity = len(ingredient_set & candidate_set) / len(ingredient_set | candidate_set)
+                ranked.append((-similarity, candidate))
+            ranked.sort()
+
+            return [(int(self.slot_recipes[candidate]), -similarity) for similarity, candidate in ranked[:k]]
+
+    def save(self, path: str):
+        """
+        Writing the signatures and ingredient sets of all recipes to the given .npz file, replacing it atomically.
+        """
+
+        with self.lock:
+            alive = self.slot_recipes[:self.size] >= 0
+            slot_recipes = self.slot_recipes[:self.size][alive]
+            signatures = self.signatures[:self.size][alive]
+            set_lengths = self.set_lengths[:self.size]
+            # the sets are stored in slot order, so the entries of deleted recipes are dropped by one mask
+            entries = np.frombuffer(self.entries, dtype=np.int32)[np.repeat(alive, set_lengths)]
+            set_lengths = set_lengths[alive]
+
+        partial = f"{path}.partial.npz"
+        np.savez(partial, slot_recipes=slot_recipes, signatures=signatures,
+                 set_lengths=set_lengths, entries=entries,
+                 parameters=np.array([PERMUTATIONS, BANDS, SEED], dtype=np.int64))
+        os.replace(partial, path)
+
+    def restore(self, path: str) -> bool:
+        """
+        Reading the signatures saved to the given file into this empty index.
+        Returning False if the file can not be used, e.g. saved with other MinHash parameters.
+        """
+
+        try:
+            with np.load(path) as data:
+                if data["parameters"].tolist() != [PERMUTATIONS, BANDS, SEED]:
+                    logger.warning("%s was saved with other MinHash parameters, rebuilding the index", path)
+                    return False
+                slot_recipes, signatures = data["slot_recipes"], data["signatures"]
+                set_lengths, entries = data["set_lengths"], data["entries"]
+        except (OSError, ValueError, KeyError):
+            logger.exception("Could not read %s, rebuilding the index", path)
+            return False
+
+        self.reserve(len(slot_recipes))
+        self.slot_recipes[:len(slot_recipes)] = slot_recipes
+        self.signatures[:len(slot_recipes)] = signatures
+        self.keys[:len(slot_recipes)] = band_keys(signatures)
+        self.set_lengths[:len(slot_recipes)] = set_lengths
+        self.set_offsets[:len(slot_recipes)] = np.cumsum(set_lengths) - set_lengths
+        self.entries = array("i", entries.astype(np.int32).tobytes())
+        self.slots = {int(recipe_id): slot for slot, recipe_id in enumerate(slot_recipes)}
+        self.size = len(slot_recipes)
+
+        return True
+
+
+similarity_index = SimilarityIndex()
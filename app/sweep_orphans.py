@@ -0,0 +1,28 @@
+"""
+Command line cleanup of ingredients and kitchen tools which are not used in any recipe.
+
+Usage: python -m app.sweep_orphans [--batch-size 1000]
+"""
+
+import argparse
+import sys
+from app.database import SessionLocal
+import app.crud as crud
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Removing unused ingredients and kitchen tools in batches.")
+    parser.add_argument("--batch-size", type=int, default=1000,
+                        help="number of IDs checked and committed together (default: 1000)")
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as session:
+        removed = crud.sweep_orphans(session, args.batch_size)
+
+    print(f"Removed {removed} unused ingredients and kitchen tools.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
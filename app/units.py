@@ -0,0 +1,68 @@
+from functools import lru_cache
+
+# unit -> (base unit, factor to the base unit), German abbreviations included
+CONVERSIONS = {
+    "mg": ("g", 0.001),
+    "g": ("g", 1.0),
+    "gr": ("g", 1.0),
+    "gram": ("g", 1.0),
+    "grams": ("g", 1.0),
+    "gramm": ("g", 1.0),
+    "kg": ("g", 1000.0),
+    "kilogram": ("g", 1000.0),
+    "ml": ("ml", 1.0),
+    "cl": ("ml", 10.0),
+    "dl": ("ml", 100.0),
+    "l": ("ml", 1000.0),
+    "liter": ("ml", 1000.0),
+    "litre": ("ml", 1000.0),
+    "tsp": ("ml", 5.0),
+    "teaspoon": ("ml", 5.0),
+    "tl": ("ml", 5.0),
+    "tbsp": ("ml", 15.0),
+    "tablespoon": ("ml", 15.0),
+    "el": ("ml", 15.0),
+}
+
+# amounts only given in spoons are listed in spoons again instead of millilitres
+SPOON_UNITS = {"tsp", "teaspoon", "tl", "tbsp", "tablespoon", "el"}
+
+
+@lru_cache(maxsize=4096)
+def normalize_unit(unit: str | None) -> tuple[str | None, float]:
+    """
+    Returning the base unit and the factor to convert a quantity in the given unit to it.
+    Unknown units (e.g. "pcs") are their own base unit, compared case-insensitively.
+    """
+
+    if unit is None or not unit.strip():
+        return None, 1.0
+
+    key = unit.strip().lower().rstrip(".")
+
+    return CONVERSIONS.get(key, (key, 1.0))
+
+
+@lru_cache(maxsize=4096)
+def is_spoon_unit(unit: str | None) -> bool:
+    return unit is not None and unit.strip().lower().rstrip(".") in SPOON_UNITS
+
+
+def display_quantity(amount: float | None, base_unit: str | None, spoons_only: bool = False) -> tuple[float | None, str | None]:
+    """
+    Converting an amount in a base unit into the unit a shopping list shows it in.
+    """
+
+    if amount is None:
+        return None, base_unit
+
+    if base_unit == "ml" and spoons_only:
+        return (round(amount / 15.0, 2), "tbsp") if amount >= 15.0 else (round(amount / 5.0, 2), "tsp")
+
+    if base_unit == "g" and amount >= 1000.0:
+        return round(amount / 1000.0, 3), "kg"
+
+    if base_unit == "ml" and amount >= 1000.0:
+        return round(amount / 1000.0, 3), "l"
+
+    return round(amount, 2), base_unit
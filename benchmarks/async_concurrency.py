@@ -0,0 +1,110 @@
+"""
+Comparing the throughput of the sync and the async database mode under growing concurrency.
+
+Every mode runs in its own process, because DATABASE_MODE is read when app.database is imported.
+Requests go through httpx's ASGI transport, so the numbers show the application and database
+ceiling without network overhead.
+
+Usage: python benchmarks/async_concurrency.py [--recipes 1000] [--requests 2000]
+                                             [--concurrency 1 10 50 200] [--database bench.db]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+
+def prepare_database(path: str, recipes: int):
+    """
+    Creating a fresh SQLite database with the given number of recipes.
+    """
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app.models import Base
+    import app.crud as crud
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+
+    items = ({"name": f"Recipe {i}",
+              "number_of_portions": 2,
+              "instructions": "Mix everything and cook it.",
+              "ingredients": [{"name": f"Ingredient {(i * 7 + j) % 500}", "quantity": 100, "unit": "g"}
+                              for j in range(8)],
+              "tools": [{"name": f"Tool {i % 20}"}]} for i in range(recipes))
+
+    with Session(engine) as session:
+        crud.bulk_create_recipes(session, items, chunk_size=1000)
+
+
+async def run_level(client, recipes: int, requests: int, concurrency: int) -> float:
+    """
+    Sending the given number of detail and list requests with the given concurrency.
+    Output: requests per second
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request(i: int):
+        async with semaphore:
+            if i % 2:
+                response = await client.get(f"/recipes/{i % recipes + 1}")
+            else:
+                response = await client.get("/recipes/all", params={"limit": 20})
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(requests)))
+
+    return requests / (time.perf_counter() - start)
+
+
+async def run_mode(args):
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for concurrency in args.concurrency:
+            throughput = await run_level(client, args.recipes, args.requests, concurrency)
+            print(json.dumps({"mode": os.environ["DATABASE_MODE"],
+                              "concurrency": concurrency,
+                              "requests_per_second": round(throughput, 1)}), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipes", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--database", default=os.path.join(ROOT, "bench.db"))
+    parser.add_argument("--mode", choices=["sync", "async"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        asyncio.run(run_mode(args))
+        return
+
+    prepare_database(args.database, args.recipes)
+
+    for mode in ("sync", "async"):
+        env = dict(os.environ,
+                   DATABASE_MODE=mode,
+                   DATABASE_URL=f"sqlite:///{args.database}",
+                   ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{args.database}")
+        subprocess.run([sys.executable, __file__, "--mode", mode, *sys.argv[1:]], env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
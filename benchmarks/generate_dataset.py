@@ -0,0 +1,135 @@
+"""
+Deterministic synthetic dataset for benchmarks.
+
+Fills the schema with the given number of recipes. Ingredient and kitchen tool popularity
+follows a Zipf-like distribution (a few ingredients like salt are in most recipes, most are rare),
+recipes have 3-15 ingredients with realistic units, 1-4 tools and free text of realistic length,
+and belong to 0-3 of roughly one collection per 200 recipes.
+The same seed and size always produce the same data.
+
+Usage: python benchmarks/generate_dataset.py 100000 --url sqlite:///bench_100000.db --create-schema
+       DATABASE_URL=postgresql+psycopg2://... python benchmarks/generate_dataset.py 1000000
+"""
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, insert, select, func
+from sqlalchemy.orm import Session
+from app.models import Base, Collections, RecipeCollections, Recipes
+import app.crud as crud
+
+MEAL_TYPES = ["breakfast", "lunch", "dinner", "dessert", "snack", None]
+NATIONALITIES = ["italian", "german", "french", "indian", "mexican", "japanese", "thai", "greek", None]
+UNITS = [("g", 50, 500), ("kg", 0.5, 2), ("ml", 50, 500), ("l", 0.25, 2),
+         ("tsp", 0.5, 3), ("tbsp", 1, 4), ("pcs", 1, 6), (None, None, None)]
+COMPONENTS = [None, None, None, "dough", "sauce", "filling", "topping"]
+WORDS = ("add stir mix bake boil fry chop slice dice simmer season pour whisk knead roast grill "
+         "until golden soft tender crispy minutes hot cold bowl pan oven heat medium low high "
+         "the and with then into over for about serve fresh finely gently").split()
+
+
+def ingredient_vocabulary(recipes: int) -> int:
+    return min(20000, 300 + recipes // 20)
+
+
+def tool_vocabulary(recipes: int) -> int:
+    return min(500, 20 + recipes // 1000)
+
+
+def text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words)).capitalize() + "."
+
+
+def generate_recipes(size: int, seed: int = 42):
+    """
+    Yielding the given number of recipes as RecipeCreate compatible dictionaries.
+    """
+
+    rng = random.Random(seed)
+    ingredient_names = [f"Ingredient {i}" for i in range(ingredient_vocabulary(size))]
+    tool_names = [f"Tool {i}" for i in range(tool_vocabulary(size))]
+    ingredient_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(ingredient_names))))
+    tool_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(tool_names))))
+
+    for i in range(size):
+        ingredients = set(rng.choices(ingredient_names, cum_weights=ingredient_weights, k=rng.randint(3, 15)))
+        tools = set(rng.choices(tool_names, cum_weights=tool_weights, k=rng.randint(1, 4)))
+
+        recipe_ingredients = []
+        for name in sorted(ingredients):
+            unit, low, high = rng.choice(UNITS)
+            recipe_ingredients.append({"name": name,
+                                       "quantity": round(rng.uniform(low, high), 1) if unit else None,
+                                       "unit": unit,
+                                       "component": rng.choice(COMPONENTS)})
+
+        yield {"name": f"{text(rng, 3)[:-1]} {i}",
+               "number_of_portions": rng.randint(1, 8),
+               "instructions": text(rng, rng.randint(40, 250)),
+               "meal_type": rng.choice(MEAL_TYPES),
+               "nationality": rng.choice(NATIONALITIES),
+               "notes": text(rng, rng.randint(5, 40)) if rng.random() < 0.3 else None,
+               "ingredients": recipe_ingredients,
+               "tools": [{"name": name} for name in sorted(tools)]}
+
+
+def generate(session, size: int, seed: int = 42, chunk_size: int = 2000):
+    """
+    Inserting the dataset of the given size and seed into an empty database.
+    """
+
+    result = crud.bulk_create_recipes(session, generate_recipes(size, seed), chunk_size)
+    if result["errors"]:
+        raise RuntimeError(f"Could not create {len(result['errors'])} recipes: {result['errors'][0]}")
+
+    rng = random.Random(seed + 1)
+    collection_ids = session.scalars(
+        insert(Collections).returning(Collections.id, sort_by_parameter_order=True),
+        [{"name": f"Collection {i}"} for i in range(max(1, size // 200))]
+    ).all()
+
+    recipe_ids = session.scalars(select(Recipes.id).order_by(Recipes.id)).all()
+    for start in range(0, len(recipe_ids), chunk_size):
+        links = [{"recipe_id": recipe_id, "collection_id": collection_id}
+                 for recipe_id in recipe_ids[start:start + chunk_size]
+                 for collection_id in set(rng.choices(collection_ids, k=rng.randint(0, 3)))]
+        if links:
+            session.execute(insert(RecipeCollections), links)
+        session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("size", type=int, help="number of recipes")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL"), help="database URL (default: DATABASE_URL)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--create-schema", action="store_true", help="create the tables first")
+    args = parser.parse_args()
+
+    if not args.url:
+        parser.error("--url or DATABASE_URL is required")
+
+    engine = create_engine(args.url)
+    if args.create_schema:
+        Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        if session.scalar(select(func.count()).select_from(Recipes)):
+            parser.error("the database already contains recipes")
+
+        start = time.perf_counter()
+        generate(session, args.size, args.seed, args.chunk_size)
+
+    print(f"Generated {args.size} recipes in {time.perf_counter() - start:.1f} s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Timing the crud functions and the endpoints at different dataset sizes.
+
+Every size gets its own SQLite database in --data-dir, generated with generate_dataset.py on first use
+and reused afterwards. With --url an existing database (e.g. a local PostgreSQL filled by
+generate_dataset.py) is benchmarked instead, its size is the number of recipes it contains.
+Every database is benchmarked in its own process, because app.database reads DATABASE_URL on import.
+Each case runs --warmup times untimed and --repeat times timed, requests go through the TestClient,
+so endpoint numbers contain no network overhead.
+
+The results are written as JSON to --output. With --baseline, the medians are compared to an earlier
+result file and cases slower than baseline * (1 + --tolerance) are reported as regressions.
+
+Usage: python benchmarks/run_benchmarks.py --sizes 1000 100000 1000000 --output results.json
+       python benchmarks/run_benchmarks.py --sizes 1000 --baseline results.json
+       python benchmarks/run_benchmarks.py --url postgresql+psycopg2://... --output postgres.json
+Exit code 1 if a regression was found.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# differences below this are noise for the sub-millisecond cases and never a regression
+MIN_REGRESSION_MS = 0.2
+
+
+def measure(function, repeat: int, warmup: int) -> dict:
+    """
+    Running the function and returning the distribution of its durations in milliseconds.
+    """
+
+    for _ in range(warmup):
+        function()
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    durations.sort()
+    return {"median_ms": statistics.median(durations),
+            "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "min_ms": durations[0],
+            "repeat": repeat}
+
+
+def sample_context(session, seed: int) -> dict:
+    """
+    Picking the recipes, ingredients and filters the cases work with.
+    """
+
+    from sqlalchemy import select, func
+    from app.models import Recipes, RecipeIngredients, Ingredients
+    import app.crud as crud
+
+    rng = random.Random(seed)
+    recipe_ids = session.scalars(select(Recipes.id).order_by(Recipes.id)).all()
+    middle = session.scalars(select(Recipes).order_by(*crud.RECIPE_ORDER)
+                             .offset(len(recipe_ids) // 2).limit(1)).first()
+    popular = session.scalars(
+        select(Ingredients.name)
+        .join(RecipeIngredients, RecipeIngredients.ingredient_id == Ingredients.id)
+        .group_by(Ingredients.id, Ingredients.name)
+        .order_by(func.count().desc())
+        .limit(50)
+    ).all()
+
+    return {"rng": rng,
+            "size": len(recipe_ids),
+            "recipe_ids": rng.sample(recipe_ids, min(len(recipe_ids), 10000)),
+            "cursor": crud.encode_cursor(middle.created_at, middle.id),
+            "ingredients": popular}
+
+
+def recipe_payload(rng: random.Random) -> dict:
+    from generate_dataset import generate_recipes
+
+    return next(generate_recipes(1, rng.randrange(1 << 30)))
+
+
+def crud_cases(context: dict) -> list[tuple[str, object]]:
+    """
+    Returning (name, function) for every crud case. Every call uses a new session, like a request.
+    """
+
+    from app.database import SessionLocal
+    from app.ingredient_index import ingredient_index
+    from app.pantry_matrix import pantry_matrix
+    from app.schemas import RecipeCreate
+    import app.crud as crud
+
+    rng, recipe_ids, ingredients = context["rng"], context["recipe_ids"], context["ingredients"]
+    created = []
+
+    def call(function, *args, sample=None):
+        def run():
+            with SessionLocal() as session:
+                return function(session, *(sample() if sample else args))
+        return run
+
+    def create():
+        with SessionLocal() as session:
+            created.append(crud.create_full_recipe(session, RecipeCreate.model_validate(recipe_payload(rng))))
+
+    def delete():
+        with SessionLocal() as session:
+            crud.delete_recipe_by_id(session, created.pop())
+
+    with SessionLocal() as session:
+        ingredient_index.load(session)
+        pantry_matrix.load(session)
+
+    def pantry():
+        return [(name, 500, "g") for name in rng.sample(ingredients, 20)]
+
+    return [
+        ("get_full_recipe_by_id", call(crud.get_full_recipe_by_id, sample=lambda: (rng.choice(recipe_ids),))),
+        ("get_recipe_document", call(crud.get_recipe_document, sample=lambda: (rng.choice(recipe_ids),))),
+        ("get_full_recipes_by_ids 50 recipes",
+         call(crud.get_full_recipes_by_ids, sample=lambda: (rng.sample(recipe_ids, 50),))),
+        ("get_recipes_by_ids", call(crud.get_recipes_by_ids, sample=lambda: (rng.sample(recipe_ids, 20),))),
+        ("get_all_recipes first page", call(crud.get_all_recipes, 0, 20)),
+        ("get_all_recipes middle page", call(crud.get_all_recipes, context["size"] // 2, 20)),
+        ("get_recipes_page first page", call(crud.get_recipes_page, None, None, None, None, 20)),
+        ("get_recipes_page middle page", call(crud.get_recipes_page, None, None, None, context["cursor"], 20)),
+        ("get_recipes_filtered", call(crud.get_recipes_filtered, ["dinner"], ["italian"], None, 0, 20)),
+        ("search_recipes", call(crud.search_recipes, "golden crispy")),
+        ("get_recipe_facets", call(crud.get_recipe_facets, ["dinner"], None, None)),
+        ("get_shopping_list 200 recipes",
+         call(crud.get_shopping_list, sample=lambda: ([(recipe_id, 4) for recipe_id in rng.sample(recipe_ids, 200)],))),
+        ("get_recipes_by_ingredients",
+         call(crud.get_recipes_by_ingredients, sample=lambda: (rng.sample(ingredients, 2),))),
+        ("get_best_recipes_for_ingredients",
+         call(crud.get_best_recipes_for_ingredients, sample=lambda: (rng.sample(ingredients, 5),))),
+        ("ingredient_index.match", lambda: ingredient_index.match(rng.sample(ingredients, 5), "any", 10)),
+        ("pantry_matrix.match", lambda: pantry_matrix.match(pantry(), 2, 10)),
+        ("get_all_collections", call(crud.get_all_collections)),
+        ("create_full_recipe", create),
+        ("delete_recipe_by_id", delete),
+    ]
+
+
+def endpoint_cases(context: dict, client) -> list[tuple[str, object]]:
+    """
+    Returning (name, function) for every endpoint case.
+    """
+
+    from app.cache import recipe_cache
+
+    rng, recipe_ids, ingredients = context["rng"], context["recipe_ids"], context["ingredients"]
+    created = []
+
+    def get(url, params=None):
+        def run():
+            response = client.get(url, params=params() if callable(params) else params)
+            response.raise_for_status()
+        return run
+
+    def get_uncached():
+        recipe_cache.clear()
+        client.get(f"/recipes/{rng.choice(recipe_ids)}").raise_for_status()
+
+    def get_batch_uncached():
+        recipe_cache.clear()
+        client.get("/recipes", params={"ids": ",".join(map(str, rng.sample(recipe_ids, 50)))}).raise_for_status()
+
+    def similar():
+        client.get(f"/recipes/{rng.choice(recipe_ids)}/similar", params={"k": 10}).raise_for_status()
+
+    def pantry_match():
+        pantry = [{"name": name, "quantity": 500, "unit": "g"} for name in rng.sample(ingredients, 20)]
+        client.post("/recipes/pantry-match", json={"pantry": pantry, "portions": 2}).raise_for_status()
+
+    def create():
+        response = client.post("/recipes/", json=recipe_payload(rng))
+        response.raise_for_status()
+        created.append(response.json()["recipe_id"])
+
+    def delete():
+        client.delete(f"/recipes/{created.pop()}").raise_for_status()
+
+    return [
+        ("GET /recipes/{id} uncached", get_uncached),
+        ("GET /recipes/{id} cached", get(f"/recipes/{recipe_ids[0]}")),
+        ("GET /recipes?ids= 50 recipes uncached", get_batch_uncached),
+        ("GET /recipes/all first page", get("/recipes/all", {"limit": 20})),
+        ("GET /recipes/all middle page", get("/recipes/all", {"limit": 20, "cursor": context["cursor"]})),
+        ("GET /recipes/all/{skip} middle page", get(f"/recipes/all/{context['size'] // 2}", {"limit": 20})),
+        ("GET /recipes/all/filtered",
+         get("/recipes/all/filtered", {"meal_types": "dinner", "nationalities": "italian", "limit": 20})),
+        ("GET /recipes/search", get("/recipes/search", {"q": "golden crispy"})),
+        ("GET /recipes/facets", get("/recipes/facets", {"meal_types": "dinner"})),
+        ("GET /recipes/match", get("/recipes/match", lambda: {"ingredients": rng.sample(ingredients, 5)})),
+        ("POST /recipes/pantry-match", pantry_match),
+        ("GET /recipes/{id}/similar", similar),
+        ("GET /ingredients/autocomplete", get("/ingredients/autocomplete",
+                                             lambda: {"q": rng.choice(ingredients)[:rng.randint(1, 12)]})),
+        ("GET /collections/all", get("/collections/all")),
+        ("POST /recipes/", create),
+        ("DELETE /recipes/{id}", delete),
+    ]
+
+
+def run_worker(repeat: int, warmup: int, seed: int, only: list[str] | None) -> dict:
+    """
+    Running all cases against the database in DATABASE_URL.
+    """
+
+    from fastapi.testclient import TestClient
+    from app.database import SessionLocal
+    from app.main import app
+
+    with SessionLocal() as session:
+        context = sample_context(session, seed)
+
+    results = []
+    with TestClient(app) as client:
+        for kind, cases in (("crud", crud_cases(context)), ("endpoint", endpoint_cases(context, client))):
+            for name, function in cases:
+                if only and not any(part in name for part in only):
+                    continue
+                results.append({"kind": kind, "name": name, **measure(function, repeat, warmup)})
+
+    return {"size": context["size"], "results": results}
+
+
+def prepare_database(data_dir: str, size: int, seed: int) -> str:
+    """
+    Returning the URL of the SQLite database with the given size, generating it if it does not exist.
+    """
+
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from generate_dataset import generate
+    from app.models import Base
+
+    path = os.path.join(data_dir, f"recipes_{size}_{seed}.db")
+    url = f"sqlite:///{path}"
+    if os.path.exists(path):
+        return url
+
+    os.makedirs(data_dir, exist_ok=True)
+    partial = path + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    print(f"Generating {size} recipes ...", file=sys.stderr)
+    engine = create_engine(f"sqlite:///{partial}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        generate(session, size, seed)
+    engine.dispose()
+
+    os.rename(partial, path)
+    return url
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """
+    Returning a line for every case whose median is slower than in the baseline.
+    """
+
+    previous = {(run["size"], result["kind"], result["name"]): result["median_ms"]
+                for run in baseline for result in run["results"]}
+
+    regressions = []
+    for run in results:
+        for result in run["results"]:
+            before = previous.get((run["size"], result["kind"], result["name"]))
+            now = result["median_ms"]
+            if before is not None and now > before * (1 + tolerance) and now - before > MIN_REGRESSION_MS:
+                regressions.append(f"{run['size']:>8} {result['name']}: {before:.2f} ms -> {now:.2f} ms "
+                                   f"(+{(now / before - 1) * 100:.0f}%)")
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--url", help="benchmark this database instead of generated SQLite files")
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, "benchmarks", "data"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--only", nargs="+", help="only run cases whose name contains one of these")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare to this earlier JSON result file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown of the median before it counts as regression (default: 0.25)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        json.dump(run_worker(args.repeat, args.warmup, args.seed, args.only), sys.stdout)
+        return 0
+
+    urls = [args.url] if args.url else [prepare_database(args.data_dir, size, args.seed) for size in args.sizes]
+
+    runs = []
+    for url in urls:
+        command = [sys.executable, __file__, "--worker", "--repeat", str(args.repeat),
+                   "--warmup", str(args.warmup), "--seed", str(args.seed)]
+        if args.only:
+            command += ["--only", *args.only]
+
+        output = subprocess.run(command, env={**os.environ, "DATABASE_URL": url, "DATABASE_MODE": "sync"},
+                                cwd=ROOT, check=True, stdout=subprocess.PIPE, text=True).stdout
+        run = json.loads(output)
+        runs.append(run)
+
+        print(f"\n{run['size']} recipes ({url.split('://')[0]})")
+        print(f"{'case':<45}{'median ms':>12}{'p95 ms':>12}")
+        for result in run["results"]:
+            print(f"{result['name']:<45}{result['median_ms']:>12.2f}{result['p95_ms']:>12.2f}")
+
+    document = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+                "seed": args.seed,
+                "runs": runs}
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(document, file, indent=2)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as file:
+        regressions = compare(runs, json.load(file)["runs"], args.tolerance)
+
+    print(f"\n{len(regressions)} regressions compared to {args.baseline}.")
+    for line in regressions:
+        print(line)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Comparing the fast serialization path (row data encoded with orjson) with the response model path
+(ORM objects validated with from_attributes and encoded by the standard JSON encoder).
+
+Every comparison is timed in three layers: encoding alone on already loaded data, loading plus encoding,
+and the whole request through the TestClient with FAST_SERIALIZATION switched on and off.
+The dataset is the SQLite database of run_benchmarks.py for the given size, generated on first use.
+
+Usage: python benchmarks/serialization_benchmark.py --size 100000 --limit 100
+"""
+
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from run_benchmarks import measure, prepare_database
+
+
+def model_json(adapter, value) -> bytes:
+    # what FastAPI does with a response_model: validate, dump to JSON types, encode with json.dumps
+    content = adapter.dump_python(adapter.validate_python(value, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def cases(limit: int, client) -> list[tuple[str, object, object]]:
+    """
+    Returning (name, current path, fast path) for every comparison.
+    """
+
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from app.database import SessionLocal
+    from app.models import Recipes
+    from app.serialization import dumps
+    import app.crud as crud
+    import app.main as main
+    import app.schemas as schemas
+
+    list_adapter = TypeAdapter(list[schemas.RecipeListResponse])
+    detail_fields = ",".join(crud.DETAIL_FIELDS)
+    detail_adapter = TypeAdapter(schemas.RecipeResponse)
+
+    with SessionLocal() as session:
+        recipe_id = session.scalar(select(Recipes.id).order_by(Recipes.id).offset(limit // 2))
+
+    def with_session(function):
+        def run():
+            with SessionLocal() as session:
+                return function(session)
+        return run
+
+    def orm_list(session):
+        return session.scalars(select(Recipes).order_by(*crud.RECIPE_ORDER).limit(limit)).all()
+
+    def endpoint(path: str, fast: bool):
+        def run():
+            main.FAST_SERIALIZATION = fast
+            main.recipe_cache.clear()
+            response = client.get(path)
+            assert response.status_code == 200, response.text
+        return run
+
+    with SessionLocal() as session:
+        orm_recipes = orm_list(session)
+        list_adapter.validate_python(orm_recipes, from_attributes=True)     # loads the lazy attributes
+        rows = crud.get_all_recipes(session, 0, limit)
+        orm_recipe = crud.get_full_recipe_by_id(session, recipe_id)
+        detail_adapter.validate_python(orm_recipe, from_attributes=True)
+        document = crud.get_recipe_fields(session, recipe_id, list(crud.DETAIL_FIELDS))[1]
+        session.expunge_all()
+
+    return [
+        (f"encode list of {limit}",
+         lambda: model_json(list_adapter, orm_recipes),
+         lambda: dumps(rows)),
+        ("encode recipe detail",
+         lambda: model_json(detail_adapter, orm_recipe),
+         lambda: dumps(document)),
+        (f"load + encode list of {limit}",
+         with_session(lambda session: model_json(list_adapter, orm_list(session))),
+         with_session(lambda session: dumps(crud.get_all_recipes(session, 0, limit)))),
+        ("load + encode recipe detail",
+         with_session(lambda session: model_json(detail_adapter, crud.get_full_recipe_by_id(session, recipe_id))),
+         with_session(lambda session: dumps(crud.get_recipe_fields(session, recipe_id,
+                                                                  list(crud.DETAIL_FIELDS))[1]))),
+        (f"GET /recipes/all/0?limit={limit}",
+         endpoint(f"/recipes/all/0?limit={limit}", False),
+         endpoint(f"/recipes/all/0?limit={limit}", True)),
+        (f"GET /recipes/all?limit={limit}",
+         endpoint(f"/recipes/all?limit={limit}", False),
+         endpoint(f"/recipes/all?limit={limit}", True)),
+        # the full detail is served from the materialized document on both paths,
+        # a field selection is still loaded as rows and encoded by either path
+        ("GET /recipes/{id}?fields=... uncached",
+         endpoint(f"/recipes/{recipe_id}?fields={detail_fields}", False),
+         endpoint(f"/recipes/{recipe_id}?fields={detail_fields}", True)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--url", help="benchmark this database instead of a generated SQLite file")
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, "benchmarks", "data"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--limit", type=int, default=100, help="number of recipes in the lists (at most 100)")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    args = parser.parse_args()
+
+    # app.database reads the URL on import
+    os.environ["DATABASE_URL"] = args.url or prepare_database(args.data_dir, args.size, args.seed)
+    os.environ["DATABASE_MODE"] = "sync"
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        print(f"{'case':<40}{'current ms':>12}{'fast ms':>12}{'speedup':>10}")
+        for name, current, fast in cases(args.limit, client):
+            current_ms = measure(current, args.repeat, args.warmup)["median_ms"]
+            fast_ms = measure(fast, args.repeat, args.warmup)["median_ms"]
+            print(f"{name:<40}{current_ms:>12.3f}{fast_ms:>12.3f}{current_ms / fast_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
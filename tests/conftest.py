@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import sys
+import tempfile
+from contextlib import closing
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# app.database reads its settings on import: one SQLite file as primary and one as lagging replica,
+# reads of clients that wrote in the last 10 seconds go to the primary
+DATA_DIR = tempfile.mkdtemp(prefix="recipe-api-tests-")
+PRIMARY_PATH = os.path.join(DATA_DIR, "primary.db")
+REPLICA_PATH = os.path.join(DATA_DIR, "replica.db")
+
+os.environ.update(DATABASE_MODE="sync",
+                  DATABASE_URL=f"sqlite:///{PRIMARY_PATH}",
+                  DATABASE_REPLICA_URLS=f"sqlite:///{REPLICA_PATH}",
+                  DB_READ_YOUR_WRITES_SECONDS="10",
+                  IMAGE_DIR=os.path.join(DATA_DIR, "media"),
+                  SIMILARITY_INDEX_PATH="")
+
+
+def replicate():
+    """
+    Copying the primary to the replica, the replica has caught up afterwards.
+    """
+
+    with closing(sqlite3.connect(PRIMARY_PATH)) as primary, closing(sqlite3.connect(REPLICA_PATH)) as replica:
+        primary.backup(replica)
+
+
+@pytest.fixture
+def databases():
+    """
+    Empty primary and replica with the schema, empty caches and in-memory indexes.
+    Output: function copying the primary to the replica
+    """
+
+    from app.cache import recipe_cache, collection_cache, facet_cache
+    from app.database import SessionLocal, engine, replicas
+    from app.ingredient_index import ingredient_index
+    from app.models import Base
+    from app.name_index import ingredient_names, tool_names
+    from app.pantry_matrix import pantry_matrix
+    from app.similarity_index import similarity_index
+
+    for database_engine in (engine, *replicas.engines):
+        database_engine.dispose()
+    for path in (PRIMARY_PATH, REPLICA_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+
+    Base.metadata.create_all(engine)
+    replicate()
+
+    for cache in (recipe_cache, collection_cache, facet_cache):
+        cache.clear()
+
+    # the indexes are process wide, loading them from the empty primary drops the recipes of earlier tests
+    with SessionLocal() as session:
+        for index in (ingredient_index, pantry_matrix, similarity_index, ingredient_names, tool_names):
+            index.load(session)
+
+    return replicate
@@ -0,0 +1,41 @@
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+def recipe(name: str, ingredients: list[str], tools: list[str]) -> dict:
+    return {"name": name, "number_of_portions": 2, "instructions": "cook",
+            "ingredients": [{"name": ingredient} for ingredient in ingredients],
+            "tools": [{"name": tool} for tool in tools]}
+
+
+def complete(client: TestClient, path: str, q: str, **params) -> list[tuple[str, int]]:
+    response = client.get(path, params={"q": q, **params})
+    assert response.status_code == 200
+    return [(item["name"], item["recipe_count"]) for item in response.json()]
+
+
+def test_autocomplete_prefix_and_limit(databases):
+    client = TestClient(app)
+    client.post("/recipes/", json=recipe("Soup", ["Salt", "Sage", "Saffron"], ["Pot", "Pan"]))
+    client.post("/recipes/", json=recipe("Stew", ["Salt", "Sage", "Pepper"], ["Pot"]))
+    client.post("/recipes/", json=recipe("Fish", ["Salt", "Salmon"], ["Pan", "Peeler"]))
+
+    # ranked by usage, ties alphabetically, the prefix is case-insensitive
+    assert complete(client, "/ingredients/autocomplete", "sa") == [("Salt", 3), ("Sage", 2), ("Saffron", 1),
+                                                                  ("Salmon", 1)]
+    assert complete(client, "/ingredients/autocomplete", "SAL") == [("Salt", 3), ("Salmon", 1)]
+    assert complete(client, "/ingredients/autocomplete", "sa", limit=2) == [("Salt", 3), ("Sage", 2)]
+    assert complete(client, "/ingredients/autocomplete", "salz") == []
+    assert complete(client, "/tools/autocomplete", "p") == [("Pan", 2), ("Pot", 2), ("Peeler", 1)]
+
+    # short prefixes are cached until the next change
+    client.post("/recipes/", json=recipe("Risotto", ["Saffron", "Rice"], ["Pot"]))
+    assert complete(client, "/ingredients/autocomplete", "sa", limit=2) == [("Salt", 3), ("Saffron", 2)]
+    assert complete(client, "/tools/autocomplete", "p", limit=1) == [("Pot", 3)]
+
+
+def test_autocomplete_limit_is_validated(databases):
+    client = TestClient(app)
+
+    assert client.get("/ingredients/autocomplete", params={"q": "sa", "limit": 51}).status_code == 422
+    assert client.get("/ingredients/autocomplete", params={"q": ""}).status_code == 422
@@ -0,0 +1,37 @@
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+def recipe(name: str) -> dict:
+    return {"name": name, "number_of_portions": 2, "instructions": "cook",
+            "ingredients": [{"name": "Salt", "quantity": 5, "unit": "g"}], "tools": [{"name": "Pan"}]}
+
+
+def test_ndjson_stream_with_lines_split_across_body_chunks(databases):
+    client = TestClient(app)
+    body = ("\n".join(json.dumps(recipe(f"Recipe {i}")) for i in range(5)) + "\n\nnot json\n").encode()
+
+    # the body arrives in pieces cutting through the lines
+    response = client.post("/recipes/bulk", params={"chunk_size": 2},
+                           content=(body[i:i + 7] for i in range(0, len(body), 7)),
+                           headers={"content-type": "application/x-ndjson"})
+
+    assert response.status_code == 201
+    assert [item["index"] for item in response.json()["created"]] == [0, 1, 2, 3, 4]
+    assert [item["index"] for item in response.json()["errors"]] == [5]
+
+    names = {client.get(f"/recipes/{item['recipe_id']}").json()["name"] for item in response.json()["created"]}
+    assert names == {f"Recipe {i}" for i in range(5)}
+
+
+def test_ndjson_without_final_newline(databases):
+    client = TestClient(app)
+    body = "\n".join(json.dumps(recipe(f"Recipe {i}")) for i in range(3))
+
+    response = client.post("/recipes/bulk", params={"chunk_size": 2}, content=body,
+                           headers={"content-type": "application/x-ndjson"})
+
+    assert response.status_code == 201
+    assert [item["index"] for item in response.json()["created"]] == [0, 1, 2]
+    assert response.json()["errors"] == []
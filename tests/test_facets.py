@@ -0,0 +1,71 @@
+from fastapi.testclient import TestClient
+from app.database import SessionLocal
+from app.main import app
+import app.crud as crud
+
+
+def recipe(name: str, meal_type: str, nationality: str) -> dict:
+    return {"name": name, "number_of_portions": 2, "instructions": "cook", "meal_type": meal_type,
+            "nationality": nationality, "ingredients": [{"name": "Salt"}], "tools": []}
+
+
+def create_recipes(client: TestClient):
+    winter = client.post("/collections/new", json={"name": "Winter"}).json()["collection_id"]
+    summer = client.post("/collections/new", json={"name": "Summer"}).json()["collection_id"]
+
+    for name, meal_type, nationality, collections in [("Lasagna", "dinner", "italian", [winter, summer]),
+                                                      ("Tacos", "dinner", "mexican", [winter]),
+                                                      ("Pizza", "lunch", "italian", []),
+                                                      ("Crepes", "breakfast", "french", [])]:
+        recipe_id = client.post("/recipes/", json=recipe(name, meal_type, nationality)).json()["recipe_id"]
+        for collection_id in collections:
+            client.post("/collections/", params={"recipe_id": recipe_id, "collection_id": collection_id})
+
+    return winter, summer
+
+
+def test_facet_counts(databases):
+    client = TestClient(app)
+    winter, summer = create_recipes(client)
+
+    assert client.get("/recipes/facets").json() == {
+        "total": 4,
+        "meal_types": [{"value": "dinner", "count": 2}, {"value": "breakfast", "count": 1},
+                       {"value": "lunch", "count": 1}],
+        "nationalities": [{"value": "italian", "count": 2}, {"value": "french", "count": 1},
+                          {"value": "mexican", "count": 1}],
+        "collections": [{"collection_id": winter, "count": 2}, {"collection_id": summer, "count": 1}],
+    }
+
+    assert client.get("/recipes/facets", params={"meal_types": "dinner"}).json() == {
+        "total": 2,
+        "meal_types": [{"value": "dinner", "count": 2}],
+        "nationalities": [{"value": "italian", "count": 1}, {"value": "mexican", "count": 1}],
+        "collections": [{"collection_id": winter, "count": 2}, {"collection_id": summer, "count": 1}],
+    }
+
+    # a recipe in both collections counts once in the total and once per collection
+    assert client.get("/recipes/facets", params={"collections": summer, "nationalities": "italian"}).json() == {
+        "total": 1,
+        "meal_types": [{"value": "dinner", "count": 1}],
+        "nationalities": [{"value": "italian", "count": 1}],
+        "collections": [{"collection_id": winter, "count": 1}, {"collection_id": summer, "count": 1}],
+    }
+
+    assert client.get("/recipes/facets", params={"meal_types": "brunch"}).json() == {
+        "total": 0, "meal_types": [], "nationalities": [], "collections": []}
+
+
+def test_facet_counts_of_union_all_query(databases):
+    client = TestClient(app)
+    winter, summer = create_recipes(client)
+
+    with SessionLocal() as session:
+        # SQLite has no GROUPING SETS, the facets come from the UNION ALL of the groupings
+        assert session.get_bind().dialect.name == "sqlite"
+        facets = crud.get_recipe_facets(session, nationalities=["italian", "mexican"])
+
+    assert facets == {"total": 3,
+                      "meal_types": [("dinner", 2), ("lunch", 1)],
+                      "nationalities": [("italian", 2), ("mexican", 1)],
+                      "collections": [(winter, 2), (summer, 1)]}
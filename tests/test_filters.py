@@ -0,0 +1,55 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+def recipe(name: str, ingredients: list[str], tools: list[str]) -> dict:
+    return {"name": name, "number_of_portions": 2, "instructions": "cook",
+            "ingredients": [{"name": ingredient} for ingredient in ingredients],
+            "tools": [{"name": tool} for tool in tools]}
+
+
+@pytest.fixture
+def client(databases):
+    client = TestClient(app)
+    winter = client.post("/collections/new", json={"name": "Winter"}).json()["collection_id"]
+    summer = client.post("/collections/new", json={"name": "Summer"}).json()["collection_id"]
+
+    for name, ingredients, tools, collections in [("Cake", ["Salt", "Egg", "Flour"], ["Pan", "Whisk"], [winter, summer]),
+                                                  ("Omelette", ["Salt", "Egg"], ["Pan"], [winter]),
+                                                  ("Salad", ["Salt", "Tomato"], ["Bowl"], [summer]),
+                                                  ("Nut cake", ["Egg", "Nut"], ["Pan", "Whisk"], [])]:
+        recipe_id = client.post("/recipes/", json=recipe(name, ingredients, tools)).json()["recipe_id"]
+        for collection_id in collections:
+            client.post("/collections/", params={"recipe_id": recipe_id, "collection_id": collection_id})
+
+    return client
+
+
+def names(client: TestClient, **params) -> list[str]:
+    response = client.get("/recipes/all/filtered", params=params)
+    assert response.status_code == 200
+    return [item["name"] for item in response.json()]
+
+
+def test_ingredient_filters(client):
+    assert names(client, ingredients=["Salt", "Egg"]) == ["Cake", "Omelette"]
+    assert names(client, ingredients=["Flour", "Tomato"], ingredient_mode="any") == ["Cake", "Salad"]
+    assert names(client, ingredients=["Salt", "Egg"], exclude_ingredients="Flour") == ["Omelette"]
+    assert names(client, exclude_ingredients=["Nut", "Tomato"]) == ["Cake", "Omelette"]
+    assert names(client, ingredients="Saffron") == []
+
+
+def test_tool_and_collection_filters(client):
+    assert names(client, tools=["Pan", "Whisk"]) == ["Cake", "Nut cake"]
+    assert names(client, tools=["Whisk", "Bowl"], tool_mode="any") == ["Cake", "Salad", "Nut cake"]
+    assert names(client, collections=[1, 2], collection_mode="all") == ["Cake"]
+    assert names(client, collections=[1, 2]) == ["Cake", "Omelette", "Salad"]
+
+
+def test_combined_filters(client):
+    assert names(client, ingredients="Egg", tools="Pan", collections=1, exclude_ingredients="Nut") == ["Cake", "Omelette"]
+    assert names(client, ingredients="Egg", tools=["Pan", "Whisk"], collections=1) == ["Cake"]
+    assert names(client, ingredients=["Salt", "Tomato"], ingredient_mode="any", tools="Pan",
+                 collections=2) == ["Cake"]
+    assert names(client, ingredients="Egg", tools="Bowl") == []
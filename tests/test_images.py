@@ -0,0 +1,86 @@
+import io
+from fastapi.testclient import TestClient
+from PIL import Image
+import app.images as images
+import app.main as main
+from app.main import app
+
+
+def png(size: tuple[int, int] = (40, 30)) -> bytes:
+    content = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(content, "PNG")
+    return content.getvalue()
+
+
+def create_recipe(client: TestClient) -> int:
+    return client.post("/recipes/", json={"name": "Soup", "number_of_portions": 2, "instructions": "cook",
+                                          "ingredients": [{"name": "Salt"}], "tools": []}).json()["recipe_id"]
+
+
+def test_upload_and_thumbnail(databases):
+    client = TestClient(app)
+    recipe_id = create_recipe(client)
+
+    response = client.post(f"/recipes/{recipe_id}/image", files={"image": ("soup.png", png(), "image/png")})
+    assert response.status_code == 201
+
+    thumbnail = client.get(response.json()["thumbnail_url"])
+    assert thumbnail.status_code == 200
+    assert Image.open(io.BytesIO(thumbnail.content)).size == images.THUMBNAIL_SIZE
+
+
+def test_oversized_upload_is_rejected_while_reading(databases, monkeypatch):
+    monkeypatch.setattr(main, "MAX_IMAGE_BYTES", 1000)
+    client = TestClient(app)
+    recipe_id = create_recipe(client)
+
+    # with Content-Length
+    response = client.post(f"/recipes/{recipe_id}/image", files={"image": ("big.png", b"x" * 50_000, "image/png")})
+    assert response.status_code == 413
+
+    # chunked without Content-Length, the limit is checked while the body arrives
+    boundary = "upload-boundary"
+    head = (f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="big.png"\r\n'
+            f"Content-Type: image/png\r\n\r\n").encode()
+
+    def body():
+        yield head
+        for _ in range(100):
+            yield b"x" * 1000
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post(f"/recipes/{recipe_id}/image", content=body(),
+                           headers={"content-type": f"multipart/form-data; boundary={boundary}"})
+    assert response.status_code == 413
+
+    # the image itself is over the limit, the multipart overhead is not
+    response = client.post(f"/recipes/{recipe_id}/image", files={"image": ("big.png", b"x" * 1001, "image/png")})
+    assert response.status_code == 413
+    assert client.get(f"/recipes/{recipe_id}").json()["image_url"] is None
+
+
+def test_invalid_uploads(databases):
+    client = TestClient(app)
+    recipe_id = create_recipe(client)
+
+    assert client.post(f"/recipes/{recipe_id}/image", files={"photo": ("soup.png", png(), "image/png")}
+                       ).status_code == 400
+    assert client.post(f"/recipes/{recipe_id}/image", files={"image": ("soup.png", b"not an image", "image/png")}
+                       ).status_code == 400
+    assert client.post(f"/recipes/{recipe_id}/image", content=png(),
+                       headers={"content-type": "image/png"}).status_code == 400
+
+
+def test_decompression_bombs_are_rejected(databases, monkeypatch):
+    client = TestClient(app)
+    recipe_id = create_recipe(client)
+    # stored before the limit was lowered
+    name = images.store_image(png((60, 60)))
+
+    monkeypatch.setattr(images, "MAX_IMAGE_PIXELS", 2000)
+
+    response = client.post(f"/recipes/{recipe_id}/image", files={"image": ("soup.png", png((60, 60)), "image/png")})
+    assert response.status_code == 400
+    assert "pixels" in response.json()["detail"]
+
+    assert client.get(f"/images/{name}/thumbnail").status_code == 400
@@ -0,0 +1,27 @@
+import asyncio
+import time
+from app.main import ensure_loaded
+
+
+class SlowIndex:
+    def __init__(self):
+        self.loaded = False
+        self.loads = 0
+
+    def load(self, session):
+        time.sleep(0.05)
+        self.loads += 1
+        self.loaded = True
+
+
+def test_concurrent_requests_load_a_cold_index_once(databases):
+    index = SlowIndex()
+
+    async def requests():
+        await asyncio.gather(*(ensure_loaded(index) for _ in range(10)))
+        await ensure_loaded(index)
+
+    asyncio.run(requests())
+
+    assert index.loaded
+    assert index.loads == 1
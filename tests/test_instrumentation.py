@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.database import SessionLocal
+from app.models import Recipes
+from app.schemas import RecipeCreate
+import app.crud as crud
+import app.instrumentation as instrumentation
+
+
+@pytest.fixture
+def strict_statistics(databases, monkeypatch):
+    """
+    Statements counted as in a request with SQL_REPEAT_STRICT, without the middleware.
+    """
+
+    monkeypatch.setattr(instrumentation, "SQL_REPEAT_STRICT", True)
+    listeners = [("before_cursor_execute", instrumentation.before_cursor_execute),
+                 ("after_cursor_execute", instrumentation.after_cursor_execute),
+                 ("handle_error", instrumentation.handle_error)]
+    for name, listener in listeners:
+        event.listen(Engine, name, listener)
+    token = instrumentation.current_statistics.set(instrumentation.RequestStatistics("/test"))
+
+    yield
+
+    instrumentation.current_statistics.reset(token)
+    for name, listener in listeners:
+        event.remove(Engine, name, listener)
+
+
+def test_strict_mode_raises_on_n_plus_one(strict_statistics):
+    with SessionLocal() as session:
+        with pytest.raises(instrumentation.RepeatedStatementError):
+            # one primary key query per recipe
+            for recipe_id in range(1, instrumentation.SQL_REPEAT_THRESHOLD + 2):
+                session.get(Recipes, recipe_id)
+
+
+def test_repeated_statement_is_not_turned_into_invalid_recipe(strict_statistics, monkeypatch):
+    monkeypatch.setattr(instrumentation, "SQL_REPEAT_THRESHOLD", 0)
+    recipe = RecipeCreate(name="Soup", number_of_portions=2, instructions="cook",
+                          ingredients=[{"name": "Salt"}], tools=[])
+
+    with SessionLocal() as session:
+        with pytest.raises(instrumentation.RepeatedStatementError):
+            crud.create_full_recipe(session, recipe)
+
+        with pytest.raises(instrumentation.RepeatedStatementError):
+            crud.bulk_create_recipes(session, [recipe.model_dump()])
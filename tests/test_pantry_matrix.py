@@ -0,0 +1,43 @@
+from app.pantry_matrix import PantryMatrix
+
+
+def pantry_matrix(recipes: list[tuple[int, int, list[tuple[str, float | None, str | None]]]]) -> PantryMatrix:
+    names = sorted({name for _, _, items in recipes for name, _, _ in items})
+    ingredient_ids = {name: ingredient_id for ingredient_id, name in enumerate(names, 1)}
+
+    matrix = PantryMatrix()
+    matrix.apply("add", [(recipe_id, portions, [(ingredient_ids[name], quantity, unit)
+                                                for name, quantity, unit in items])
+                         for recipe_id, portions, items in recipes], ingredient_ids)
+    return matrix
+
+
+def test_ingredient_without_quantity_is_satisfied_by_any_unit():
+    matrix = pantry_matrix([(1, 2, [("Salt", None, None), ("Flour", 200, "g")])])
+
+    match, = matrix.match([("Salt", 100, "g"), ("Flour", 500, "g")], portions=2)
+
+    assert match["matching_ingredients_count"] == 2
+    assert match["missing_ingredients_count"] == 0
+    assert match["missing"] == []
+
+
+def test_counts_without_unit_and_in_pieces_match_both_ways():
+    matrix = pantry_matrix([(1, 1, [("Egg", 2, None)]), (2, 1, [("Egg", 2, "pcs")])])
+
+    for pantry_unit in ("pcs", None):
+        matches = matrix.match([("Egg", 4, pantry_unit)], portions=1)
+        assert [(match["recipe_id"], match["missing_ingredients_count"]) for match in matches] == [(1, 0), (2, 0)]
+
+    shortage = {match["recipe_id"]: match["missing"] for match in matrix.match([("Egg", 3, "pcs")], portions=2)}
+    assert shortage == {1: [("Egg", 1.0, None)], 2: [("Egg", 1.0, "pcs")]}
+
+
+def test_quantities_in_units_that_can_not_be_converted_are_not_credited():
+    matrix = pantry_matrix([(1, 1, [("Egg", 2, None), ("Milk", 200, "ml")])])
+
+    match, = matrix.match([("Egg", 500, "g"), ("Milk", 1, "l")], portions=1)
+
+    # the eggs are in the pantry, but 500 g say nothing about 2 eggs
+    assert match["matching_ingredients_count"] == 2
+    assert match["missing"] == [("Egg", 2.0, None)]
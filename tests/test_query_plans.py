@@ -0,0 +1,165 @@
+"""
+Query plan regression tests for the crud queries.
+
+Every crud query below is run in a rolled back transaction while its statements are captured,
+then every captured statement is explained. A test fails if a plan reads one of the large tables
+with a sequential scan, i.e. if a query lost the index it needs.
+
+SQLite:     "SCAN <table>" without an index in EXPLAIN QUERY PLAN, on the test database.
+            Without ANALYZE statistics the plans do not depend on the table sizes.
+PostgreSQL: plans are made with enable_seqscan = off, so a remaining "Seq Scan" means
+            there is no usable index at all, independent of table sizes and statistics.
+            Runs against the migrated database in TEST_POSTGRES_URL, skipped without it.
+"""
+
+import json
+import os
+import re
+from datetime import date
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+from app.database import engine
+from app.main import app
+import app.crud as crud
+
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+LARGE_TABLES = {"recipes", "ingredients", "kitchen_tools",
+                "recipe_ingredients", "recipe_tools", "recipe_collections", "recipe_documents"}
+
+# (crud function, arguments after the session), write functions are rolled back afterwards,
+# their commits only release the savepoint of the test
+QUERIES = [
+    (crud.get_full_recipe_by_id, (1,)),
+    (crud.get_full_recipes_by_ids, ([1, 2, 3],)),
+    (crud.get_recipe_version, (1,)),
+    (crud.get_recipe_document, (1,)),
+    (crud.get_recipe_documents, ([1, 2, 3],)),
+    (crud.assemble_recipe_documents, ([1, 2, 3],)),
+    (crud.get_recipes_by_ids, ([1, 2, 3],)),
+    (crud.get_all_recipes, (0, 10)),
+    (crud.get_recipes_filtered, (["dinner"], ["italian"], None, 0, 10)),
+    (crud.get_recipes_page, (["dinner"], None, None, None, 10)),
+    (crud.get_recipes_page, (["dinner"], None, None, crud.encode_cursor(date(2024, 6, 1), 500), 10)),
+    (crud.get_recipe_facets, (["dinner"], ["italian"], [1, 2])),
+    (crud.get_recipes_filtered, (None, None, [1, 2], 0, 10, "all", ["Salt", "Egg"], "all", ["Nut"], ["Pan"], "any")),
+    (crud.search_recipes, ("tomato soup",)),
+    (crud.get_or_create_ingredients, ({"Salt", "Egg"},)),
+    (crud.get_or_create_kitchen_tools, ({"Pan"},)),
+    (crud.delete_orphaned_ingredients, ([1, 2, 3],)),
+    (crud.delete_orphaned_kitchen_tools, ([1, 2],)),
+    (crud.get_recipes_by_ingredients, (["Salt", "Egg"],)),
+    (crud.get_best_recipes_for_ingredients, (["Salt", "Egg"],)),
+    (crud.get_shopping_list, ([(1, 4), (2, 2), (3, 6)],)),
+    (crud.sweep_orphans, (1000,)),
+    (crud.backfill_recipe_documents, (1000, True)),
+]
+
+QUERY_IDS = [f"{function.__name__}-{index}" for index, (function, _) in enumerate(QUERIES)]
+
+
+def recipe(name: str, ingredients: list[str], meal_type: str = "dinner", nationality: str = "italian") -> dict:
+    return {"name": name, "number_of_portions": 2, "instructions": "cook", "meal_type": meal_type,
+            "nationality": nationality, "ingredients": [{"name": name, "quantity": 100, "unit": "g"}
+                                                        for name in ingredients],
+            "tools": [{"name": "Pan"}]}
+
+
+def capture_statements(connection, function, args) -> list[tuple[str, object]]:
+    """
+    Running the crud function in a savepoint and returning its statements with their parameters.
+    """
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    event.listen(connection, "before_cursor_execute", capture)
+    try:
+        with Session(bind=connection, join_transaction_mode="create_savepoint") as session:
+            try:
+                function(session, *args)
+            except Exception as e:
+                # e.g. 404 for the sample IDs, the statements were captured anyway
+                if not getattr(e, "status_code", None):
+                    raise
+    finally:
+        event.remove(connection, "before_cursor_execute", capture)
+
+    return statements
+
+
+def sequential_scans(connection, statement: str, parameters) -> list[str]:
+    """
+    Returning the large tables the plan of the statement reads with a sequential scan.
+    """
+
+    if connection.dialect.name == "postgresql":
+        plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        tables, nodes = [], [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in LARGE_TABLES:
+                tables.append(node["Relation Name"])
+            nodes.extend(node.get("Plans", []))
+        return tables
+
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [match.group(1) for *_, detail in rows
+            if (match := re.fullmatch(r"SCAN (\w+)", detail)) and match.group(1) in LARGE_TABLES]
+
+
+def assert_index_scans(connection, function, args):
+    statements = capture_statements(connection, function, args)
+    assert statements, f"{function.__name__} ran no statements"
+
+    failures = [f"sequential scan on {', '.join(tables)}: {' '.join(statement.split())}"
+                for statement, parameters in statements
+                if (tables := sequential_scans(connection, statement, parameters))]
+    assert not failures, "\n".join(failures)
+
+
+@pytest.fixture
+def sqlite_connection(databases):
+    client = TestClient(app)
+    for index, ingredients in enumerate([["Salt", "Egg"], ["Salt", "Tomato"], ["Egg", "Flour"]]):
+        client.post("/recipes/", json=recipe(f"Recipe {index}", ingredients))
+    for name in ("Winter", "Summer"):
+        client.post("/collections/new", json={"name": name})
+    client.post("/collections/", params={"recipe_id": 1, "collection_id": 1})
+
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        yield connection
+        transaction.rollback()
+
+
+@pytest.fixture(scope="module")
+def postgres_connection():
+    if not TEST_POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+
+    postgres_engine = create_engine(TEST_POSTGRES_URL)
+    with postgres_engine.connect() as connection:
+        transaction = connection.begin()
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        yield connection
+        transaction.rollback()
+    postgres_engine.dispose()
+
+
+@pytest.mark.parametrize("function, args", QUERIES, ids=QUERY_IDS)
+def test_sqlite_plans_use_indexes(sqlite_connection, function, args):
+    assert_index_scans(sqlite_connection, function, args)
+
+
+@pytest.mark.parametrize("function, args", QUERIES, ids=QUERY_IDS)
+def test_postgres_plans_use_indexes(postgres_connection, function, args):
+    assert_index_scans(postgres_connection, function, args)
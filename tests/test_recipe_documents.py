@@ -0,0 +1,27 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from app.database import SessionLocal
+from app.main import app
+from app.models import RecipeDocuments
+from app.serialization import dumps, loads
+
+
+def test_fields_of_document_without_a_newer_field(databases):
+    client = TestClient(app)
+    recipe_id = client.post("/recipes/", json={"name": "Soup", "number_of_portions": 2, "instructions": "cook",
+                                               "ingredients": [{"name": "Salt"}], "tools": []}).json()["recipe_id"]
+
+    # a document written before thumbnail_url existed
+    with SessionLocal() as session:
+        document = loads(session.get(RecipeDocuments, recipe_id).document)
+        del document["thumbnail_url"]
+        session.execute(update(RecipeDocuments).where(RecipeDocuments.recipe_id == recipe_id)
+                        .values(document=dumps(document).decode()))
+        session.commit()
+
+    # cached from the document, the fields are projected from the cached content
+    assert client.get(f"/recipes/{recipe_id}").status_code == 200
+    response = client.get(f"/recipes/{recipe_id}", params={"fields": "name,thumbnail_url"})
+
+    assert response.status_code == 200
+    assert response.json() == {"id": recipe_id, "name": "Soup", "thumbnail_url": None}
@@ -0,0 +1,47 @@
+import base64
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+def recipe(name: str, meal_type: str) -> dict:
+    return {"name": name, "number_of_portions": 2, "instructions": "cook", "meal_type": meal_type,
+            "ingredients": [{"name": "Salt"}], "tools": []}
+
+
+def read_pages(client: TestClient, **params) -> list[list[int]]:
+    pages, cursor = [], None
+    while True:
+        page = client.get("/recipes/all", params={**params, **({"cursor": cursor} if cursor else {})}).json()
+        pages.append([item["id"] for item in page["items"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_pages_of_recipes_created_on_the_same_day(databases):
+    client = TestClient(app)
+    meal_types = ["lunch" if index % 3 == 0 else "dinner" for index in range(8)]
+    recipe_ids = [client.post("/recipes/", json=recipe(f"Recipe {index}", meal_type)).json()["recipe_id"]
+                  for index, meal_type in enumerate(meal_types)]
+
+    # all created_at are equal, the ID decides the order
+    assert read_pages(client, limit=3) == [recipe_ids[0:3], recipe_ids[3:6], recipe_ids[6:8]]
+    assert read_pages(client, limit=4) == [recipe_ids[0:4], recipe_ids[4:8]]
+
+    dinners = [recipe_id for recipe_id, meal_type in zip(recipe_ids, meal_types) if meal_type == "dinner"]
+    assert read_pages(client, limit=2, meal_types="dinner") == [dinners[0:2], dinners[2:4], dinners[4:5]]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    base64.urlsafe_b64encode(b"2024-01-01").decode(),
+    base64.urlsafe_b64encode(b"2024-13-01|5").decode(),
+    base64.urlsafe_b64encode(b"2024-01-01|five").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),
+])
+def test_invalid_cursor_is_a_client_error(databases, cursor):
+    response = TestClient(app).get("/recipes/all", params={"cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,79 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.database import SessionLocal
+from app.main import app
+from app.models import Recipes
+import app.crud as crud
+
+
+def create_recipe(client: TestClient) -> int:
+    return client.post("/recipes/", json={"name": "Soup", "number_of_portions": 2, "instructions": "cook",
+                                          "ingredients": [{"name": "Salt"}], "tools": [{"name": "Pan"}]}
+                       ).json()["recipe_id"]
+
+
+def test_image_upload_racing_another_change_is_a_conflict(databases):
+    recipe_id = create_recipe(TestClient(app))
+
+    with SessionLocal() as session:
+        # loaded with version 1, another transaction writes version 2 before this one flushes
+        recipe = session.get(Recipes, recipe_id)
+        assert recipe.version == 1
+        assert crud.set_recipe_image(SessionLocal(), recipe_id, "/images/a.png", "/images/a.png/thumbnail") == 2
+
+        with pytest.raises(HTTPException) as error:
+            crud.set_recipe_image(session, recipe_id, "/images/b.png", "/images/b.png/thumbnail")
+
+    assert error.value.status_code == 409
+    with SessionLocal() as session:
+        assert session.get(Recipes, recipe_id).image_url == "/images/a.png"
+
+
+def test_delete_racing_another_change_is_a_conflict(databases):
+    client = TestClient(app)
+    recipe_id = create_recipe(client)
+
+    with SessionLocal() as session:
+        recipe = session.get(Recipes, recipe_id)
+        assert recipe.version == 1
+        crud.set_recipe_image(SessionLocal(), recipe_id, "/images/a.png", "/images/a.png/thumbnail")
+
+        with pytest.raises(HTTPException) as error:
+            crud.delete_recipe_by_id(session, recipe_id)
+
+    assert error.value.status_code == 409
+    assert client.get(f"/recipes/{recipe_id}").status_code == 200
+
+
+def test_single_step_helpers_bump_the_version(databases):
+    replicate = databases
+    client = TestClient(app)
+
+    with SessionLocal() as session:
+        recipe_id = crud.create_recipe(session, "Omelette", 1, "fry")
+        crud.add_ingredient_to_recipe(session, recipe_id, "Egg", 2)
+        session.commit()
+
+    assert client.get(f"/recipes/{recipe_id}").headers["etag"] == f'"{recipe_id}.2"'
+
+    with SessionLocal() as session:
+        crud.add_ingredient_to_recipe(session, recipe_id, "Chive", 5, "g")
+        crud.add_tool_to_recipe(session, recipe_id, "Pan")
+        session.commit()
+
+    # the cached version 2 was invalidated by the commit
+    response = client.get(f"/recipes/{recipe_id}")
+    assert response.headers["etag"] == f'"{recipe_id}.4"'
+    assert sorted(item["name"] for item in response.json()["ingredients"]) == ["Chive", "Egg"]
+    assert [item["name"] for item in response.json()["tools"]] == ["Pan"]
+
+    # the in-memory indexes got the new linkages, the matched recipes are read from the replica
+    replicate()
+    match = client.get("/recipes/match", params={"ingredients": ["Chive", "Egg"], "mode": "all"}).json()
+    assert [item["recipe"]["id"] for item in match] == [recipe_id]
+    pantry = client.post("/recipes/pantry-match", json={"portions": 1,
+                                                        "pantry": [{"name": "Egg", "quantity": 2},
+                                                                   {"name": "Chive", "quantity": 5, "unit": "g"}]})
+    assert [(item["recipe"]["id"], item["matching_ingredients_count"], item["missing"]) for item in pantry.json()
+            ] == [(recipe_id, 2, [])]
@@ -0,0 +1,79 @@
+import io
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.cache import recipe_cache, facet_cache, collection_cache
+from app.main import app
+
+
+def recipe(name: str, meal_type: str = "dinner") -> dict:
+    return {"name": name, "number_of_portions": 2, "instructions": "cook", "meal_type": meal_type,
+            "ingredients": [{"name": "Salt"}], "tools": [{"name": "Pan"}]}
+
+
+def png() -> bytes:
+    content = io.BytesIO()
+    Image.new("RGB", (40, 30), (200, 30, 30)).save(content, "PNG")
+    return content.getvalue()
+
+
+def test_recipe_read_from_replica_is_served_from_cache(databases):
+    writer, reader = TestClient(app), TestClient(app)
+
+    recipe_id = writer.post("/recipes/", json=recipe("Soup")).json()["recipe_id"]
+    # the replica has not seen the recipe yet, the cache miss is read from the primary
+    assert reader.get(f"/recipes/{recipe_id}").json()["name"] == "Soup"
+
+    hits = recipe_cache.statistics()["hits"]
+    assert reader.get(f"/recipes/{recipe_id}").json()["name"] == "Soup"
+    assert recipe_cache.statistics()["hits"] == hits + 1
+
+
+def test_recipe_cache_is_not_filled_from_lagging_replica(databases):
+    replicate = databases
+    writer, reader = TestClient(app), TestClient(app)
+
+    recipe_id = writer.post("/recipes/", json=recipe("Soup")).json()["recipe_id"]
+    replicate()
+    assert reader.get(f"/recipes/{recipe_id}").headers["etag"] == f'"{recipe_id}.1"'
+
+    # version 2 on the primary only, the upload clears the cached version 1
+    assert writer.post(f"/recipes/{recipe_id}/image", files={"image": ("soup.png", png(), "image/png")}).status_code == 201
+
+    for client in (reader, writer, reader):
+        response = client.get(f"/recipes/{recipe_id}")
+        assert response.headers["etag"] == f'"{recipe_id}.2"'
+        assert response.json()["image_url"] is not None
+
+    # the batch endpoint splices the same cached content
+    assert reader.get("/recipes", params={"ids": str(recipe_id)}).json()["recipes"][0]["image_url"] is not None
+
+
+def test_facets_are_not_cached_from_lagging_replica(databases):
+    replicate = databases
+    writer, reader = TestClient(app), TestClient(app)
+
+    writer.post("/recipes/", json=recipe("Soup"))
+    replicate()
+    writer.post("/recipes/", json=recipe("Stew"))
+
+    assert reader.get("/recipes/facets").json()["total"] == 2
+
+    hits = facet_cache.statistics()["hits"]
+    assert reader.get("/recipes/facets").json()["total"] == 2
+    assert writer.get("/recipes/facets").json()["total"] == 2
+    assert facet_cache.statistics()["hits"] == hits + 2
+
+
+def test_collections_are_not_cached_from_lagging_replica(databases):
+    replicate = databases
+    writer, reader = TestClient(app), TestClient(app)
+
+    writer.post("/collections/new", json={"name": "Winter"})
+    replicate()
+    writer.post("/collections/new", json={"name": "Summer"})
+
+    assert [collection["name"] for collection in reader.get("/collections/all").json()] == ["Winter", "Summer"]
+
+    hits = collection_cache.statistics()["hits"]
+    assert [collection["name"] for collection in reader.get("/collections/all").json()] == ["Winter", "Summer"]
+    assert collection_cache.statistics()["hits"] == hits + 1
@@ -0,0 +1,50 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from app.database import SessionLocal
+from app.main import app
+from app.models import Recipes
+
+
+def recipe(name: str, instructions: str, notes: str | None = None, meal_type: str = "dinner") -> dict:
+    return {"name": name, "number_of_portions": 2, "instructions": instructions, "notes": notes,
+            "meal_type": meal_type, "ingredients": [{"name": "Salt"}], "tools": []}
+
+
+def search(client: TestClient, q: str, **params) -> list[str]:
+    response = client.get("/recipes/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return [item["name"] for item in response.json()]
+
+
+def test_search_ranks_name_matches_first(databases):
+    client = TestClient(app)
+    client.post("/recipes/", json=recipe("Pasta", "Cook the pasta, add tomato sauce"))
+    client.post("/recipes/", json=recipe("Tomato soup", "Boil tomatoes and onions", meal_type="lunch"))
+    client.post("/recipes/", json=recipe("Cake", "Bake it", notes="nice with tomato tea"))
+    client.post("/recipes/", json=recipe("Bread", "Bake it"))
+
+    assert search(client, "tomato") == ["Tomato soup", "Pasta", "Cake"]
+    # every word has to match
+    assert search(client, "tomato sauce") == ["Pasta"]
+    assert search(client, "tomato", meal_types="lunch") == ["Tomato soup"]
+    # FTS5 query syntax in the input is searched as plain words
+    assert search(client, 'tomato" OR "bake') == []
+    assert search(client, "***") == []
+
+
+def test_search_index_follows_writes(databases):
+    client = TestClient(app)
+    recipe_id = client.post("/recipes/", json=recipe("Goulash", "Stew the beef")).json()["recipe_id"]
+    assert search(client, "goulash") == ["Goulash"]
+
+    with SessionLocal() as session:
+        session.execute(update(Recipes).where(Recipes.id == recipe_id)
+                        .values(name="Chili", instructions="Stew the beans"))
+        session.commit()
+
+    assert search(client, "goulash") == []
+    assert search(client, "beef") == []
+    assert search(client, "chili beans") == ["Chili"]
+
+    assert client.delete(f"/recipes/{recipe_id}").status_code == 201
+    assert search(client, "chili") == []
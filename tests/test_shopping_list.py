@@ -0,0 +1,46 @@
+from fastapi.testclient import TestClient
+from app.main import app
+
+
+def recipe(name: str, portions: int, ingredients: list[tuple[str, float | None, str | None]]) -> dict:
+    return {"name": name, "number_of_portions": portions, "instructions": "cook", "tools": [],
+            "ingredients": [{"name": ingredient, "quantity": quantity, "unit": unit}
+                            for ingredient, quantity, unit in ingredients]}
+
+
+def test_quantities_are_summed_per_name_and_unit(databases):
+    client = TestClient(app)
+    bread = client.post("/recipes/", json=recipe("Bread", 4, [("Flour", 500, "g"), ("Water", 300, "ml"),
+                                                              ("Salt", 1, "tsp"), ("Egg", 2, None)])).json()["recipe_id"]
+    pizza = client.post("/recipes/", json=recipe("Pizza", 2, [("Flour", 0.25, "kg"), ("Water", 150, "ml"),
+                                                              ("Salt", 1, " Tsp"), ("Egg", 1, "pcs"),
+                                                              ("Olive oil", 2, "tbsp"), ("Basil", None, None)])
+                        ).json()["recipe_id"]
+
+    # bread is planned twice, 12 portions in total are three times the recipe, pizza is doubled
+    response = client.post("/recipes/shopping-list", json={"recipes": [{"recipe_id": bread, "portions": 8},
+                                                                       {"recipe_id": pizza, "portions": 4},
+                                                                       {"recipe_id": bread, "portions": 4}]})
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"name": "Basil", "quantity": None, "unit": None},
+        {"name": "Egg", "quantity": 6.0, "unit": None},
+        {"name": "Egg", "quantity": 2.0, "unit": "pcs"},
+        # 1500 g + 0.5 kg
+        {"name": "Flour", "quantity": 2.0, "unit": "kg"},
+        {"name": "Olive oil", "quantity": 4.0, "unit": "tbsp"},
+        # 3 tsp + 2 tsp, spoons stay spoons
+        {"name": "Salt", "quantity": 1.67, "unit": "tbsp"},
+        {"name": "Water", "quantity": 1.2, "unit": "l"},
+    ]
+
+
+def test_unknown_recipe_in_meal_plan(databases):
+    client = TestClient(app)
+    bread = client.post("/recipes/", json=recipe("Bread", 4, [("Flour", 500, "g")])).json()["recipe_id"]
+
+    response = client.post("/recipes/shopping-list", json={"recipes": [{"recipe_id": bread, "portions": 2},
+                                                                       {"recipe_id": bread + 1, "portions": 2}]})
+
+    assert response.status_code == 404